@@ -0,0 +1,316 @@
+"""Load generator: many concurrent customers against one worker's event loop.
+
+Usage (from backend/)::
+
+    python benchmarks/bench_load.py [--sessions 1,10,25,50,100] [--seconds 30] [--json]
+
+Each step in ``--sessions`` runs in a fresh process that starts that many
+synthetic customers on one event loop, as a job serves a room with
+``MULTI_SESSION=1`` (or as rooms share a process with
+``AGENT_JOB_EXECUTOR=thread``). Every customer has a real ``AgentSession`` and
+``Assistant`` with its own ``OrderSession`` and order log, and places orders
+from the ``bench_orders.py`` scripts for ``--seconds``, pausing about
+``--think-seconds`` before each turn as a person would. Transcripts go in as
+text in place of STT. The LLM is ``bench_orders``'s ``StubLLM`` and the TTS a
+``StubTTS`` that returns silence, each answering after ``--provider-ms``, and
+the agent's audio goes to a ``NullAudioOutput``. Tools, the order model,
+visualization publishes to a ``FakeRoom``, the order store and the order log
+all run for real.
+
+Per step it reports:
+
+- event-loop lag: how late a 10 ms timer fires, p50/p99/max
+- CPU used by the process, as a share of one core and per session
+- RSS growth per session, from the step's high-water mark
+- turn latency (transcript in to reply played) and tool-call latency
+
+The capacity line at the end is the largest step whose p99 loop lag stays under
+``--max-lag-ms`` and whose CPU stays under ``--max-cpu`` of a core, and the load
+LiveKit's default ``load_fnc`` (CPU across the machine's cores) would report
+with that many customers on every core. That is a starting point for
+``LOAD_THRESHOLD``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import psutil
+from bench_orders import SCRIPTS, StubLLM
+from fakes import FakeRoom, NullAudioOutput, StubTTS
+from livekit.agents import AgentSession
+
+from agent import Assistant
+from order_log import OrderLog
+from order_store import JsonlOrderStore
+from sessions import SessionRegistry
+from structured_logging import configure as configure_logging
+from telemetry import percentiles
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# How often the loop-lag timer fires
+LAG_INTERVAL = 0.01
+
+
+async def _watch_loop(lag: list[float], rss: list[int]) -> None:
+    process = psutil.Process()
+    for tick in iter(int, 1):
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag.append(max(0.0, time.perf_counter() - start - LAG_INTERVAL))
+        if tick % 50 == 0:
+            rss.append(process.memory_info().rss)
+
+
+async def _customer(
+    i: int, env: SimpleNamespace, turns: list[float], assistants: list[Assistant]
+) -> None:
+    rng = random.Random(i)
+    # Customers arrive spread over the first think time, not all at once
+    await asyncio.sleep(rng.uniform(0, env.think_seconds))
+    identity = f"customer{i}"
+    assistant = Assistant(
+        order_store=env.store,
+        order_session=env.registry.acquire(env.room.name, identity),
+        order_log=env.order_log,
+    )
+    assistant.room = env.room
+    assistants.append(assistant)
+
+    session = AgentSession(
+        llm=env.llm,
+        tts=StubTTS(latency=env.provider_latency),
+        resume_false_interruption=False,
+    )
+    session.output.audio = NullAudioOutput()
+    # As in start_assistant: one coalesced visualization update per LLM turn
+    session.on(
+        "function_tools_executed", lambda ev: assistant.viz_scheduler.flush_soon()
+    )
+    try:
+        await session.start(assistant)
+        order = i
+        while time.perf_counter() < env.deadline:
+            for text, _ in SCRIPTS[order % len(SCRIPTS)]:
+                await asyncio.sleep(env.think_seconds * rng.uniform(0.5, 1.5))
+                if time.perf_counter() >= env.deadline:
+                    break
+                turn = time.perf_counter()
+                await session.run(user_input=text)
+                turns.append(time.perf_counter() - turn)
+                assistant.tracer.finish_turn()
+            order += 1
+    finally:
+        await session.aclose()
+        await assistant.viz_scheduler.aclose()
+        env.registry.release(env.room.name, identity)
+
+
+def _ms(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    stats = percentiles(samples, points=(50, 95, 99))
+    stats["max"] = max(samples)
+    return {"count": len(samples), **{k: round(v * 1e3, 3) for k, v in stats.items()}}
+
+
+async def _step(sessions: int, args: argparse.Namespace, orders_dir: str) -> dict:
+    provider_latency = args.provider_ms / 1e3
+    env = SimpleNamespace(
+        store=JsonlOrderStore(orders_dir),
+        order_log=OrderLog(Path(orders_dir) / "wal"),
+        registry=SessionRegistry(max_sessions=sessions),
+        room=FakeRoom(),
+        llm=StubLLM(latency=provider_latency),
+        provider_latency=provider_latency,
+        think_seconds=args.think_seconds,
+        deadline=time.perf_counter() + args.seconds,
+    )
+    env.store.open()
+    env.order_log.open()
+
+    rss_before = psutil.Process().memory_info().rss
+    lag: list[float] = []
+    rss: list[int] = [rss_before]
+    watcher = asyncio.create_task(_watch_loop(lag, rss))
+    turns: list[float] = []
+    assistants: list[Assistant] = []
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(
+        *(_customer(i, env, turns, assistants) for i in range(sessions))
+    )
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    watcher.cancel()
+    await env.store.aclose()
+    await env.order_log.aclose()
+
+    tools: dict[str, list[float]] = defaultdict(list)
+    for assistant in assistants:
+        for name, values in assistant.tracer.samples.items():
+            if name.startswith("tool:"):
+                tools[name.removeprefix("tool:")].extend(values)
+    cpu_core = cpu / wall
+    return {
+        "sessions": sessions,
+        "turns": len(turns),
+        "orders_saved": env.store.stats["appended"],
+        "loop_lag_ms": _ms(lag),
+        "cpu_core": round(cpu_core, 4),
+        "cpu_core_per_session": round(cpu_core / sessions, 5),
+        "rss_mb": round(max(rss) / 2**20, 1),
+        "rss_kb_per_session": round((max(rss) - rss_before) / 1024 / sessions, 1),
+        "turn_ms": _ms(turns),
+        "tool_ms": _ms([v for values in tools.values() for v in values]),
+        "tool_ms_by_name": {
+            name: _ms(values) for name, values in sorted(tools.items())
+        },
+    }
+
+
+def _child(sessions: int, args: argparse.Namespace) -> None:
+    if args.log_format != "off":
+        devnull = open(os.devnull, "w")  # noqa: SIM115
+        logging.basicConfig(level=logging.INFO, stream=devnull)
+        configure_logging(args.log_format, stream=devnull)
+    else:
+        # LiveKit's own warnings would interleave with the report
+        logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as orders_dir:
+        results = asyncio.run(_step(sessions, args, orders_dir))
+    print(json.dumps(results), flush=True)
+
+
+def _run_step(sessions: int, args: argparse.Namespace) -> dict:
+    cmd = [
+        sys.executable,
+        __file__,
+        "--child",
+        "--sessions",
+        str(sessions),
+        "--seconds",
+        str(args.seconds),
+        "--think-seconds",
+        str(args.think_seconds),
+        "--provider-ms",
+        str(args.provider_ms),
+        "--log-format",
+        args.log_format,
+    ]
+    out = subprocess.run(
+        cmd, cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def capacity(steps: list[dict], max_lag_ms: float, max_cpu: float) -> dict:
+    """The largest step within the lag and CPU budgets, and its worker load."""
+    within = [
+        step
+        for step in steps
+        if step["loop_lag_ms"].get("p99", 0) <= max_lag_ms
+        and step["cpu_core"] <= max_cpu
+    ]
+    if not within:
+        return {"sessions_per_core": 0, "limit_reached": True, "load_threshold": None}
+    best = max(within, key=lambda step: step["sessions"])
+    return {
+        "sessions_per_core": best["sessions"],
+        # False when even the largest step was within budget: try more sessions
+        "limit_reached": len(within) < len(steps),
+        # With every core running a job process this busy, the machine's CPU
+        # (what the default load_fnc reports) is this step's share of a core
+        "load_threshold": round(best["cpu_core"], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions",
+        default="1,10,25,50,100",
+        help="comma-separated concurrent customers per step",
+    )
+    parser.add_argument("--seconds", type=float, default=30.0, help="per step")
+    parser.add_argument(
+        "--think-seconds",
+        type=float,
+        default=2.0,
+        help="average pause before each customer turn",
+    )
+    parser.add_argument(
+        "--provider-ms",
+        type=float,
+        default=300.0,
+        help="simulated LLM and TTS latency per request",
+    )
+    parser.add_argument("--max-lag-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--max-cpu", type=float, default=0.8, help="share of one core per process"
+    )
+    parser.add_argument(
+        "--log-format",
+        default="off",
+        choices=["off", "text", "json"],
+        help="agent INFO logging to os.devnull, as formatted by LOG_FORMAT",
+    )
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(int(args.sessions), args)
+        return
+
+    steps = []
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        step = _run_step(sessions, args)
+        steps.append(step)
+        if not args.json:
+            print(
+                f"{step['sessions']:>5} sessions: "
+                f"loop lag p99 {step['loop_lag_ms'].get('p99', 0):7.1f}ms, "
+                f"cpu {step['cpu_core']:6.1%} of a core, "
+                f"{step['rss_kb_per_session']:8.1f}KB/session, "
+                f"turn p95 {step['turn_ms'].get('p95', 0):7.1f}ms, "
+                f"tool p99 {step['tool_ms'].get('p99', 0):6.2f}ms",
+                flush=True,
+            )
+
+    results = {
+        "steps": steps,
+        "capacity": capacity(steps, args.max_lag_ms, args.max_cpu),
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        cap = results["capacity"]
+        print(
+            f"capacity: {'' if cap['limit_reached'] else 'at least '}"
+            f"{cap['sessions_per_core']} sessions per core "
+            f"within {args.max_lag_ms:.0f}ms p99 loop lag and "
+            f"{args.max_cpu:.0%} CPU; load_threshold ~{cap['load_threshold']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Replayable end-to-end benchmark of the agent's order handling.
+
+Usage (from backend/)::
+
+    python benchmarks/bench_orders.py [--orders 200] [--json]
+    python benchmarks/bench_orders.py --json > baseline.json   # before a change
+    python benchmarks/bench_orders.py --baseline baseline.json  # after it
+
+Replays scripted order conversations through a real ``AgentSession`` in text
+mode. The LLM is a local stub that answers each scripted transcript with the
+tool calls a model would make, so every turn goes through LiveKit's tool
+dispatch, our tools, the order model, the visualization scheduler, the order
+store and receipt rendering, but nothing leaves the process. The room is a
+``FakeRoom`` that records every ``publish_data``.
+
+Reports throughput (orders/sec), per-turn and per-tool latency, render times
+for ``generate_drink_html`` and ``generate_receipt_html``, the estimated LLM
+context size per turn, bytes published per order by topic, and memory allocated
+per order (from a second, shorter pass under ``tracemalloc``, so tracing doesn't
+skew the timings).
+
+``--log-format text`` or ``json`` turns on INFO logging for the agent (written
+to ``os.devnull``), to compare what logging costs the event loop in each mode;
+by default logging is off.
+
+With ``--baseline``, every latency, byte and allocation figure is compared
+with an earlier ``--json`` run and the exit status is 1 if any of them got
+worse by more than ``--tolerance`` (or throughput dropped by as much). p99s
+and latency changes under 0.1 ms are reported but not gated on.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakes import FakeRoom
+from livekit.agents import AgentSession, llm
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+from agent import Assistant
+from order_store import JsonlOrderStore
+from structured_logging import configure as configure_logging
+from telemetry import percentiles
+
+# Each conversation is a list of (transcript, tool calls the LLM makes for it)
+SCRIPTS: list[list[tuple[str, list[tuple[str, dict]]]]] = [
+    [
+        (
+            "Hi, can I get a large oat milk latte?",
+            [
+                ("update_drink_type", {"drink_type": "latte"}),
+                ("update_size", {"size": "large"}),
+                ("update_milk", {"milk_type": "oat milk"}),
+            ],
+        ),
+        ("Add an extra shot please.", [("add_extra", {"extra": "extra shot"})]),
+        ("It's for Sam.", [("update_name", {"customer_name": "Sam"})]),
+        ("That's everything.", [("save_order", {})]),
+    ],
+    [
+        ("Do you have a matcha?", [("update_drink_type", {"drink_type": "matcha"})]),
+        ("Okay, a mocha then.", [("update_drink_type", {"drink_type": "mocha"})]),
+        ("Medium.", [("update_size", {"size": "medium"})]),
+        ("Almond milk.", [("update_milk", {"milk_type": "almond"})]),
+        (
+            "Whipped cream and caramel drizzle on top.",
+            [
+                ("add_extra", {"extra": "whipped cream"}),
+                ("add_extra", {"extra": "caramel drizzle"}),
+            ],
+        ),
+        ("What else do you need?", [("check_order_status", {})]),
+        ("The name is Priya.", [("update_name", {"customer_name": "Priya"})]),
+        ("Yes, place it.", [("save_order", {})]),
+    ],
+    [
+        (
+            "Small black americano for Jo, that's it.",
+            [
+                ("update_drink_type", {"drink_type": "americano"}),
+                ("update_size", {"size": "small"}),
+                ("update_milk", {"milk_type": "no milk"}),
+                ("update_name", {"customer_name": "Jo"}),
+            ],
+        ),
+        ("Yes please.", [("save_order", {})]),
+    ],
+]
+
+REPLY = "Sure thing."
+
+
+class StubLLM(llm.LLM):
+    """Answers a known transcript with its scripted tool calls, and anything
+    after a tool result with a short fixed reply, ``latency`` seconds after
+    each request."""
+
+    def __init__(self, scripts=SCRIPTS, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: dict[str, list[tuple[str, dict]]] = {
+            text: calls for script in scripts for text, calls in script
+        }
+        self._ids = itertools.count()
+
+    @property
+    def model(self) -> str:
+        return "stub"
+
+    def chat(
+        self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **_
+    ) -> _StubStream:
+        return _StubStream(
+            self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options
+        )
+
+
+class _StubStream(llm.LLMStream):
+    async def _run(self) -> None:
+        stub: StubLLM = self._llm
+        if stub.latency:
+            await asyncio.sleep(stub.latency)
+        last = self._chat_ctx.items[-1]
+        calls = []
+        if last.type == "message" and last.role == "user":
+            # The context window prefixes each customer message with the order
+            calls = stub.calls.get(last.content[-1], [])
+
+        request_id = f"stub-{next(stub._ids)}"
+        if calls:
+            tool_calls = [
+                llm.FunctionToolCall(
+                    name=name,
+                    arguments=json.dumps(args),
+                    call_id=f"{request_id}-{i}",
+                )
+                for i, (name, args) in enumerate(calls)
+            ]
+            delta = llm.ChoiceDelta(role="assistant", tool_calls=tool_calls)
+        else:
+            delta = llm.ChoiceDelta(role="assistant", content=REPLY)
+        self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=delta))
+
+
+def _timed(samples: list[float], fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _ms(samples) -> dict[str, float]:
+    stats = percentiles(list(samples))
+    return {"count": len(samples), **{k: round(v * 1e3, 3) for k, v in stats.items()}}
+
+
+async def _replay(orders: int, orders_dir: str, viz_mode: str) -> dict:
+    os.environ["DRINK_VIZ_MODE"] = viz_mode
+    store = JsonlOrderStore(orders_dir)
+    store.open()
+    room = FakeRoom()
+    assistant = Assistant(order_store=store)
+    assistant.room = room
+
+    renders: dict[str, list[float]] = defaultdict(list)
+    for name in ("generate_drink_html", "generate_receipt_html"):
+        setattr(assistant, name, _timed(renders[name], getattr(assistant, name)))
+
+    turns: list[float] = []
+    async with StubLLM() as stub, AgentSession(llm=stub) as session:
+        # As in start_assistant: one coalesced visualization update per LLM turn
+        session.on(
+            "function_tools_executed",
+            lambda ev: assistant.viz_scheduler.flush_soon(),
+        )
+        await session.start(assistant)
+
+        start = time.perf_counter()
+        for i in range(orders):
+            for text, _ in SCRIPTS[i % len(SCRIPTS)]:
+                turn = time.perf_counter()
+                await session.run(user_input=text)
+                turns.append(time.perf_counter() - turn)
+                assistant.tracer.finish_turn()
+        elapsed = time.perf_counter() - start
+
+    await store.aclose()
+    await assistant.viz_scheduler.aclose()
+
+    assert store.stats["appended"] == orders, store.stats
+    bytes_by_topic = room.local_participant.bytes_by_topic()
+    return {
+        "orders": orders,
+        "turns": len(turns),
+        "orders_per_sec": round(orders / elapsed, 1),
+        "turn_ms": _ms(turns),
+        "tool_ms": {
+            name.removeprefix("tool:"): _ms(values)
+            for name, values in sorted(assistant.tracer.samples.items())
+            if name.startswith("tool:")
+        },
+        "render_ms": {name: _ms(values) for name, values in renders.items()},
+        "context_tokens": {
+            name: percentiles(list(values))
+            for name, values in sorted(assistant.tracer.token_samples.items())
+        },
+        "publishes_per_order": round(len(room.local_participant.published) / orders, 2),
+        "bytes_per_order": {
+            topic: round(size / orders)
+            for topic, size in sorted(bytes_by_topic.items())
+        },
+    }
+
+
+async def _allocations(orders: int, orders_dir: str, viz_mode: str) -> dict:
+    await _replay(len(SCRIPTS), orders_dir, viz_mode)  # imports, caches, templates
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        await _replay(orders, orders_dir, viz_mode)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    return {
+        "retained_bytes_per_order": round(
+            sum(stat.size_diff for stat in diff) / orders
+        ),
+        "peak_bytes": peak,
+    }
+
+
+async def run(orders: int, alloc_orders: int, viz_mode: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        await _replay(len(SCRIPTS), tmp, viz_mode)  # warm up
+        results = await _replay(orders, tmp, viz_mode)
+        results["alloc"] = await _allocations(alloc_orders, tmp, viz_mode)
+    return results
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and key not in (
+            "count",
+            "orders",
+            "turns",
+        ):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+_MS = ("turn_ms", "tool_ms", "render_ms")
+_NOISE_MS = 0.1
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Figures that got worse than ``baseline`` by more than ``tolerance``."""
+    current, previous = _flatten(results), _flatten(baseline)
+    found = []
+    for key, before in previous.items():
+        after = current.get(key)
+        if after is None or before <= 0:
+            continue
+        if ".p99" in key or (key.startswith(_MS) and after - before < _NOISE_MS):
+            continue  # too noisy to gate on
+        change = (after - before) / before
+        if key == "orders_per_sec":
+            change = -change  # higher is better
+        if change > tolerance:
+            found.append(f"{key}: {before} -> {after} ({change:+.0%} worse)")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument(
+        "--alloc-orders",
+        type=int,
+        default=30,
+        help="orders replayed under tracemalloc for the allocation figures",
+    )
+    parser.add_argument(
+        "--viz-mode",
+        default="both",
+        choices=["state", "html", "both"],
+        help="DRINK_VIZ_MODE; 'both' also covers the legacy drink HTML",
+    )
+    parser.add_argument("--baseline", type=Path, help="earlier --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument(
+        "--log-format",
+        default="off",
+        choices=["off", "text", "json"],
+        help="agent INFO logging to os.devnull, as formatted by LOG_FORMAT",
+    )
+    args = parser.parse_args()
+
+    if args.log_format != "off":
+        devnull = open(os.devnull, "w")  # noqa: SIM115
+        logging.basicConfig(level=logging.INFO, stream=devnull)
+        configure_logging(args.log_format, stream=devnull)
+
+    results = asyncio.run(run(args.orders, args.alloc_orders, args.viz_mode))
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in _flatten(results).items():
+            print(f"{key:>48}: {value}")
+
+    if args.baseline:
+        found = regressions(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
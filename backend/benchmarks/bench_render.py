@@ -0,0 +1,131 @@
+"""Micro-benchmark for the drink visualization and receipt renderers.
+
+Usage (from backend/)::
+
+    python benchmarks/bench_render.py [--number 20000] [--against REV] [--json]
+
+Renders a rotating set of order states through ``Assistant.generate_drink_html``
+and ``Assistant.generate_receipt_html`` and reports the best mean cost per call.
+With ``--against REV`` the ``agent.py`` from that git revision is loaded as well
+and both are timed in the same process, interleaved, for a before/after view.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import subprocess
+import sys
+import timeit
+import types
+from pathlib import Path
+from typing import Callable
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "src"))
+
+from agent import Assistant  # noqa: E402
+from order_model import Order  # noqa: E402
+
+DRINKS = ["latte", "cappuccino", "espresso", "americano", "mocha", "cold brew"]
+SIZES = ["small", "medium", "large"]
+EXTRAS = [[], ["extra shot"], ["whipped cream", "caramel drizzle"]]
+
+
+def _states() -> list[dict]:
+    return [
+        {
+            "drinkType": drink,
+            "size": size,
+            "milk": "oat milk",
+            "extras": extras,
+            "name": "Sam",
+        }
+        for drink, size, extras in itertools.product(DRINKS, SIZES, EXTRAS)
+    ]
+
+
+def _load_revision(rev: str) -> type:
+    """Load ``Assistant`` from ``src/agent.py`` as it was at git revision ``rev``."""
+    source = subprocess.check_output(
+        ["git", "show", f"{rev}:./src/agent.py"], cwd=BACKEND_DIR
+    )
+    module = types.ModuleType(f"agent_{rev}")
+    module.__file__ = f"agent.py@{rev}"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module.Assistant
+
+
+def _order_setter(assistant) -> Callable[[], None]:
+    if hasattr(type(assistant), "order"):
+        # Typed orders are built up front so parsing isn't timed as rendering
+        orders = itertools.cycle([Order.from_dict(state) for state in _states()])
+        return lambda: setattr(assistant.order_session, "order", next(orders))
+
+    states = itertools.cycle(_states())
+
+    def set_state() -> None:
+        assistant.order_state = next(states)
+
+    return set_state
+
+
+def _renderers(assistant_cls: type) -> dict:
+    assistant = assistant_cls()
+    next_order = _order_setter(assistant)
+
+    def drink() -> None:
+        next_order()
+        assistant.generate_drink_html()
+
+    def receipt() -> None:
+        next_order()
+        assistant.generate_receipt_html()
+
+    return {"drink_html": drink, "receipt_html": receipt}
+
+
+def bench(variants: dict[str, type], number: int, repeat: int = 15) -> dict:
+    renderers = {name: _renderers(cls) for name, cls in variants.items()}
+    best: dict[str, dict[str, float]] = {name: {} for name in variants}
+
+    for fn_name in ("drink_html", "receipt_html"):
+        for fns in renderers.values():
+            fns[fn_name]()  # warm caches the same way a running worker would
+        # Interleave variants so machine noise hits them equally
+        for _ in range(repeat):
+            for name, fns in renderers.items():
+                elapsed = timeit.timeit(fns[fn_name], number=number) / number
+                key = f"{fn_name}_us_per_call"
+                best[name][key] = min(best[name].get(key, elapsed * 1e6), elapsed * 1e6)
+
+    return {
+        name: {key: round(value, 2) for key, value in results.items()}
+        for name, results in best.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--against", metavar="REV", help="git revision to compare with")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    variants = {"current": Assistant}
+    if args.against:
+        variants = {args.against: _load_revision(args.against), **variants}
+
+    results = bench(variants, args.number)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, values in results.items():
+        print(name)
+        for key, value in values.items():
+            print(f"  {key:>24}: {value:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Load test for multi-session mode: how many concurrent orders fit on one core.
+
+Usage (from backend/)::
+
+    python benchmarks/bench_sessions.py [--sessions 500] [--order-seconds 90] [--json]
+
+Starts ``--sessions`` customers on a single event loop, each with its own
+``OrderSession`` from a ``SessionRegistry`` and its own ``Assistant``, and drives
+every customer through a complete order (drink, size, milk, extra, name, save)
+concurrently against a fake room. Reports the agent-side CPU cost per order, the
+memory held per session, and from those how many customers placing one order
+every ``--order-seconds`` a single core can keep up with.
+
+This measures the agent's own order handling only; STT, VAD, the turn detector
+and the provider connections add their own per-session cost on top.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakes import FakeRoom
+
+from agent import Assistant
+from order_store import JsonlOrderStore
+from sessions import SessionRegistry
+
+DRINKS = ["latte", "cappuccino", "espresso", "americano", "mocha", "cold brew"]
+
+
+async def _place_order(assistant: Assistant, i: int) -> None:
+    await assistant.update_drink_type(None, DRINKS[i % len(DRINKS)])
+    await asyncio.sleep(0)  # customers interleave between turns
+    await assistant.update_size(None, "large")
+    await assistant.update_milk(None, "oat milk")
+    await asyncio.sleep(0)
+    await assistant.add_extra(None, "extra shot")
+    await assistant.update_name(None, f"guest{i}")
+    await asyncio.sleep(0)
+    result = await assistant.save_order(None)
+    assert result.startswith("Order saved"), result
+
+
+async def run(sessions: int, orders_dir: str) -> dict:
+    registry = SessionRegistry(max_sessions=sessions)
+    store = JsonlOrderStore(orders_dir)
+    store.open()
+    room = FakeRoom()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    assistants = []
+    for i in range(sessions):
+        assistant = Assistant(
+            order_store=store, order_session=registry.acquire(room.name, f"customer{i}")
+        )
+        assistant.room = room
+        # Publish at the end of each "turn" rather than after a debounce timer
+        assistant.viz_scheduler.debounce = 0
+        assistants.append(assistant)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(_place_order(a, i) for i, a in enumerate(assistants)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    await store.aclose()
+
+    return {
+        "sessions": sessions,
+        "bytes_per_session": round((after - before) / sessions),
+        "cpu_ms_per_order": round(cpu / sessions * 1e3, 3),
+        "wall_s": round(wall, 3),
+        "publishes": len(room.local_participant.published),
+        "orders_saved": store.stats["appended"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument(
+        "--order-seconds",
+        type=float,
+        default=90.0,
+        help="how long one customer takes to place an order",
+    )
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as orders_dir:
+        results = asyncio.run(run(args.sessions, orders_dir))
+
+    # One core spends cpu_ms_per_order on each order; a customer needs one
+    # order's worth of CPU every order_seconds
+    results["sessions_per_core"] = int(
+        args.order_seconds * 1e3 / results["cpu_ms_per_order"]
+    )
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Cold-start benchmark: fresh process to a job's first audio frame.
+
+Usage (from backend/)::
+
+    python benchmarks/bench_startup.py [--runs 5] [--all-plugins] [--json]
+
+Each run starts a new Python process that does what a job process does on a
+cold worker: import ``agent`` (which imports the configured provider plugins),
+run ``prewarm``, build the job's ``AgentSession`` and ``Assistant``, and speak
+one cached fixed phrase. The parent measures the wall time from spawning the
+process to the first audio frame; the child reports each phase. Medians over
+``--runs`` are printed.
+
+``--all-plugins`` imports every provider plugin first, as ``agent.py`` used to,
+for a before/after view of the lazy imports. Provider connections aren't opened
+(dummy API keys are used when none are set), and a phase that can't run here,
+e.g. the turn detector without ``download-files``, is reported as an error
+rather than failing the run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FIRST_AUDIO = "FIRST_AUDIO"
+
+
+class _StubTTS:
+    """Local TTS stand-in: one 20 ms frame per sentence, immediately."""
+
+    sample_rate = 24000
+
+    def synthesize(self, text: str):
+        from livekit import rtc
+
+        class _Stream:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def __aiter__(self):
+                yield SimpleNamespace(frame=rtc.AudioFrame.create(24000, 1, 480))
+
+        return _Stream()
+
+
+def _child(all_plugins: bool) -> None:
+    timings: dict[str, float | str] = {}
+    start = time.perf_counter()
+    sys.path.insert(0, str(BACKEND_DIR / "src"))
+    for key in ("DEEPGRAM_API_KEY", "GOOGLE_API_KEY", "MURF_API_KEY"):
+        os.environ.setdefault(key, "bench")
+
+    if all_plugins:
+        import importlib
+
+        from providers import PLUGIN_MODULES
+
+        for module in PLUGIN_MODULES.values():
+            importlib.import_module(module)
+
+    import agent
+
+    timings["import_agent_ms"] = (time.perf_counter() - start) * 1000
+
+    proc = SimpleNamespace(userdata={})
+    agent.prewarm(proc)
+    for name, ms in proc.userdata["startup_timings"].items():
+        # Plugin imports happen while importing agent; the rest is prewarm
+        prefix = "" if name.startswith("import_") else "prewarm_"
+        timings[f"{prefix}{name}_ms"] = ms
+
+    ctx = SimpleNamespace(proc=proc, inference_executor=object())
+
+    async def create_session() -> None:
+        # Sessions are built inside the job's event loop, which owns the
+        # provider pool's connections
+        try:
+            agent.create_session(ctx, agent.metrics.UsageCollector())
+        finally:
+            if proc.userdata["provider_pool"] is not None:
+                await proc.userdata["provider_pool"].release()
+
+    phase = time.perf_counter()
+    try:
+        asyncio.run(create_session())
+        timings["create_session_ms"] = (time.perf_counter() - phase) * 1000
+    except Exception as e:
+        timings["create_session_ms"] = f"error: {e}"
+
+    phase = time.perf_counter()
+    assistant = agent.Assistant(
+        order_store=proc.userdata["order_store"], tts_cache=proc.userdata["tts_cache"]
+    )
+    timings["assistant_ms"] = (time.perf_counter() - phase) * 1000
+
+    async def first_frame() -> None:
+        text = "What size would you like: small, medium, or large?"
+        async for _ in agent.speak(_StubTTS(), assistant.tts_cache, text):
+            print(FIRST_AUDIO, flush=True)
+            return
+
+    phase = time.perf_counter()
+    asyncio.run(first_frame())
+    timings["first_frame_ms"] = (time.perf_counter() - phase) * 1000
+    print(json.dumps(timings), flush=True)
+
+
+def _run_once(all_plugins: bool, env: dict[str, str]) -> dict[str, float | str]:
+    cmd = [sys.executable, __file__, "--child"] + (
+        ["--all-plugins"] if all_plugins else []
+    )
+    spawned = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True
+    )
+    result: dict[str, float | str] = {}
+    for line in proc.stdout:
+        if line.strip() == FIRST_AUDIO:
+            result["spawn_to_first_audio_ms"] = (time.perf_counter() - spawned) * 1000
+        elif line.startswith("{"):
+            result.update(json.loads(line))
+    if proc.wait() != 0:
+        raise RuntimeError(f"startup run failed with exit code {proc.returncode}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--all-plugins", action="store_true")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.all_plugins)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "ORDERS_DIR": str(Path(tmp) / "orders"),
+            "TTS_CACHE_DIR": str(Path(tmp) / "tts_cache"),
+        }
+        _run_once(args.all_plugins, env)  # fills the phrase cache, warms the OS
+        runs = [_run_once(args.all_plugins, env) for _ in range(args.runs)]
+
+    results: dict[str, float | str] = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        if all(isinstance(value, float) for value in values):
+            results[key] = round(statistics.median(values), 1)
+        else:
+            results[key] = values[0]
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    for key, value in results.items():
+        shown = f"{value:10.1f}" if isinstance(value, float) else f"  {value}"
+        print(f"{key:>36}: {shown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""In-process stand-ins for LiveKit objects used by the benchmarks."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+
+from livekit import rtc
+from livekit.agents import tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+from livekit.agents.voice.io import AudioOutput, AudioOutputCapabilities
+
+
+@dataclass
+class Publish:
+    topic: str
+    size: int
+    destination_identities: list[str]
+    elapsed: float
+
+
+@dataclass
+class FakeLocalParticipant:
+    """Records every ``publish_data`` call instead of sending it."""
+
+    identity: str = "agent"
+    published: list[Publish] = field(default_factory=list)
+
+    async def publish_data(
+        self,
+        payload: bytes | str,
+        *,
+        reliable: bool = True,
+        destination_identities: list[str] | None = None,
+        topic: str = "",
+    ) -> None:
+        start = time.perf_counter()
+        size = len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        self.published.append(
+            Publish(
+                topic,
+                size,
+                list(destination_identities or []),
+                time.perf_counter() - start,
+            )
+        )
+
+    def bytes_by_topic(self) -> dict[str, int]:
+        totals: dict[str, int] = {}
+        for publish in self.published:
+            totals[publish.topic] = totals.get(publish.topic, 0) + publish.size
+        return totals
+
+
+@dataclass
+class FakeRoom:
+    name: str = "bench-room"
+    local_participant: FakeLocalParticipant = field(
+        default_factory=FakeLocalParticipant
+    )
+
+
+class StubTTS(tts.TTS):
+    """Local TTS stand-in: silence at a speaking pace, ``latency`` seconds
+    after each request."""
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        chars_per_second: float = 15.0,
+        sample_rate: int = 24000,
+    ) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self._ids = itertools.count()
+
+    def synthesize(
+        self, text: str, *, conn_options=DEFAULT_API_CONNECT_OPTIONS
+    ) -> _StubChunkedStream:
+        return _StubChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _StubChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        stub: StubTTS = self._tts
+        output_emitter.initialize(
+            request_id=f"stub-{next(stub._ids)}",
+            sample_rate=stub.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        if stub.latency:
+            await asyncio.sleep(stub.latency)
+        seconds = len(self.input_text) / stub.chars_per_second
+        output_emitter.push(bytes(2 * int(seconds * stub.sample_rate)))
+        output_emitter.flush()
+
+
+class NullAudioOutput(AudioOutput):
+    """Accepts the agent's audio and reports it played as soon as it ends."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            label="null", capabilities=AudioOutputCapabilities(pause=False)
+        )
+        self.frames = 0
+        self._position = 0.0
+        self._playing = False
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        self.frames += 1
+        self._position += frame.duration
+        self._playing = True
+
+    def flush(self) -> None:
+        super().flush()
+        self._finish(interrupted=False)
+
+    def clear_buffer(self) -> None:
+        self._finish(interrupted=True)
+
+    def _finish(self, *, interrupted: bool) -> None:
+        if not self._playing:
+            return
+        position, self._position, self._playing = self._position, 0.0, False
+        self.on_playback_finished(playback_position=position, interrupted=interrupted)
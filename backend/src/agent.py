@@ -1,394 +1,725 @@
+import asyncio
 import logging
-import json
-from datetime import datetime
-from pathlib import Path
+import os
+import time
+from typing import Annotated, Optional
 
 from dotenv import load_dotenv
+from livekit import rtc
 from livekit.agents import (
     Agent,
     AgentSession,
+    AgentStateChangedEvent,
+    FunctionToolsExecutedEvent,
     JobContext,
+    JobExecutorType,
     JobProcess,
     MetricsCollectedEvent,
     RoomInputOptions,
+    RoomOutputOptions,
+    RunContext,
+    StopResponse,
     WorkerOptions,
     cli,
-    metrics,
-    tokenize,
     function_tool,
-    RunContext
+    llm,
+    metrics,
+)
+from livekit.plugins import noise_cancellation, silero
+from pydantic import Field
+
+from context_window import ContextWindow, order_line
+from fast_path import FastPath, get_extractor
+from kitchen import KitchenQueue
+from menu import Menu
+from menu import current as current_menu
+from order_ids import created_at, new_order_id
+from order_log import OrderLog
+from order_model import CartError, LineItem, MenuError, Order
+from order_store import OrderStore, create_order_store
+from provider_pool import ProviderPool
+from providers import ProviderConfig, create_llm, create_stt, create_tts, import_plugins
+from receipts import (
+    RECEIPT_REQUEST_TOPIC,
+    RECEIPT_TOPIC,
+    Receipt,
+    ReceiptCache,
+    get_receipt_cache,
+)
+from sessions import OrderSession, SessionLimitError, get_registry
+from startup import PhaseTimer, shared_turn_detector
+from structured_logging import bind as bind_log_context
+from structured_logging import configure as configure_logging
+from telemetry import SpanFileExporter, TurnTracer, timed_tool
+from templates import prewarm as prewarm_templates
+from templates import render_drink_html
+from tts_cache import TTS_STYLE, TTS_VOICE, TTSCache, speak
+from visualization import (
+    LEGACY_HTML_TOPIC,
+    STATE_TOPIC,
+    SYNC_TOPIC,
+    DrinkStateEncoder,
+    UpdateScheduler,
+    cup_styles,
+    visualization_mode,
 )
-from livekit import rtc
-from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("agent")
+# One record per publish_data; sampled in structured mode (see structured_logging.py)
+publish_logger = logging.getLogger("agent.publish")
+
+# Tasks started from room event handlers. The event loop only keeps weak
+# references to tasks, so they are held here until done, and failures logged.
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Background task %s failed", task.get_name(), exc_info=task.exception()
+        )
+
+
+def spawn(coro) -> asyncio.Task:
+    """Run ``coro`` in a task that is kept alive and whose errors are logged."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+# Optional tool arguments. LiveKit drops a plain "= 0" default when it builds the
+# argument schema, so the default is set on the Field too.
+ItemNumber = Annotated[
+    int,
+    Field(
+        default=0,
+        description="Item number of the drink (1 for the first); 0 for the drink being discussed",
+    ),
+]
+Quantity = Annotated[
+    int,
+    Field(
+        default=1,
+        description="How many of this drink, with the same size, milk and extras",
+    ),
+]
 
 # Load environment variables from .env.local first, then .env as fallback
 
 load_dotenv(".env")
 
+# Only the configured STT/LLM/TTS plugins are imported (see providers.py)
+PROVIDERS = ProviderConfig.from_env()
+PLUGIN_IMPORT_TIMINGS = import_plugins(PROVIDERS)
+
+
+# Kept byte-identical across turns and sessions so the provider can cache the
+# prompt prefix; per-turn state goes in the order line (see context_window.py).
+# The menu section is generated from menu.json, see instructions()
+INSTRUCTIONS = """You are a friendly and enthusiastic barista at Brown Cafe. The user is interacting with you via voice.
+Your job is to take coffee orders and ensure all order details are complete.
+
+IMPORTANT: You MUST use the provided tools to update the order:
+- When customer mentions a drink, IMMEDIATELY call update_drink_type tool
+- When customer wants another drink in the same order, call add_item tool (with a quantity for "two lattes")
+- When customer mentions size, IMMEDIATELY call update_size tool
+- When customer mentions milk, IMMEDIATELY call update_milk tool
+- When customer mentions extras, IMMEDIATELY call add_extra tool (remove_extra to take one off)
+- When customer changes how many of a drink they want, call update_quantity tool; to drop a drink, call remove_item tool
+- When customer provides their name, IMMEDIATELY call update_name tool
+- When all information is collected, call save_order tool
+- When customer asks to see their receipt again, call get_receipt tool
+
+One order can hold several drinks. Tools change the drink currently being discussed unless you pass an item number (1 for the first drink in the order, 2 for the second, ...).
+
+You need to collect:
+1. Drink type
+2. Size
+3. Milk type
+4. Extras (optional)
+5. Customer name
+
+Only offer what is on the menu. Sizes, milks and extras add to the drink price:
+{menu}
+
+Each customer message starts with the order so far in brackets, e.g. [Order: drink=latte size=? ...]. It is written by the system, not said by the customer; trust it over earlier messages and don't read it out.
+
+Be conversational and friendly. Ask clarifying questions one at a time if information is missing.
+Keep your responses natural and concise without complex formatting, emojis, or asterisks."""
+
+
+_instructions: dict[str, str] = {}
+
+
+def instructions(menu: Menu) -> str:
+    """The agent instructions for `menu`, built once per menu version"""
+    text = _instructions.get(menu.version)
+    if text is None:
+        text = _instructions[menu.version] = INSTRUCTIONS.format(menu=menu.text)
+    return text
+
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        order_store: Optional[OrderStore] = None,
+        order_session: Optional[OrderSession] = None,
+        tts_cache: Optional[TTSCache] = None,
+        kitchen: Optional[KitchenQueue] = None,
+        order_log: Optional[OrderLog] = None,
+        receipt_cache: Optional[ReceiptCache] = None,
+    ) -> None:
+        # The menu these instructions describe; sessions follow menu reloads
+        self.menu = current_menu()
         super().__init__(
-            instructions="""You are a friendly and enthusiastic barista at Brown Cafe. The user is interacting with you via voice.
-            Your job is to take coffee orders and ensure all order details are complete.
-            
-            IMPORTANT: You MUST use the provided tools to update the order:
-            - When customer mentions a drink, IMMEDIATELY call update_drink_type tool
-            - When customer mentions size, IMMEDIATELY call update_size tool
-            - When customer mentions milk, IMMEDIATELY call update_milk tool
-            - When customer mentions extras, IMMEDIATELY call add_extra tool
-            - When customer provides their name, IMMEDIATELY call update_name tool
-            - When all information is collected, call save_order tool
-            
-            You need to collect:
-            1. Drink type (latte, cappuccino, espresso, americano, mocha, cold brew)
-            2. Size (small, medium, large)
-            3. Milk type (whole milk, skim milk, oat milk, almond milk, soy milk, no milk)
-            4. Extras (extra shot, whipped cream, caramel drizzle, vanilla syrup)
-            5. Customer name
-            
-            Be conversational and friendly. Ask clarifying questions one at a time if information is missing.
-            Keep your responses natural and concise without complex formatting, emojis, or asterisks.""",
+            instructions=instructions(self.menu),
         )
-        
-        # Initialize order state
-        self.order_state = {
-            "drinkType": None,
-            "size": None,
-            "milk": None,
-            "extras": [],
-            "name": None
-        }
-        
+
+        # Order state lives in a per-customer session (see sessions.py)
+        self.order_session = order_session or OrderSession()
+
         # Store room reference for sending data
         self.room = None
-    
+
+        # Completed orders are persisted off the event loop by the order store
+        self.order_store = order_store or create_order_store()
+
+        # Live feed of saved orders for the baristas (see kitchen.py)
+        self.kitchen = kitchen
+
+        # Order changes are logged so a restarted job can resume (see order_log.py)
+        self.order_log = order_log
+
+        # Receipts are rendered once per order and resent from here (see receipts.py)
+        self.receipt_cache = receipt_cache or get_receipt_cache()
+
+        # Drink visualization is sent as compact state deltas (see visualization.py)
+        self.viz_mode = visualization_mode()
+        self.viz_encoder = DrinkStateEncoder()
+        # Tool calls within one turn are coalesced into a single publish
+        self.viz_scheduler = UpdateScheduler(self.send_drink_visualization)
+
+        # Pre-synthesized audio for the phrases the agent speaks verbatim
+        self.tts_cache = tts_cache
+
+        # Per-turn latency spans and histograms (see telemetry.py)
+        self.tracer = TurnTracer(
+            self.order_session.room,
+            self.order_session.identity,
+            exporter=SpanFileExporter.from_env(),
+        )
+
+        # The save_order call in progress, shared with duplicate calls
+        self._saving: Optional[asyncio.Future] = None
+
+        # Trimmed, order-annotated chat context for each LLM request
+        self.context_window = ContextWindow.from_env()
+
+        # Optional local slot filling for simple turns (see fast_path.py)
+        self.fast_path = FastPath.for_customer(
+            self.order_session.room, self.order_session.identity
+        )
+
+    async def on_user_turn_completed(
+        self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
+    ) -> None:
+        """Answer plain order turns locally instead of with an LLM round-trip"""
+        menu = current_menu()
+        if menu is not self.menu:
+            self.menu = menu
+            await self.update_instructions(instructions(menu))
+
+        if self.fast_path is None:
+            return
+        reply = self.fast_path.handle(new_message.text_content or "", self.order)
+        if reply is None:
+            return  # the LLM takes this turn
+
+        logger.info("Fast path handled turn: %r", new_message.text_content)
+        if self.order_log is not None:
+            self.order_log.record_snapshot(self.order_session)
+        self.tracer.mark_path("fast_path")
+        self.viz_scheduler.mark_dirty()
+        self.viz_scheduler.flush_soon()
+
+        # StopResponse drops the user message, so keep it in the LLM's history
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.items.append(new_message)
+        await self.update_chat_ctx(chat_ctx)
+        self.say(reply)
+        raise StopResponse()
+
+    def llm_node(self, chat_ctx, tools, model_settings):
+        """Send the LLM a trimmed context with the order state on each customer turn"""
+        chat_ctx, stats = self.context_window.prepare(chat_ctx, self.order)
+        self.tracer.record_context(stats)
+        return Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+
+    def say(self, text: str):
+        """Speak a fixed-phrase reply, playing cached audio for known sentences"""
+        if self.tts_cache is None:
+            return self.session.say(text)
+        audio = speak(
+            self.session.tts,
+            self.tts_cache,
+            text,
+            voice=TTS_VOICE,
+            style=TTS_STYLE,
+            private=[self.order.name or ""],
+        )
+        return self.session.say(text, audio=audio)
+
+    @property
+    def order(self):
+        return self.order_session.order
+
+    @property
+    def order_state(self):
+        """Plain-dict view of the order, as sent to the frontend and saved"""
+        return self.order.to_dict()
+
+    @order_state.setter
+    def order_state(self, value):
+        self.order_session.order = Order.from_dict(value)
+
+    def log_order(self, op: str, *args):
+        """Record a successful `self.order.<op>(*args)` in the order log"""
+        if self.order_log is not None:
+            self.order_log.record(self.order_session, op, *args)
+
+    async def publish(self, payload: bytes, topic: str):
+        """Publish to this customer only, or to the whole room in single-session mode"""
+        identity = self.order_session.identity
+        start = time.perf_counter()
+        await self.room.local_participant.publish_data(
+            payload,
+            topic=topic,
+            destination_identities=[identity] if identity else [],
+        )
+        elapsed = time.perf_counter() - start
+        self.tracer.record_publish(topic, elapsed, len(payload))
+        publish_logger.info(
+            "Published %s: %d bytes in %.1fms", topic, len(payload), elapsed * 1000
+        )
+
     def generate_drink_html(self):
-        """Generate HTML visualization of the current drink order"""
-        
-        # Determine cup size - smaller to prevent overlap
-        size_config = {
-            "small": {"height": "80px", "width": "60px"},
-            "medium": {"height": "95px", "width": "70px"},
-            "large": {"height": "110px", "width": "80px"}
-        }
-        cup_size = size_config.get(self.order_state["size"], size_config["medium"])
-        
-        # Determine drink color based on type
-        drink_colors = {
-            "latte": "#D4A574",
-            "cappuccino": "#A67C52",
-            "espresso": "#4A2C2A",
-            "americano": "#5D4037",
-            "mocha": "#7B4B3A",
-            "cold brew": "#6D4C41"
-        }
-        drink_color = drink_colors.get(self.order_state["drinkType"], "#A67C52")
-        
-        # Check for whipped cream
-        has_whipped_cream = any("whipped cream" in extra.lower() for extra in self.order_state["extras"])
-        
-        # Build extras list
-        extras_html = ""
-        if self.order_state["extras"]:
-            extras_items = "".join([f"<div style='margin: 2px 0; font-size: 12px;'>• {extra}</div>" for extra in self.order_state["extras"]])
-            extras_html = f'<div style="margin: 0;">{extras_items}</div>'
-        
-        html = f"""
-        <div style="font-family: 'Inter', -apple-system, sans-serif; padding: 16px; background: linear-gradient(135deg, #3a3330 0%, #2a2522 100%); border-radius: 2px; max-width: 280px; margin: 0 auto; color: #a89584; box-shadow: 0 8px 32px rgba(0,0,0,0.4); border: 1px solid #8b7355/20;">
-            <div style="text-align: center; margin-bottom: 12px; padding-bottom: 12px; border-bottom: 1px solid #8b7355/20;">
-                <h2 style="margin: 0; font-size: 14px; font-weight: 300; letter-spacing: 0.3em; text-transform: uppercase; color: #8b7355;">
-                    <span style="font-size: 16px; margin-right: 8px;">☕</span>
-                    <span>Brown Cafe</span>
-                </h2>
-            </div>
-            
-            <div style="background: #1a1816; border-radius: 2px; padding: 14px; color: #a89584; border: 1px solid #8b7355/10;">
-                <h3 style="margin: 0 0 12px 0; color: #8b7355; text-align: center; font-size: 12px; font-weight: 300; letter-spacing: 0.2em; text-transform: uppercase; padding-bottom: 8px; border-bottom: 1px solid #8b7355/20;">Your Order</h3>
-                
-                <!-- Drink Visualization -->
-                <div style="display: flex; justify-content: center; align-items: center; margin: 12px 0; padding: 16px; background: #2a2522; border-radius: 2px; border: 1px solid #8b7355/10;">
-                    <div style="position: relative; display: inline-block;">
-                        <!-- Minimalist Cup -->
-                        <div style="position: relative; width: {cup_size['width']}; height: {cup_size['height']}; background: linear-gradient(to bottom, {drink_color} 0%, {drink_color} 85%, #3e2723 100%); border-radius: 0 0 12px 12px; box-shadow: 0 4px 16px rgba(0,0,0,0.3), inset -3px 0 8px rgba(0,0,0,0.2), inset 3px 0 8px rgba(255,255,255,0.1); border: 2px solid #3e2723; border-top: none;">
-                            <!-- Cup Top/Rim -->
-                            <div style="position: absolute; top: -6px; left: -2px; right: -2px; height: 10px; background: {drink_color}; border: 2px solid #3e2723; border-radius: 50%; box-shadow: inset 0 -2px 4px rgba(0,0,0,0.3);"></div>
-                            
-                            <!-- Whipped Cream -->
-                            {f'''<div style="position: absolute; top: -22px; left: 50%; transform: translateX(-50%); width: calc(100% - 8px); height: 30px; background: radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%); border-radius: 50% 50% 40% 40%; box-shadow: 0 2px 6px rgba(0,0,0,0.2); border: 1px solid #F0E5D8;"></div>
-                            <div style="position: absolute; top: -26px; left: 50%; transform: translateX(-50%); width: 55%; height: 18px; background: radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%); border-radius: 50%; opacity: 0.9;"></div>''' if has_whipped_cream else ''}
-                            
-                            <!-- Cup Handle -->
-                            <div style="position: absolute; right: -20px; top: 25%; width: 24px; height: 40%; border: 3px solid #3e2723; border-left: none; border-radius: 0 50% 50% 0; background: linear-gradient(to right, transparent 0%, {drink_color} 50%); opacity: 0.7;"></div>
-                        </div>
-                        
-                        <!-- Size Badge -->
-                        <div style="text-align: center; margin-top: 10px;">
-                            <span style="display: inline-block; background: #8b7355; color: #1a1816; padding: 4px 12px; border-radius: 1px; font-weight: 300; font-size: 10px; letter-spacing: 0.2em; text-transform: uppercase; box-shadow: 0 2px 8px rgba(0,0,0,0.2);">
-                                {self.order_state["size"].upper() if self.order_state["size"] else "SIZE"}
-                            </span>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- Order Details -->
-                <div style="margin-top: 12px; background: #2a2522; border-radius: 2px; padding: 10px; font-size: 11px; border: 1px solid #8b7355/10;">
-                    <div style="display: grid; grid-template-columns: auto 1fr; gap: 6px 12px; align-items: start;">
-                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Drink:</strong>
-                        <span style="color: #a89584;">{self.order_state["drinkType"] or "—"}</span>
-                        
-                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Size:</strong>
-                        <span style="color: #a89584;">{self.order_state["size"] or "—"}</span>
-                        
-                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Milk:</strong>
-                        <span style="color: #a89584;">{self.order_state["milk"] or "—"}</span>
-                        
-                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Extras:</strong>
-                        <div style="color: #a89584;">{extras_html if self.order_state["extras"] else '<span style="color: #6b5d52; font-size: 10px;">—</span>'}</div>
-                        
-                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Name:</strong>
-                        <span style="color: #a89584;">{self.order_state["name"] or "—"}</span>
-                    </div>
-                </div>
-            </div>
-        </div>
-        """
-        
-        return html
-    
+        """Generate HTML visualization of the drink currently being ordered"""
+        item = self.order.item() or LineItem()
+        return render_drink_html({**item.to_dict(), "name": self.order.name})
+
     async def send_drink_visualization(self):
-        """Send the drink visualization HTML to the frontend"""
+        """Send the current order state (and/or legacy HTML) to the frontend"""
         if self.room:
             try:
-                html = self.generate_drink_html()
-                # Send as data message
-                await self.room.local_participant.publish_data(
-                    html.encode('utf-8'),
-                    topic="drink_visualization"
-                )
-                logger.info("Sent drink visualization to frontend")
+                if self.viz_mode in ("state", "both"):
+                    payload = self.viz_encoder.encode(
+                        self.order_state, cup_styles(current_menu())
+                    )
+                    if payload is not None:
+                        await self.publish(payload, STATE_TOPIC)
+                if self.viz_mode in ("html", "both"):
+                    html = self.generate_drink_html()
+                    await self.publish(html.encode("utf-8"), LEGACY_HTML_TOPIC)
             except Exception as e:
-                logger.error(f"Failed to send visualization: {e}")
-    
-    def generate_receipt_html(self):
-        """Generate HTML receipt for completed order"""
-        extras_list = ", ".join(self.order_state["extras"]) if self.order_state["extras"] else "None"
-        order_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
-        
-        html = f"""
-        <div style="font-family: 'Inter', -apple-system, sans-serif; padding: 24px; background: #f5f3f0; border-radius: 2px; max-width: 380px; margin: 0 auto; color: #3a3330; box-shadow: 0 12px 48px rgba(0,0,0,0.2); border: 1px solid #8b7355/20;">
-            <div style="text-align: center; border-bottom: 1px solid #8b7355/20; padding-bottom: 18px; margin-bottom: 18px;">
-                <div style="font-size: 28px; margin-bottom: 10px; opacity: 0.8;">☕</div>
-                <h2 style="margin: 0; font-size: 18px; font-weight: 300; letter-spacing: 0.3em; color: #8b7355; text-transform: uppercase;">Brown Cafe</h2>
-                <p style="margin: 6px 0 0 0; font-size: 11px; color: #6b5d52; letter-spacing: 0.2em; text-transform: uppercase;">Order Receipt</p>
-            </div>
-            
-            <div style="margin-bottom: 18px;">
-                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Order #:</strong> {datetime.now().strftime('%Y%m%d%H%M%S')}</p>
-                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Date:</strong> {order_time}</p>
-                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Customer:</strong> {self.order_state["name"]}</p>
-            </div>
-            
-            <div style="border-top: 1px solid #8b7355/20; border-bottom: 1px solid #8b7355/20; padding: 14px 0; margin: 18px 0;">
-                <p style="margin: 10px 0; font-size: 13px; color: #3a3330;"><strong style="font-weight: 400; color: #8b7355;">ITEM:</strong> {self.order_state["drinkType"].title()}</p>
-                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Size: {self.order_state["size"].title()}</p>
-                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Milk: {self.order_state["milk"]}</p>
-                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Extras: {extras_list}</p>
-            </div>
-            
-            <div style="text-align: center; margin-top: 18px; padding-top: 18px; border-top: 1px solid #8b7355/20;">
-                <p style="margin: 10px 0; font-size: 16px; font-weight: 300; color: #8b7355; letter-spacing: 0.2em; text-transform: uppercase;">✓ Confirmed</p>
-                <p style="margin: 10px 0; font-size: 12px; color: #6b5d52;">Your order will be ready shortly</p>
-            </div>
-            
-            <div style="text-align: center; margin-top: 18px; padding-top: 14px; border-top: 1px solid #8b7355/10;">
-                <p style="margin: 5px 0; font-size: 10px; color: #6b5d52/60; letter-spacing: 0.1em;">Thank you for choosing Brown Cafe</p>
-                <p style="margin: 5px 0; font-size: 10px; color: #6b5d52/60; letter-spacing: 0.1em;">Powered by Murf Falcon TTS</p>
-            </div>
-        </div>
-        """
-        return html
-    
-    async def send_receipt(self):
-        """Send the receipt HTML to the frontend"""
+                logger.error("Failed to send visualization: %s", e)
+
+    def resync_drink_visualization(self):
+        """Resend the full order state after a client reported a gap"""
+        self.viz_encoder.request_snapshot()
+        self.viz_scheduler.mark_dirty()
+        self.viz_scheduler.flush_soon()
+
+    def generate_receipt_html(self, receipt: Optional[Receipt] = None):
+        """Receipt HTML for a saved order, or a preview of the current one"""
+        if receipt is None:
+            order_id = self.order_session.order_id or new_order_id()
+            receipt = Receipt.for_order(self.order_state, order_id)
+        # Rendered on first use, then kept with the receipt
+        return receipt.html
+
+    async def send_receipt(self, order_id: str):
+        """Send a saved order's receipt to the frontend; False if it isn't found"""
+        receipt = await self.receipt_cache.get(order_id, self.order_store)
+        if receipt is None:
+            logger.warning("No receipt for order %s", order_id)
+            return False
         if self.room:
             try:
-                html = self.generate_receipt_html()
-                # Send as data message
-                await self.room.local_participant.publish_data(
-                    html.encode('utf-8'),
-                    topic="order_receipt"
-                )
-                logger.info("Sent order receipt to frontend")
+                html = self.generate_receipt_html(receipt)
+                await self.publish(html.encode("utf-8"), RECEIPT_TOPIC)
+                logger.info("Sent receipt for order %s", order_id)
             except Exception as e:
-                logger.error(f"Failed to send receipt: {e}")
+                logger.error("Failed to send receipt: %s", e)
+        return True
+
+    async def resend_receipt(self):
+        """Send the customer's last receipt again, e.g. after a reconnect"""
+        order_id = self.order_session.saved_order_id
+        if order_id is None:
+            return None
+        if not await self.send_receipt(order_id):
+            return None
+        return order_id
+
+    async def aclose(self):
+        """Send this customer's last update and spans; call once their session ends"""
+        await self.viz_scheduler.aclose()
+        await self.tracer.aclose()
+        if self.fast_path is not None:
+            logger.info(
+                "Fast path (%s arm): hit rate %.0f%%, %s",
+                self.fast_path.arm,
+                self.fast_path.hit_rate * 100,
+                dict(self.fast_path.stats),
+            )
+
+    async def restore_order(self) -> bool:
+        """Pick up an order a crashed or moved job left unfinished for this customer"""
+        if self.order_log is None or not self.order_session.order.is_empty():
+            return False
+        started = time.perf_counter()
+        if not await self.order_log.restore(self.order_session):
+            return False
+        logger.info(
+            "Restored order in progress in %.1fms: %s",
+            (time.perf_counter() - started) * 1000,
+            order_line(self.order_session.order),
+        )
+        self.viz_scheduler.mark_dirty()
+        return True
 
     @function_tool
+    @timed_tool
     async def save_order(self, context: RunContext):
-        """Use this tool when all order information is collected (drinkType, size, milk, extras, and name).
-        This will save the complete order to a JSON file.
+        """Use this tool when all order information is collected (drinkType, size, milk and extras for every drink, and name).
+        This will save the complete order and return its total price.
         """
-        
+
+        # The LLM sometimes calls save_order twice for one order; later calls
+        # share the first one's result instead of writing the order again
+        if self._saving is not None:
+            return await asyncio.shield(self._saving)
+        if self.order.is_empty() and self.order_session.saved_order_id:
+            return f"Order {self.order_session.saved_order_id} is already saved."
+
         # Check if all required fields are filled
-        if not all([
-            self.order_state["drinkType"],
-            self.order_state["size"],
-            self.order_state["milk"] is not None,
-            self.order_state["name"]
-        ]):
+        if not self.order.is_complete():
             return "Order is incomplete. Please collect all required information first."
-        
-        # Create orders directory if it doesn't exist
-        orders_dir = Path("orders")
-        orders_dir.mkdir(exist_ok=True)
-        
-        # Add timestamp to order
+
+        # Cleared when the save itself finishes, not when this call returns: a
+        # cancelled caller must not let the next call start a second save
+        self._saving = spawn(self._save_order())
+        self._saving.add_done_callback(self._on_save_done)
+        return await asyncio.shield(self._saving)
+
+    def _on_save_done(self, task: asyncio.Task) -> None:
+        if self._saving is task:
+            self._saving = None
+
+    async def _save_order(self):
+        # One ID per order, kept if the save has to be retried
+        session = self.order_session
+        retry = session.order_id is not None
+        if not retry:
+            session.order_id = new_order_id()
+            self.log_order("order_id", session.order_id)
+
+        # The ID's timestamp is the order time, so file, receipt and ID agree
+        order_state = self.order_state
+        menu = current_menu()
+        receipt = Receipt.for_order(order_state, session.order_id)
+        total = receipt.total_cents
         order_with_timestamp = {
-            **self.order_state,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        # Generate filename with timestamp
-        filename = f"order_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.order_state['name'].replace(' ', '_')}.json"
-        filepath = orders_dir / filename
-        
-        # Save to JSON file
-        with open(filepath, 'w') as f:
-            json.dump(order_with_timestamp, f, indent=2)
-        
-        logger.info(f"Order saved to {filepath}")
-        logger.info(f"Order details: {json.dumps(order_with_timestamp, indent=2)}")
-        
-        # Generate and send receipt
-        await self.send_receipt()
-        
-        # Reset order state for next customer
-        self.order_state = {
-            "drinkType": None,
-            "size": None,
-            "milk": None,
-            "extras": [],
-            "name": None
+            **order_state,
+            "orderId": session.order_id,
+            "timestamp": created_at(session.order_id).isoformat(),
+            "status": "completed",
+            "totalCents": total,
+            "currency": menu.currency,
+            "menuVersion": menu.version,
+            # Prices as charged, so the receipt can be rebuilt exactly
+            "receipt": receipt.compact(),
         }
-        
-        return f"Order saved successfully! Your order will be ready soon."
-    
+
+        # Append to the order store; batching and fsync happen off the event loop.
+        # A retried or restored order may have been saved before the job stopped.
+        try:
+            if not retry or not await asyncio.to_thread(
+                self.order_store.find, session.order_id
+            ):
+                await self.order_store.append(order_with_timestamp)
+        except OSError as e:
+            logger.error("Failed to save order: %s", e)
+            return "Sorry, I couldn't save your order. Please try again."
+
+        logger.info("Order %s saved for %s", session.order_id, self.order.name)
+
+        # Never waits: a slow kitchen display only backs up its own queue
+        if self.kitchen is not None:
+            self.kitchen.submit(order_with_timestamp)
+
+        # Let the visualization catch up with this order before it is reset
+        await self.viz_scheduler.drain()
+
+        # Rendered once here; reprints and reconnects reuse it
+        self.receipt_cache.put(receipt)
+        await self.send_receipt(session.order_id)
+
+        # Reset order state for the next order
+        session.saved_order_id = session.order_id
+        session.reset_order()
+        if self.order_log is not None:
+            self.order_log.clear(session)
+
+        return (
+            f"Order saved successfully! The total is {menu.format_price(total)}. "
+            "Your order will be ready soon."
+        )
+
     @function_tool
-    async def update_drink_type(self, context: RunContext, drink_type: str):
+    @timed_tool
+    async def update_drink_type(
+        self, context: RunContext, drink_type: str, item: ItemNumber = 0
+    ):
         """Update the drink type in the order.
-        
+
+        Args:
+            drink_type: A drink on the menu (e.g., latte)
+        """
+        try:
+            drink = self.order.set_drink(drink_type, item)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("set_drink", drink.value, item)
+        logger.info("Updated drink type: %s", drink.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Got it, {drink.value}."
+
+    @function_tool
+    @timed_tool
+    async def add_item(
+        self, context: RunContext, drink_type: str, quantity: Quantity = 1
+    ):
+        """Add another drink to the order; later tool calls apply to it.
+
+        Args:
+            drink_type: A drink on the menu (e.g., latte)
+        """
+        try:
+            line = self.order.add_drink(drink_type, quantity)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("add_drink", line.drink.value, quantity)
+        number = self.order.number(line)
+        logger.info("Added item %d: %d x %s", number, quantity, line.drink.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Added item {number}: {quantity} {line.drink.value}."
+
+    @function_tool
+    @timed_tool
+    async def update_quantity(
+        self, context: RunContext, quantity: int, item: ItemNumber = 0
+    ):
+        """Change how many of a drink the customer wants.
+
         Args:
-            drink_type: The type of drink (e.g., latte, cappuccino, espresso, americano, mocha, cold brew)
+            quantity: The new count, at least 1 (use remove_item to drop the drink)
         """
-        self.order_state["drinkType"] = drink_type
-        logger.info(f"Updated drink type: {drink_type}")
-        await self.send_drink_visualization()
-        return f"Got it, {drink_type}."
-    
+        try:
+            line = self.order.set_quantity(quantity, item)
+        except CartError as e:
+            return str(e)
+        self.log_order("set_quantity", quantity, item)
+        logger.info(
+            "Updated quantity of item %d: %d", self.order.number(line), quantity
+        )
+        self.viz_scheduler.mark_dirty()
+        return f"Okay, {quantity} of those."
+
     @function_tool
-    async def update_size(self, context: RunContext, size: str):
+    @timed_tool
+    async def remove_item(self, context: RunContext, item: ItemNumber = 0):
+        """Remove a drink from the order."""
+        try:
+            line = self.order.remove_item(item)
+        except CartError as e:
+            return str(e)
+        self.log_order("remove_item", item)
+        drink = line.drink.value if line.drink else "drink"
+        logger.info("Removed %s, %d items left", drink, len(self.order.items))
+        self.viz_scheduler.mark_dirty()
+        return f"Removed the {drink}; {len(self.order.items)} items left in the order."
+
+    @function_tool
+    @timed_tool
+    async def update_size(self, context: RunContext, size: str, item: ItemNumber = 0):
         """Update the size in the order.
-        
+
         Args:
-            size: The size of the drink (small, medium, or large)
+            size: A size on the menu (e.g., large)
         """
-        self.order_state["size"] = size.lower()
-        logger.info(f"Updated size: {size}")
-        await self.send_drink_visualization()
-        return f"Perfect, {size} size."
-    
+        try:
+            size = self.order.set_size(size, item)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("set_size", size.value, item)
+        logger.info("Updated size: %s", size.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Perfect, {size.value} size."
+
     @function_tool
-    async def update_milk(self, context: RunContext, milk_type: str):
+    @timed_tool
+    async def update_milk(
+        self, context: RunContext, milk_type: str, item: ItemNumber = 0
+    ):
         """Update the milk type in the order.
-        
+
         Args:
-            milk_type: The type of milk (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
+            milk_type: A milk option on the menu (e.g., oat milk, or no milk)
         """
-        self.order_state["milk"] = milk_type
-        logger.info(f"Updated milk: {milk_type}")
-        await self.send_drink_visualization()
-        return f"Noted, {milk_type}."
-    
+        try:
+            milk = self.order.set_milk(milk_type, item)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("set_milk", milk.value, item)
+        logger.info("Updated milk: %s", milk.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Noted, {milk.value}."
+
     @function_tool
-    async def add_extra(self, context: RunContext, extra: str):
+    @timed_tool
+    async def add_extra(self, context: RunContext, extra: str, item: ItemNumber = 0):
         """Add an extra item to the order.
-        
+
+        Args:
+            extra: An extra on the menu (e.g., extra shot)
+        """
+        try:
+            extra = self.order.add_extra(extra, item)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("add_extra", extra.value, item)
+        logger.info("Added extra: %s", extra.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Added {extra.value}."
+
+    @function_tool
+    @timed_tool
+    async def remove_extra(self, context: RunContext, extra: str, item: ItemNumber = 0):
+        """Take an extra off a drink.
+
         Args:
-            extra: An extra item (e.g., extra shot, whipped cream, caramel drizzle, vanilla syrup)
+            extra: The extra to remove (e.g., whipped cream)
         """
-        if extra not in self.order_state["extras"]:
-            self.order_state["extras"].append(extra)
-        logger.info(f"Added extra: {extra}")
-        await self.send_drink_visualization()
-        return f"Added {extra}."
-    
+        try:
+            extra = self.order.remove_extra(extra, item)
+        except (MenuError, CartError) as e:
+            return str(e)
+        self.log_order("remove_extra", extra.value, item)
+        logger.info("Removed extra: %s", extra.value)
+        self.viz_scheduler.mark_dirty()
+        return f"Removed {extra.value}."
+
     @function_tool
+    @timed_tool
     async def update_name(self, context: RunContext, customer_name: str):
         """Update the customer name for the order.
-        
+
         Args:
             customer_name: The customer's name
         """
-        self.order_state["name"] = customer_name
-        logger.info(f"Updated name: {customer_name}")
-        await self.send_drink_visualization()
+        customer_name = self.order.set_name(customer_name)
+        self.log_order("set_name", customer_name)
+        logger.info("Updated name: %s", customer_name)
+        self.viz_scheduler.mark_dirty()
         return f"Great, {customer_name}."
-    
+
     @function_tool
+    @timed_tool
     async def check_order_status(self, context: RunContext):
         """Check what information is still needed for the order."""
-        missing = []
-        if not self.order_state["drinkType"]:
-            missing.append("drink type")
-        if not self.order_state["size"]:
-            missing.append("size")
-        if self.order_state["milk"] is None:
-            missing.append("milk preference")
-        if not self.order_state["name"]:
-            missing.append("name")
-        
-        if missing:
-            return f"Still need: {', '.join(missing)}"
-        else:
-            return f"Order complete: {json.dumps(self.order_state, indent=2)}"
+        return order_line(self.order)
+
+    @function_tool
+    @timed_tool
+    async def get_receipt(self, context: RunContext):
+        """Show the receipt of the customer's last saved order on their screen again."""
+        order_id = await self.resend_receipt()
+        if order_id is None:
+            return "No order has been saved yet, so there is no receipt."
+        return f"The receipt for order {order_id} is on the screen again."
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    # JSON lines through a background thread with LOG_FORMAT=json
+    configure_logging()
 
+    # Everything loaded here is shared by every job in this process
+    timer = PhaseTimer()
+    with timer.phase("vad"):
+        proc.userdata["vad"] = silero.VAD.load()
+    with timer.phase("noise_cancellation"):
+        # For telephony applications, use `BVCTelephony` for best results
+        proc.userdata["noise_cancellation"] = noise_cancellation.BVC()
+    # Parsed once per process; lookups and prompt text are built here
+    with timer.phase("menu"):
+        current_menu()
+    with timer.phase("templates"):
+        prewarm_templates()
+    with timer.phase("fast_path"):
+        get_extractor()
+
+    # Recovers any torn writes up front
+    with timer.phase("order_store"):
+        order_store = create_order_store()
+        order_store.open()
+        proc.userdata["order_store"] = order_store
+
+    # Drops logs of orders abandoned long ago
+    with timer.phase("order_log"):
+        order_log = OrderLog.from_env()
+        if order_log is not None:
+            order_log.open()
+        proc.userdata["order_log"] = order_log
+
+    # TLS context and provider hosts; connections are opened per job (see provider_pool.py)
+    with timer.phase("provider_pool"):
+        proc.userdata["provider_pool"] = ProviderPool.from_env(PROVIDERS)
+
+    with timer.phase("tts_cache"):
+        tts_cache = TTSCache.from_env()
+        tts_cache.open()
+        proc.userdata["tts_cache"] = tts_cache
+
+    proc.userdata["startup_timings"] = {**PLUGIN_IMPORT_TIMINGS, **timer.timings}
+    imports = ", ".join(
+        f"{name}={ms:.0f}ms" for name, ms in PLUGIN_IMPORT_TIMINGS.items()
+    )
+    logger.info("Prewarm finished in %s; plugin imports: %s", timer.summary(), imports)
 
-async def entrypoint(ctx: JobContext):
-    # Logging setup
-    # Add any other context you want in all log entries here
-    ctx.log_context_fields = {
-        "room": ctx.room.name,
-    }
 
+def create_session(
+    ctx: JobContext, usage_collector: metrics.UsageCollector
+) -> AgentSession:
+    # Every session in the job shares the pool's warm provider connections
+    pool = ctx.proc.userdata.get("provider_pool")
     # Set up a voice AI pipeline using OpenAI, Cartesia, AssemblyAI, and the LiveKit turn detector
     session = AgentSession(
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
         # See all available models at https://docs.livekit.io/agents/models/stt/
-        stt=deepgram.STT(model="nova-3"),
+        stt=create_stt(PROVIDERS, pool),
         # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
         # See all available models at https://docs.livekit.io/agents/models/llm/
-        llm=google.LLM(
-                model="gemini-2.5-flash",
-            ),
+        llm=create_llm(PROVIDERS, pool),
         # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
         # See all available models as well as voice selections at https://docs.livekit.io/agents/models/tts/
-        tts=murf.TTS(
-                voice="en-US-matthew", 
-                style="Conversation",
-                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
-                text_pacing=True
-            ),
+        tts=create_tts(PROVIDERS, pool),
         # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
         # See more at https://docs.livekit.io/agents/build/turns
-        turn_detection=MultilingualModel(),
+        # The turn detector is shared by every session on this job's inference executor
+        turn_detection=shared_turn_detector(ctx.proc.userdata, ctx.inference_executor),
         vad=ctx.proc.userdata["vad"],
         # allow the LLM to generate a response while waiting for the end of turn
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
@@ -407,19 +738,124 @@ async def entrypoint(ctx: JobContext):
 
     # Metrics collection, to measure pipeline performance
     # For more information, see https://docs.livekit.io/agents/build/metrics/
-    usage_collector = metrics.UsageCollector()
-
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
 
+    return session
+
+
+async def start_assistant(
+    ctx: JobContext,
+    session: AgentSession,
+    order_session: OrderSession,
+    started: Optional[float] = None,
+    kitchen: Optional[KitchenQueue] = None,
+) -> Assistant:
+    """Start an Assistant on `session`, talking to `order_session`'s customer"""
+    started = started or time.perf_counter()
+
+    # Create assistant and set room reference
+    assistant = Assistant(
+        order_store=ctx.proc.userdata["order_store"],
+        order_session=order_session,
+        tts_cache=ctx.proc.userdata["tts_cache"],
+        kitchen=kitchen,
+        order_log=ctx.proc.userdata.get("order_log"),
+    )
+    assistant.room = ctx.room
+    await assistant.restore_order()
+
+    # Publish the turn's coalesced order update as soon as its tools have run
+    @session.on("function_tools_executed")
+    def _on_function_tools_executed(ev: FunctionToolsExecutedEvent):
+        assistant.viz_scheduler.flush_soon()
+
+    # Per-turn spans: stage latencies from session events, tool and publish timings
+    assistant.tracer.attach(session)
+
+    input_options = RoomInputOptions(
+        noise_cancellation=ctx.proc.userdata["noise_cancellation"],
+    )
+    output_options = RoomOutputOptions()
+    if order_session.identity:
+        # One of several customers in the room: listen only to them, and stay
+        # registered if they drop so a reconnect resumes the same order
+        input_options.participant_identity = order_session.identity
+        input_options.close_on_disconnect = False
+        output_options.audio_track_name = f"barista_{order_session.identity}"
+
+    # Start the session, which initializes the voice pipeline and warms up the models
+    await session.start(
+        agent=assistant,
+        room=ctx.room,
+        room_input_options=input_options,
+        room_output_options=output_options,
+    )
+    logger.info("Agent ready in %.0fms", (time.perf_counter() - started) * 1000)
+
+    # Cold start as the customer experiences it: job start to the first audio
+    @session.on("agent_state_changed")
+    def _on_agent_state_changed(ev: AgentStateChangedEvent):
+        nonlocal started
+        if ev.new_state == "speaking" and started is not None:
+            logger.info(
+                "First audio %.0fms after job start",
+                (time.perf_counter() - started) * 1000,
+            )
+            started = None
+
+    return assistant
+
+
+async def entrypoint(ctx: JobContext):
+    job_started = time.perf_counter()
+
+    # Logging setup
+    # Add any other context you want in all log entries here
+    ctx.log_context_fields = {
+        "room": ctx.room.name,
+    }
+    bind_log_context(room=ctx.room.name)
+
+    usage_collector = metrics.UsageCollector()
+
     async def log_usage():
         summary = usage_collector.get_summary()
-        logger.info(f"Usage: {summary}")
+        logger.info("Usage: %s", summary)
+        tts_cache = ctx.proc.userdata["tts_cache"]
+        logger.info(
+            "TTS cache: %s, %d entries, %d bytes",
+            tts_cache.stats,
+            len(tts_cache),
+            tts_cache.size,
+        )
 
     ctx.add_shutdown_callback(log_usage)
 
+    # Open provider connections while the room connects, so the first turn doesn't wait on TLS
+    provider_pool = ctx.proc.userdata.get("provider_pool")
+    if provider_pool is not None:
+        await provider_pool.attach()
+
+        async def release_provider_pool():
+            logger.info("Provider connections: %s", provider_pool.summary())
+            await provider_pool.release()
+
+        ctx.add_shutdown_callback(release_provider_pool)
+
+    # Make sure orders from this job are durable before the process goes away
+    ctx.add_shutdown_callback(ctx.proc.userdata["order_store"].flush)
+    if ctx.proc.userdata.get("order_log") is not None:
+        ctx.add_shutdown_callback(ctx.proc.userdata["order_log"].flush)
+
+    # Saved orders also go to the baristas' display, if one is configured
+    kitchen = KitchenQueue.from_env()
+    if kitchen is not None:
+        kitchen.start()
+        ctx.add_shutdown_callback(kitchen.aclose)
+
     # # Add a virtual avatar to the session, if desired
     # # For other providers, see https://docs.livekit.io/agents/models/avatar/
     # avatar = hedra.AvatarSession(
@@ -428,23 +864,128 @@ async def entrypoint(ctx: JobContext):
     # # Start the avatar and wait for it to join
     # await avatar.start(session, room=ctx.room)
 
-    # Create assistant and set room reference
-    assistant = Assistant()
-    assistant.room = ctx.room
-    
-    # Start the session, which initializes the voice pipeline and warms up the models
-    await session.start(
-        agent=assistant,
-        room=ctx.room,
-        room_input_options=RoomInputOptions(
-            # For telephony applications, use `BVCTelephony` for best results
-            noise_cancellation=noise_cancellation.BVC(),
-        ),
+    if os.getenv("MULTI_SESSION") == "1":
+        await run_multi_session(ctx, usage_collector, kitchen)
+        return
+
+    session = create_session(ctx, usage_collector)
+    order_session = OrderSession(ctx.room.name)
+    assistant = await start_assistant(
+        ctx, session, order_session, started=job_started, kitchen=kitchen
     )
+    ctx.add_shutdown_callback(assistant.aclose)
+
+    # Clients that missed a drink_state message ask for a fresh snapshot
+    @ctx.room.on("data_received")
+    def _on_data_received(packet: rtc.DataPacket):
+        if packet.topic == SYNC_TOPIC:
+            assistant.resync_drink_visualization()
+        elif packet.topic == RECEIPT_REQUEST_TOPIC:
+            spawn(assistant.resend_receipt())
 
     # Join the room and connect to the user
     await ctx.connect()
 
+    # Only the customer who joined gets back an order they left unfinished
+    participant = await ctx.wait_for_participant()
+    order_session.customer = participant.identity
+    await assistant.restore_order()
+
+
+async def run_multi_session(
+    ctx: JobContext,
+    usage_collector: metrics.UsageCollector,
+    kitchen: Optional[KitchenQueue] = None,
+):
+    """Serve every customer in the room with their own AgentSession and order"""
+    registry = get_registry()
+    sessions: dict[str, AgentSession] = {}
+    assistants: dict[str, Assistant] = {}
+
+    async def _serve(participant: rtc.RemoteParticipant):
+        identity = participant.identity
+        if identity in sessions:
+            return
+        # Runs in its own task, so the tag stays with this customer's session
+        bind_log_context(participant=identity)
+        try:
+            order_session = registry.acquire(ctx.room.name, identity)
+        except SessionLimitError as e:
+            logger.warning("Not serving %s: %s", identity, e)
+            return
+        session = create_session(ctx, usage_collector)
+        sessions[identity] = session
+        try:
+            assistants[identity] = await start_assistant(
+                ctx, session, order_session, kitchen=kitchen
+            )
+        finally:
+            if identity not in assistants:
+                # Not serving them after all; a later join tries again
+                sessions.pop(identity, None)
+                registry.release(ctx.room.name, identity)
+                await session.aclose()
+        logger.info("Serving %s (%d customers in room)", identity, len(sessions))
+
+    async def _release(identity: str):
+        assistant = assistants.pop(identity, None)
+        session = sessions.pop(identity, None)
+        registry.release(ctx.room.name, identity)
+        if session is not None:
+            await session.aclose()
+        if assistant is not None:
+            await assistant.aclose()
+
+    @ctx.room.on("participant_connected")
+    def _on_participant_connected(participant: rtc.RemoteParticipant):
+        spawn(_serve(participant))
+
+    @ctx.room.on("participant_disconnected")
+    def _on_participant_disconnected(participant: rtc.RemoteParticipant):
+        spawn(_release(participant.identity))
+
+    @ctx.room.on("data_received")
+    def _on_data_received(packet: rtc.DataPacket):
+        if packet.participant is None:
+            return
+        assistant = assistants.get(packet.participant.identity)
+        if assistant is None:
+            return
+        if packet.topic == SYNC_TOPIC:
+            assistant.resync_drink_visualization()
+        elif packet.topic == RECEIPT_REQUEST_TOPIC:
+            spawn(assistant.resend_receipt())
+
+    async def _release_all():
+        for identity in list(sessions):
+            registry.release(ctx.room.name, identity)
+        for assistant in list(assistants.values()):
+            await assistant.aclose()
+
+    ctx.add_shutdown_callback(_release_all)
+
+    await ctx.connect()
+    for participant in list(ctx.room.remote_participants.values()):
+        await _serve(participant)
+
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    worker_options = {}
+    if os.getenv("PROMETHEUS_PORT"):
+        # Serves pipeline latency histograms (see telemetry.py) on /metrics
+        worker_options["prometheus_port"] = int(os.environ["PROMETHEUS_PORT"])
+    if os.getenv("LOAD_THRESHOLD"):
+        # CPU load above which the worker takes no new jobs (see benchmarks/bench_load.py)
+        worker_options["load_threshold"] = float(os.environ["LOAD_THRESHOLD"])
+
+    cli.run_app(
+        WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # "thread" runs several rooms per process, sharing prewarmed models
+            job_executor_type=JobExecutorType(
+                os.getenv("AGENT_JOB_EXECUTOR", "process")
+            ),
+            **worker_options,
+        )
+    )
@@ -0,0 +1,144 @@
+"""What the LLM sees of the conversation on each turn.
+
+The chat context grows with every turn and every tool call, and each LLM
+request resends all of it. ``ContextWindow`` prepares a trimmed copy for each
+request (the session's own history is untouched):
+
+- The instructions stay first and byte-identical, followed by the tool
+  schemas, so providers' prompt caching can reuse that prefix every turn.
+- Each customer message is prefixed with a one-line order summary,
+  ``[Order: drink=latte size=large milk=? extras=none name=? | need: ...]``
+  (numbered, ``#1 drink=...; #2 drink=...``, for group orders), so the model
+  never needs an earlier turn (or a JSON dump) to know the order.
+  A message keeps the line it got the first time it was sent, so the history
+  only ever grows at the end and cached prefixes stay valid.
+- Turns whose details are captured in that line are dropped: once more than
+  ``max_turns`` customer turns have accumulated, the oldest are cut back to
+  the last ``keep_turns``. Cutting in steps, not one turn at a time, keeps
+  the prefix stable between cuts.
+
+``prepare`` also returns rough token counts before and after trimming, which
+the turn tracer records next to the provider's reported prompt tokens.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from livekit.agents import llm
+
+from order_model import LineItem, Order
+
+
+def _item_fields(item: dict[str, Any]) -> str:
+    fields = " ".join(
+        f"{key}={item[field] or '?'}"
+        for key, field in (("drink", "drinkType"), ("size", "size"), ("milk", "milk"))
+    )
+    extras = ", ".join(item["extras"]) or "none"
+    quantity = f" qty={item['quantity']}" if item["quantity"] > 1 else ""
+    return f"{fields} extras={extras}{quantity}"
+
+
+def order_line(order: Order) -> str:
+    """Compact, deterministic summary of ``order`` for the LLM."""
+    data = order.to_dict()
+    items = data["items"]
+    if len(items) <= 1:
+        body = _item_fields(items[0] if items else LineItem().to_dict())
+    else:
+        current = order.item()
+        body = "; ".join(
+            f"#{number} {_item_fields(item)}" for number, item in enumerate(items, 1)
+        )
+        body += f"; editing #{order.number(current)}"
+    missing = ", ".join(order.missing()) or "nothing, ready to save"
+    return f"[Order: {body} name={data['name'] or '?'} | need: {missing}]"
+
+
+def estimate_tokens(items: list[llm.ChatItem]) -> int:
+    """Rough token count (about four characters per token)."""
+    chars = 0
+    for item in items:
+        if item.type == "message":
+            chars += len(item.text_content or "")
+        elif item.type == "function_call":
+            chars += len(item.name) + len(item.arguments)
+        elif item.type == "function_call_output":
+            chars += len(item.name) + len(item.output)
+    return chars // 4
+
+
+class ContextWindow:
+    """Trims and annotates the chat context sent to the LLM.
+
+    Args:
+        max_turns: Customer turns kept before older ones are cut.
+        keep_turns: Customer turns left after a cut.
+    """
+
+    def __init__(self, max_turns: int = 16, keep_turns: int = 6) -> None:
+        if not 0 < keep_turns <= max_turns:
+            raise ValueError("Expected 0 < keep_turns <= max_turns")
+        self.max_turns = max_turns
+        self.keep_turns = keep_turns
+        # First item kept after the last cut
+        self._start_id: str | None = None
+        # The order line each customer message was first sent with
+        self._lines: dict[str, str] = {}
+
+    @classmethod
+    def from_env(cls) -> ContextWindow:
+        return cls(
+            max_turns=int(os.getenv("CONTEXT_MAX_TURNS", "16")),
+            keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "6")),
+        )
+
+    def prepare(
+        self, chat_ctx: llm.ChatContext, order: Order
+    ) -> tuple[llm.ChatContext, dict[str, Any]]:
+        """The context to send for this request, and its token estimates."""
+        items = chat_ctx.items
+        head = 0
+        while head < len(items) and _is_instructions(items[head]):
+            head += 1
+        history = items[head:]
+
+        ids = [item.id for item in history]
+        start = ids.index(self._start_id) if self._start_id in ids else 0
+        turns = [
+            i for i, item in enumerate(history) if i >= start and _is_customer(item)
+        ]
+        if len(turns) > self.max_turns:
+            start = turns[-self.keep_turns]
+        self._start_id = ids[start] if start < len(ids) else None
+        kept = history[start:]
+
+        line = order_line(order)
+        annotated = []
+        for item in kept:
+            if _is_customer(item):
+                prefix = self._lines.setdefault(item.id, line)
+                item = item.model_copy(update={"content": [prefix, *item.content]})
+            annotated.append(item)
+        if len(self._lines) > 4 * self.max_turns:
+            live = {item.id for item in kept}
+            self._lines = {k: v for k, v in self._lines.items() if k in live}
+
+        prepared = llm.ChatContext([*items[:head], *annotated])
+        stats = {
+            "items": len(prepared.items),
+            "dropped": len(history) - len(kept),
+            "est_tokens": estimate_tokens(prepared.items),
+            "est_tokens_untrimmed": estimate_tokens(items),
+        }
+        return prepared, stats
+
+
+def _is_instructions(item: llm.ChatItem) -> bool:
+    return item.type == "message" and item.role in ("system", "developer")
+
+
+def _is_customer(item: llm.ChatItem) -> bool:
+    return item.type == "message" and item.role == "user"
@@ -0,0 +1,299 @@
+"""Deterministic slot filling that answers simple order turns without the LLM.
+
+Most order turns are plain lists of menu words ("a large oat milk latte with an
+extra shot", "medium please, my name is Sam"). ``SlotExtractor`` scans the final
+transcript with one compiled regex over the alias vocabulary of the menu and
+only claims a turn when every word is either a menu alias, part of a name
+phrase or conversational filler. Anything else -- questions ("do you have oat
+milk?"), corrections, negations ("no whipped cream"), quantities, unknown
+words, two different drinks in one breath, a different drink than the one being
+ordered (another item, or a change?), any turn once the order has several items
+-- is a miss and the turn goes to the LLM as before. Fuzzy matching is
+deliberately not used here: a wrong guess costs more than an LLM round-trip.
+
+``FAST_PATH`` selects the mode:
+
+- ``off`` (default): every turn goes to the LLM.
+- ``on``: turns the extractor resolves are applied and answered locally.
+- ``ab``: each customer is assigned an arm by hashing room and identity. The
+  ``llm`` arm still runs the extractor in shadow mode and counts what it
+  would have handled, so both arms report a comparable hit rate.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+
+from menu import Menu, current, normalize
+from order_model import Order
+
+FAST_PATH_MODES = ("off", "on", "ab")
+
+# Aliases that are too ambiguous in free speech to act on without the LLM
+# ("no" in "no whipped cream", "short" in "I'm short on time")
+_AMBIGUOUS = frozenset(
+    {"no", "none", "nothing", "cap", "cream", "shot", "short", "little", "big"}
+    | {"regular", "normal", "whole", "black", "med", "sm", "lg", "whipped"}
+)
+
+# Words that can surround an order without changing it
+_FILLER = frozenset(
+    """
+    a an and also add any anything be can could d do else for get give go had
+    have hello here hey hi i id ill im it just let like ll m make may me might
+    my need now of oh ok okay one order please plus s so some that thank thanks
+    the then to today uh um us want we well with would yeah yes you
+    size sized cup
+    """.split()  # noqa: SIM905
+)
+
+# Turns asking about the menu rather than ordering from it: "do you have oat
+# milk", "is the mocha sweet", "have you got any decaf". Requests ("can I get a
+# latte") are orders; a turn ending in "?" is checked separately.
+_QUESTION = re.compile(
+    r"^(?:do|does|did|is|are|was|were|what|whats|which|how|why|when|where|who"
+    r"|any|have you|has)\b"
+)
+
+# "my name is Sam", "name's Sam", "call me Sam", or "it's for Sam" ending the
+# turn; applied to normalized text. A bare "for" or "under" is not a name phrase
+# ("a latte for two", "for here").
+_NAME = re.compile(
+    r"\b(?:(?:my |the )?name is|my name s|name s|call me)\s+([a-z]+)\b"
+    r"|\bit s for\s+([a-z]+)$|\bits for\s+([a-z]+)$"
+)
+
+# Words after a name phrase that are a quantity or part of the order, not a name
+_NOT_NAMES = frozenset(
+    """
+    one two three four five six seven eight nine ten couple few both all
+    later now here there takeaway takeout pickup delivery today tomorrow
+    me myself us him her them someone somebody
+    """.split()  # noqa: SIM905
+)
+
+
+@dataclass
+class Extraction:
+    """What a transcript says about the order, and whether it can be trusted."""
+
+    drink: Enum | None = None
+    size: Enum | None = None
+    milk: Enum | None = None
+    extras: list[Enum] = field(default_factory=list)
+    name: str | None = None
+    miss: str | None = None  # reason the turn can't be handled locally
+
+    @property
+    def hit(self) -> bool:
+        return self.miss is None
+
+
+class SlotExtractor:
+    """Compiled alias automaton over the vocabulary of ``menu``."""
+
+    def __init__(self, menu: Menu | None = None) -> None:
+        self.menu = menu or current()
+        self._slots = {
+            self.menu.Drink: "drink",
+            self.menu.Size: "size",
+            self.menu.Milk: "milk",
+            self.menu.Extra: "extras",
+        }
+        self._aliases: dict[str, Enum] = {}
+        for enum in self._slots:
+            for member in enum:
+                for alias in (member.value, *self.menu.aliases[member]):
+                    key = normalize(alias)
+                    if key not in _AMBIGUOUS:
+                        self._aliases.setdefault(key, member)
+
+        # Longest first, so "extra large" wins over "large" and "oat milk" over "oat"
+        alternation = "|".join(
+            re.escape(alias) for alias in sorted(self._aliases, key=len, reverse=True)
+        )
+        self._pattern = re.compile(rf"\b(?:{alternation})\b")
+
+    def extract(self, transcript: str) -> Extraction:
+        text = normalize(transcript)
+        result = Extraction()
+        if not text:
+            result.miss = "empty"
+            return result
+        if _QUESTION.match(text) or transcript.rstrip().endswith("?"):
+            result.miss = "question"
+            return result
+
+        matched = False
+        covered = []
+        for match in self._pattern.finditer(text):
+            member = self._aliases[match.group()]
+            covered.append(match.span())
+            matched = True
+            slot = self._slots[type(member)]
+            if slot == "extras":
+                if member not in result.extras:
+                    result.extras.append(member)
+                continue
+
+            held = getattr(result, slot)
+            if held is not None and held is not member:
+                result.miss = "conflict"
+                return result
+            setattr(result, slot, member)
+
+        name_match = _NAME.search(text)
+        if name_match:
+            word = name_match.group(name_match.lastindex)
+            if not (word in _FILLER or word in _NOT_NAMES or word in self._aliases):
+                result.name = word.title()
+                covered.append(name_match.span())
+                matched = True
+
+        if not matched:
+            result.miss = "no_match"
+            return result
+
+        leftover = list(text)
+        for start, end in covered:
+            leftover[start:end] = " " * (end - start)
+        if any(word not in _FILLER for word in "".join(leftover).split()):
+            result.miss = "unknown_words"
+        return result
+
+
+_extractor: SlotExtractor | None = None
+
+
+def get_extractor() -> SlotExtractor:
+    """Process-wide extractor; the automaton is compiled once per menu."""
+    global _extractor
+    menu = current()
+    if _extractor is None or _extractor.menu is not menu:
+        _extractor = SlotExtractor(menu)
+    return _extractor
+
+
+def fast_path_mode() -> str:
+    """Mode from ``FAST_PATH``, defaulting to ``off``."""
+    mode = os.getenv("FAST_PATH", "off").lower()
+    if mode not in FAST_PATH_MODES:
+        raise ValueError(
+            f"Unknown FAST_PATH {mode!r}, expected one of {FAST_PATH_MODES}"
+        )
+    return mode
+
+
+def describe(order: Order) -> str:
+    """Spoken summary of the order so far ("a large latte with oat milk")."""
+    drink = " ".join(
+        part.value for part in (order.size, order.drink) if part is not None
+    )
+    parts = [f"a {drink}" if order.drink else drink]
+    if order.milk is not None:
+        parts.append(f"with {order.milk.value}")
+    if order.extras:
+        parts.append("and " + " and ".join(extra.value for extra in order.extras))
+    if order.name:
+        parts.append(f"for {order.name}")
+    return " ".join(part for part in parts if part)
+
+
+def _spoken_list(words: list[str]) -> str:
+    if len(words) < 3:
+        return " or ".join(words)
+    return f"{', '.join(words[:-1])}, or {words[-1]}"
+
+
+def _next_question(missing: str, menu: Menu) -> str:
+    if missing == "drink type":
+        return "What would you like to drink?"
+    if missing == "size":
+        return f"What size would you like: {_spoken_list(menu.options('size'))}?"
+    if missing == "milk preference":
+        milks = _spoken_list(menu.options("milk"))
+        return f"Which milk would you like? We have {milks}."
+    return "Can I get a name for the order?"
+
+
+def reply_for(order: Order) -> str:
+    menu = current()
+    missing = order.missing()
+    if missing:
+        question = _next_question(missing[0], menu)
+    else:
+        extras = _spoken_list(menu.options("extra")[:2])
+        question = (
+            f"Would you like any extras, like {extras}, or shall I place the order?"
+        )
+    return f"Got it, {describe(order)}. {question}"
+
+
+class FastPath:
+    """Per-customer fast path state.
+
+    Args:
+        arm: ``"fast"`` applies resolved turns, ``"llm"`` only counts them.
+
+    ``stats`` counts ``turns``, ``hits`` (handled locally, or would have been in
+    the ``llm`` arm), ``misses``, misses by reason (``miss_<reason>``) and the
+    total extraction time in ``extract_us``.
+    """
+
+    def __init__(self, arm: str) -> None:
+        self.arm = arm
+        self.stats: Counter[str] = Counter()
+
+    @classmethod
+    def for_customer(cls, room: str, identity: str | None) -> FastPath | None:
+        """The customer's arm for the configured mode, or None when disabled."""
+        mode = fast_path_mode()
+        if mode == "off":
+            return None
+        if mode == "on":
+            return cls("fast")
+        bucket = zlib.crc32(f"{room}/{identity or ''}".encode()) % 2
+        return cls("fast" if bucket else "llm")
+
+    @property
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["turns"] if self.stats["turns"] else 0.0
+
+    def handle(self, transcript: str, order: Order) -> str | None:
+        """Apply a resolvable turn to ``order`` and return the spoken reply.
+
+        Returns None when the LLM should handle the turn (a miss, or the
+        ``llm`` arm).
+        """
+        start = time.perf_counter()
+        result = get_extractor().extract(transcript)
+        # Group orders, and "a mocha" after a latte (another item, or a change?)
+        held = order.drink
+        if result.hit and len(order.items) > 1:
+            result.miss = "cart"
+        elif result.hit and held is not None and result.drink not in (None, held):
+            result.miss = "drink_change"
+        self.stats["extract_us"] += round((time.perf_counter() - start) * 1e6)
+        self.stats["turns"] += 1
+        if not result.hit:
+            self.stats["misses"] += 1
+            self.stats[f"miss_{result.miss}"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        if self.arm != "fast":
+            return None
+
+        for slot in ("drink", "size", "milk", "name"):
+            value = getattr(result, slot)
+            if value is not None:
+                setattr(order, slot, value)
+        for extra in result.extras:
+            order.item(create=True).extras[extra] = None
+        return reply_for(order)
@@ -0,0 +1,359 @@
+"""Live feed of saved orders for the baristas.
+
+``save_order`` hands every saved order to a ``KitchenQueue``, which delivers it
+to a pluggable sink from a background task:
+
+- ``unix:<path>``: JSON lines over a Unix socket to a kitchen display (the
+  agent connects and reconnects; ``python src/kitchen.py listen <path>`` is a
+  minimal display that prints tickets)
+- ``file:<path>``: JSON lines appended to a file, for ``tail -f``
+- ``printer``: a ticket-printer stand-in that renders each ticket as text and
+  takes ``KITCHEN_PRINT_SECONDS`` per ticket, like a slow receipt printer
+
+``KITCHEN_SINK`` selects one (unset or ``off`` disables the feed).
+
+``submit`` never waits: the order goes into a bounded buffer and the call
+returns. The sender takes whatever is buffered, up to ``batch`` orders,
+waiting ``linger`` seconds for a burst to fill a batch, and gives the sink
+``send_timeout`` seconds per order in the batch. A batch that fails with an I/O
+error or a timeout is retried with backoff while new orders keep buffering; any
+other error from the sink would only repeat, so that batch is logged and
+dropped. Once the buffer is full the oldest orders are dropped (and counted);
+they are still in the order store and index, so nothing is lost but the live
+ticket.
+
+Queue depth, delivered/dropped/failed orders, batch sizes and send latency
+are exported as Prometheus metrics next to the turn latency histograms.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+import prometheus_client
+
+from order_model import line_items
+
+logger = logging.getLogger("agent.kitchen")
+
+QUEUE_DEPTH = prometheus_client.Gauge(
+    "barista_kitchen_queue_depth",
+    "Orders buffered for the kitchen feed",
+    multiprocess_mode="livesum",
+)
+ORDERS = prometheus_client.Counter(
+    "barista_kitchen_orders_total",
+    "Orders handled by the kitchen feed, by outcome",
+    ["outcome"],
+)
+BATCH_SIZE = prometheus_client.Histogram(
+    "barista_kitchen_batch_size",
+    "Orders per batch sent to the kitchen sink",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+SEND_SECONDS = prometheus_client.Histogram(
+    "barista_kitchen_send_seconds",
+    "Time to hand one batch to the kitchen sink",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def ticket(order: dict[str, Any]) -> str:
+    """Plain-text ticket for one order, a few lines per item."""
+    lines = [f"#{order.get('orderId', '?')}  {order.get('name')}\n"]
+    for item in line_items(order):
+        extras = ", ".join(item.get("extras") or []) or "no extras"
+        quantity = item.get("quantity") or 1
+        lines.append(
+            f"  {f'{quantity} x ' if quantity > 1 else ''}"
+            f"{item.get('size')} {item.get('drinkType')}, {item.get('milk')}\n"
+            f"    {extras}\n"
+        )
+    return "".join(lines)
+
+
+def _lines(batch: list[dict[str, Any]]) -> bytes:
+    return "".join(
+        json.dumps(order, separators=(",", ":")) + "\n" for order in batch
+    ).encode("utf-8")
+
+
+class KitchenSink:
+    """Where kitchen orders go. ``send`` raises ``OSError`` to have a batch retried."""
+
+    name = "sink"
+
+    async def send(self, batch: list[dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FileSink(KitchenSink):
+    """Appends orders as JSON lines, written in a worker thread."""
+
+    name = "file"
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = Path(path)
+
+    def _write(self, data: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    async def send(self, batch: list[dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._write, _lines(batch))
+
+
+class UnixSocketSink(KitchenSink):
+    """Streams orders as JSON lines to a display listening on a Unix socket."""
+
+    name = "unix"
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = str(path)
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def send(self, batch: list[dict[str, Any]]) -> None:
+        if self._writer is None or self._writer.is_closing():
+            _, self._writer = await asyncio.open_unix_connection(self.path)
+        try:
+            self._writer.write(_lines(batch))
+            await self._writer.drain()
+        except OSError:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+
+class PrinterSink(KitchenSink):
+    """Ticket printer stand-in: logs each ticket after ``seconds_per_ticket``."""
+
+    name = "printer"
+
+    def __init__(self, seconds_per_ticket: float = 0.5) -> None:
+        self.seconds_per_ticket = seconds_per_ticket
+        self.printed: list[str] = []
+
+    async def send(self, batch: list[dict[str, Any]]) -> None:
+        for order in batch:
+            await asyncio.sleep(self.seconds_per_ticket)
+            text = ticket(order)
+            self.printed.append(text)
+            logger.info("Kitchen ticket:\n%s", text)
+
+
+def create_sink(spec: str) -> KitchenSink:
+    """Sink for a ``KITCHEN_SINK`` value like ``unix:/tmp/kitchen.sock``."""
+    kind, _, target = spec.partition(":")
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "unix" and target:
+        return UnixSocketSink(target)
+    if kind == "printer":
+        return PrinterSink(float(os.getenv("KITCHEN_PRINT_SECONDS", "0.5")))
+    raise ValueError(
+        f"Unknown KITCHEN_SINK {spec!r}, expected file:<path>, unix:<path> or printer"
+    )
+
+
+class KitchenQueue:
+    """Bounded, batching queue between ``save_order`` and a kitchen sink.
+
+    Args:
+        sink: Where batches are delivered.
+        maxsize: Orders buffered before the oldest are dropped.
+        batch: Most orders handed to the sink at once.
+        linger: Seconds to wait for more orders before sending a partial batch.
+        send_timeout: Seconds per order a batch may take before it counts as failed.
+        retry_delay: First retry backoff in seconds, doubling up to 30 s.
+    """
+
+    def __init__(
+        self,
+        sink: KitchenSink,
+        *,
+        maxsize: int = 256,
+        batch: int = 16,
+        linger: float = 0.05,
+        send_timeout: float = 2.0,
+        retry_delay: float = 0.5,
+    ) -> None:
+        self.sink = sink
+        self.maxsize = maxsize
+        self.batch = batch
+        self.linger = linger
+        self.send_timeout = send_timeout
+        self.retry_delay = retry_delay
+        self.stats = {
+            "submitted": 0,
+            "sent": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+
+        self._buffer: deque[dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    @classmethod
+    def from_env(cls) -> KitchenQueue | None:
+        spec = os.getenv("KITCHEN_SINK", "off")
+        if spec in ("", "off"):
+            return None
+        return cls(
+            create_sink(spec),
+            maxsize=int(os.getenv("KITCHEN_QUEUE_SIZE", "256")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        if self._task is None or (self._task.done() and not self._closing):
+            self._task = asyncio.create_task(self._run(), name="kitchen-queue")
+
+    def submit(self, order: dict[str, Any]) -> None:
+        """Queue ``order`` for the kitchen without waiting."""
+        if len(self._buffer) >= self.maxsize:
+            dropped = self._buffer.popleft()
+            self.stats["dropped"] += 1
+            ORDERS.labels(outcome="dropped").inc()
+            QUEUE_DEPTH.dec()
+            logger.warning(
+                "Kitchen feed backed up, dropped order %s", dropped.get("orderId")
+            )
+        self._buffer.append(order)
+        self.stats["submitted"] += 1
+        QUEUE_DEPTH.inc()
+        self._ready.set()
+        self.start()
+
+    async def _next_batch(self) -> list[dict[str, Any]]:
+        while not self._buffer:
+            self._ready.clear()
+            await self._ready.wait()
+        if len(self._buffer) < self.batch and not self._closing:
+            # Let a burst of orders ride together
+            await asyncio.sleep(self.linger)
+        return [self._buffer[i] for i in range(min(self.batch, len(self._buffer)))]
+
+    async def _run(self) -> None:
+        delay = self.retry_delay
+        while True:
+            batch = await self._next_batch()
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.sink.send(batch), self.send_timeout * len(batch)
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                self.stats["failed"] += 1
+                ORDERS.labels(outcome="failed").inc(len(batch))
+                logger.warning(
+                    "Kitchen %s sink failed (%r), retrying %d orders in %.1fs",
+                    self.sink.name,
+                    e,
+                    len(batch),
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            except Exception:
+                # A bug or an order the sink can't take; a retry would fail too
+                self.stats["dropped"] += len(batch)
+                ORDERS.labels(outcome="dropped").inc(len(batch))
+                logger.exception(
+                    "Kitchen %s sink failed, dropping %d orders",
+                    self.sink.name,
+                    len(batch),
+                )
+                self._remove(batch)
+                continue
+
+            delay = self.retry_delay
+            SEND_SECONDS.observe(time.perf_counter() - start)
+            BATCH_SIZE.observe(len(batch))
+            ORDERS.labels(outcome="sent").inc(len(batch))
+            self.stats["sent"] += len(batch)
+            self.stats["batches"] += 1
+            self._remove(batch)
+
+    def _remove(self, batch: list[dict[str, Any]]) -> None:
+        # Orders dropped meanwhile came off the front, so the batch may
+        # already be partly gone; remove only what is still there
+        for order in batch:
+            if self._buffer and self._buffer[0] is order:
+                self._buffer.popleft()
+                QUEUE_DEPTH.dec()
+
+    async def aclose(self, timeout: float = 2.0) -> None:
+        """Deliver what is buffered (up to ``timeout`` seconds), then stop."""
+        self._closing = True
+        if self._task is not None:
+            deadline = time.monotonic() + timeout
+            while self._buffer and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._buffer:
+            logger.warning("Kitchen feed closed with %d undelivered", len(self._buffer))
+            QUEUE_DEPTH.dec(len(self._buffer))
+            self._buffer.clear()
+        await self.sink.aclose()
+        logger.info("Kitchen feed: %s", self.stats)
+
+
+async def listen(path: str) -> None:
+    """Minimal kitchen display: print a ticket for every order received."""
+
+    async def _client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async for line in reader:
+            print(ticket(json.loads(line)), flush=True)
+        writer.close()
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(_client, path)
+    print(f"Listening for orders on {path}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Brown Cafe kitchen order feed")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listen_parser = sub.add_parser("listen", help="print orders sent to a socket")
+    listen_parser.add_argument(
+        "path", nargs="?", default="/tmp/brown-cafe-kitchen.sock"
+    )
+    args = parser.parse_args()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(listen(args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""The menu catalog: what can be ordered, what it is called and what it costs.
+
+The menu lives in ``menu.json`` (or ``MENU_PATH``). It is loaded once per process
+and shared read-only by every session. When a file is loaded, the agent's
+per-request lookups are built once into a ``Menu``:
+
+- one str enum per category (``menu.Drink``, ``menu.Size``, ``menu.Milk``,
+  ``menu.Extra``). Orders hold members of these enums.
+- one ``AliasIndex`` per category. It resolves what the customer said to a
+  member.
+- price tables in cents, and the cup colors and sizes used by the
+  visualization.
+- the menu text for the agent's instructions. It is identical for a given
+  file, so the prompt prefix stays cacheable.
+
+``current()`` returns the loaded menu and never touches the file after the
+first load. A watcher thread stats the file every ``MENU_RELOAD_SECONDS``
+(default 2; 0 turns reloading off). When the file has changed, a new ``Menu`` is
+built on that thread and swapped in, so adding a drink means editing
+``menu.json`` and nothing else, and a reload never stalls the event loop. If the
+file fails to load, the error is logged and the previous menu stays.
+
+An order in progress keeps the members it already holds. Members are str
+enums, so they compare equal to the new menu's members and to plain strings.
+"""
+
+from __future__ import annotations
+
+import difflib
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Generic, TypeVar
+
+logger = logging.getLogger("agent.menu")
+
+DEFAULT_MENU_PATH = Path(__file__).resolve().parent.parent / "menu.json"
+
+# Category -> (section in menu.json, enum name, name used in error messages)
+CATEGORIES = {
+    "drink": ("drinks", "Drink", "drink"),
+    "size": ("sizes", "Size", "size"),
+    "milk": ("milks", "Milk", "milk option"),
+    "extra": ("extras", "Extra", "extra"),
+}
+
+# Words that carry no menu meaning ("a large size please")
+_FILLER = frozenset(
+    {"a", "an", "the", "please", "size", "sized", "cup", "one", "some", "of", "with"}
+)
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_COLOR = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+E = TypeVar("E", bound=Enum)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation-free, single-spaced form used for alias lookups."""
+    return " ".join(_NON_ALNUM.sub(" ", text.lower()).split())
+
+
+class MenuError(ValueError):
+    """A value that isn't on the menu. ``options`` lists what is."""
+
+    def __init__(self, kind: str, value: str, options: list[str]) -> None:
+        super().__init__(
+            f"Sorry, {value!r} isn't a {kind} we offer. Options are: {', '.join(options)}."
+        )
+        self.kind = kind
+        self.value = value
+        self.options = options
+
+
+class AliasIndex(Generic[E]):
+    """Resolves free text to a member of ``enum`` in O(1) for known aliases.
+
+    Canonical values and their squashed forms ("oatmilk") are always included.
+
+    Args:
+        enum: The menu enum to resolve to.
+        kind: Human-readable name used in error messages ("drink", "milk").
+        aliases: Other ways customers (and STT) say each member.
+        cutoff: Similarity (0-1) a fuzzy match needs to be accepted.
+    """
+
+    def __init__(
+        self,
+        enum: type[E],
+        kind: str,
+        aliases: dict[E, tuple[str, ...]] | None = None,
+        cutoff: float = 0.8,
+    ) -> None:
+        self.enum = enum
+        self.kind = kind
+        self.cutoff = cutoff
+
+        self._index: dict[str, E] = {}
+        for member in enum:
+            for alias in (member.value, *(aliases or {}).get(member, ())):
+                key = normalize(alias)
+                self._index.setdefault(key, member)
+                self._index.setdefault(key.replace(" ", ""), member)
+        self._keys = list(self._index)
+        self.resolve = functools.lru_cache(maxsize=1024)(self._resolve)
+
+    def _resolve(self, text: str) -> E | None:
+        key = normalize(text)
+        member = self._index.get(key) or self._index.get(key.replace(" ", ""))
+        if member is not None:
+            return member
+
+        key = " ".join(word for word in key.split() if word not in _FILLER)
+        member = self._index.get(key) or self._index.get(key.replace(" ", ""))
+        if member is not None or not key:
+            return member
+
+        # STT near-misses: "late", "oak milk", "capuccino"
+        match = difflib.get_close_matches(key, self._keys, n=1, cutoff=self.cutoff)
+        return self._index[match[0]] if match else None
+
+    def parse(self, text: str) -> E:
+        """Like ``resolve``, but raises ``MenuError`` for unknown values."""
+        member = self.resolve(text)
+        if member is None:
+            raise MenuError(self.kind, text, [m.value for m in self.enum])
+        return member
+
+
+def _cents(value: Any, where: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{where}: price must be a non-negative number")
+    return round(value * 100)
+
+
+class Menu:
+    """One version of the menu. Never modified once built.
+
+    Args:
+        data: The parsed menu file.
+        version: Identifies the content; it changes whenever the file does.
+    """
+
+    def __init__(self, data: dict[str, Any], version: str = "") -> None:
+        self.version = version
+        self.name: str = data.get("name", "Brown Cafe")
+        self.currency: str = data.get("currency", "USD")
+        self.symbol: str = data.get("symbol", "$")
+
+        self.enums: dict[str, type[Enum]] = {}
+        self.indexes: dict[str, AliasIndex] = {}
+        self.aliases: dict[Enum, tuple[str, ...]] = {}
+        # Category -> canonical value -> cents
+        self.prices: dict[str, dict[str, int]] = {}
+        for category, (section, enum_name, kind) in CATEGORIES.items():
+            items = data.get(section)
+            if not isinstance(items, dict) or not items:
+                raise ValueError(f"Menu needs at least one entry in {section!r}")
+            ids = {
+                name: item.get("id") or normalize(name).replace(" ", "_").upper()
+                for name, item in items.items()
+            }
+            if len(set(ids.values())) != len(ids):
+                raise ValueError(f"Duplicate names in {section!r}")
+            enum = Enum(enum_name, {ids[name]: name for name in items}, type=str)
+
+            self.enums[category] = enum
+            self.prices[category] = {}
+            for member in enum:
+                item = items[member.value]
+                self.aliases[member] = tuple(item.get("aliases", ()))
+                self.prices[category][member.value] = _cents(
+                    item.get("price", 0), f"{section}.{member.value}"
+                )
+            self.indexes[category] = AliasIndex(enum, kind, self.aliases)
+
+        self.Drink, self.Size, self.Milk, self.Extra = self.enums.values()
+        self.drinks, self.sizes, self.milks, self.extras = self.indexes.values()
+
+        # Cup color per drink and cup dimensions per size, for the visualization
+        self.colors: dict[str, str] = {}
+        for name, item in data["drinks"].items():
+            color = item.get("color", "")
+            if not _COLOR.match(color):
+                raise ValueError(f"drinks.{name}: color must look like #A67C52")
+            self.colors[name] = color
+        self.cups: dict[str, dict[str, str]] = {}
+        for name, item in data["sizes"].items():
+            cup = item.get("cup") or {}
+            if not (cup.get("width") and cup.get("height")):
+                raise ValueError(f"sizes.{name}: cup needs a width and height")
+            self.cups[name] = {"width": cup["width"], "height": cup["height"]}
+
+        self.text = self._describe()
+
+    def options(self, category: str) -> list[str]:
+        """Canonical values for ``category``, in menu order."""
+        return list(self.prices[category])
+
+    def format_price(self, cents: int) -> str:
+        return f"{self.symbol}{cents // 100}.{cents % 100:02d}"
+
+    def line_total(self, item: dict[str, Any]) -> int:
+        """Price in cents of one line item (as from ``LineItem.to_dict``).
+
+        A value that is no longer on the menu adds nothing.
+        """
+        prices = self.prices
+        unit = (
+            prices["drink"].get(item.get("drinkType"), 0)
+            + prices["size"].get(item.get("size"), 0)
+            + prices["milk"].get(item.get("milk"), 0)
+            + sum(prices["extra"].get(extra, 0) for extra in item.get("extras") or ())
+        )
+        return unit * (item.get("quantity") or 1)
+
+    def _describe(self) -> str:
+        """Menu text for the instructions; other categories add to the drink price."""
+        lines = []
+        for category, label in (
+            ("drink", "Drinks"),
+            ("size", "Sizes"),
+            ("milk", "Milk"),
+            ("extra", "Extras"),
+        ):
+            entries = []
+            for value, cents in self.prices[category].items():
+                if category == "drink":
+                    entries.append(f"{value} {self.format_price(cents)}")
+                elif cents:
+                    entries.append(f"{value} (+{self.format_price(cents)})")
+                else:
+                    entries.append(value)
+            lines.append(f"{label}: {', '.join(entries)}")
+        return "\n".join(lines)
+
+
+def load(path: str | os.PathLike) -> Menu:
+    """Parse and validate a menu file."""
+    raw = Path(path).read_bytes()
+    try:
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return Menu(data, version=hashlib.sha256(raw).hexdigest()[:12])
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid menu {path}: {e}") from e
+
+
+class MenuSource:
+    """The latest ``Menu`` loaded from ``path``, reloaded when the file changes.
+
+    Args:
+        path: The menu file.
+        reload_seconds: Time between checks for changes; 0 never reloads.
+        listeners: Called with the new menu after each reload, on the watcher
+            thread.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        reload_seconds: float = 2.0,
+        listeners: list[Callable[[Menu], None]] | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+        self.listeners = listeners if listeners is not None else []
+        self._menu: Menu | None = None
+        self._stamp: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> MenuSource:
+        return cls(
+            os.getenv("MENU_PATH") or DEFAULT_MENU_PATH,
+            reload_seconds=float(os.getenv("MENU_RELOAD_SECONDS", "2")),
+            **kwargs,
+        )
+
+    def current(self) -> Menu:
+        """The loaded menu; only the first call reads the file (blocking)."""
+        menu = self._menu
+        if menu is None:
+            menu = self.check()
+            self.watch()
+        return menu
+
+    def watch(self) -> None:
+        """Start checking the file for changes in the background (idempotent)."""
+        with self._lock:
+            if self._watcher is not None or not self.reload_seconds:
+                return
+            self._watcher = threading.Thread(
+                target=self._watch, name="menu-watcher", daemon=True
+            )
+            self._watcher.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_seconds):
+            try:
+                self.check()
+            except Exception:
+                # Keep watching: the file may be fixed, or a listener may recover
+                logger.exception("Menu reload failed")
+
+    def close(self) -> None:
+        """Stop the watcher thread."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def check(self) -> Menu:
+        """Load the file if it changed since it was last loaded (blocking)."""
+        with self._lock:
+            old = self._menu
+            try:
+                stat = os.stat(self.path)
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if stamp == self._stamp and old is not None:
+                    return old
+                # Remember the stamp even if loading fails, to log a bad edit once
+                self._stamp = stamp
+                menu = load(self.path)
+            except (OSError, ValueError) as e:
+                if old is None:
+                    raise
+                logger.error("Keeping menu %s: %s", old.version, e)
+                return old
+            if old is not None and menu.version == old.version:
+                return old
+            self._menu = menu
+
+        logger.info("Loaded menu %s from %s", menu.version, self.path)
+        if old is not None:
+            for listener in self.listeners:
+                listener(menu)
+        return menu
+
+
+_listeners: list[Callable[[Menu], None]] = []
+
+
+@functools.lru_cache(maxsize=1)
+def source() -> MenuSource:
+    """The process-wide menu source, configured from the environment."""
+    return MenuSource.from_env(listeners=_listeners)
+
+
+def current() -> Menu:
+    """The menu every session reads, reloaded when the file changes."""
+    return source().current()
+
+
+def on_reload(callback: Callable[[Menu], None]) -> None:
+    """Call ``callback`` with the new menu whenever the menu file is reloaded."""
+    _listeners.append(callback)
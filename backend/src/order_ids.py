@@ -0,0 +1,81 @@
+"""Order IDs: sortable, unique across workers, assigned once per order.
+
+Order files and receipt numbers used to come from separate ``datetime.now()``
+calls at one-second resolution, so two orders in the same second could
+overwrite each other's file or get a receipt number that didn't match.
+
+IDs are ULIDs: 26 Crockford base32 characters encoding a 48-bit millisecond
+timestamp followed by 80 random bits. They sort by creation time as plain
+strings. Within one process they are strictly increasing: an ID created in the
+same millisecond as the previous one (or after the clock stepped back)
+increments the random part instead of drawing a new one. Across processes the
+80 random bits make a collision practically impossible.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {c: i for i, c in enumerate(_ALPHABET)}
+_RANDOM_BITS = 80
+ID_LENGTH = 26
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class OrderIdGenerator:
+    """Monotonic ULID generator, safe to share between job threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def reset(self) -> None:
+        """Forget the last ID (a forked child must not continue its parent's)."""
+        with self._lock:
+            self._last_ms = -1
+
+    def new(self, now: float | None = None) -> str:
+        """A new ID for an order created at ``now`` (default: the current time)."""
+        ms = int((time.time() if now is None else now) * 1000)
+        with self._lock:
+            if ms > self._last_ms:
+                self._last_ms = ms
+                # Top bit clear leaves room to increment within a millisecond
+                self._random = int.from_bytes(os.urandom(10), "big") >> 1
+            else:
+                self._random += 1
+                if self._random >> _RANDOM_BITS:
+                    self._last_ms += 1
+                    self._random = int.from_bytes(os.urandom(10), "big") >> 1
+            return _encode(self._last_ms << _RANDOM_BITS | self._random)
+
+
+def created_at(order_id: str) -> datetime:
+    """Local time an order ID was created, to the millisecond."""
+    if len(order_id) != ID_LENGTH:
+        raise ValueError(f"Not an order ID: {order_id!r}")
+    value = 0
+    for char in order_id[:10].upper():
+        try:
+            value = value * 32 + _DECODE[char]
+        except KeyError:
+            raise ValueError(f"Not an order ID: {order_id!r}") from None
+    return datetime.fromtimestamp(value / 1000)
+
+
+_generator = OrderIdGenerator()
+os.register_at_fork(after_in_child=_generator.reset)
+
+new_order_id = _generator.new
@@ -0,0 +1,518 @@
+"""Queryable index of completed orders.
+
+Answering "how many oat lattes today" from the order files means opening and
+parsing every order ever saved. The index keeps one segment per day instead:
+
+- ``<day>.log``: rows appended by the order store's writer thread right after
+  each batch of orders is durable (one short JSON array per drink, no fsync;
+  the index can always be rebuilt from the orders).
+- ``<day>.seg``: a sealed, columnar copy of a finished day (one list per field)
+  plus secondary indexes from drink, size, milk, extra and hour to row numbers,
+  and the count for each value. Loading it parses one small file and builds
+  nothing.
+
+A row is one drink: an order for two lattes and a mocha adds three rows, so
+counts are drinks sold. Values are stored in their canonical menu spelling
+(``oat milk``, not ``Oat``), so legacy orders and filters like ``--milk oat``
+line up.
+
+Queries look at one day at a time and answer counts from the postings, so an
+aggregate touches only the days in range and only the rows that match the
+smallest filter. ``query`` streams matching orders day by day::
+
+    python src/order_index.py count --drink latte --milk oat      # today
+    python src/order_index.py group-by drink --from 2025-11-01
+    python src/order_index.py query --extra "extra shot" --hour 8 --json
+    python src/order_index.py rebuild --workers 8
+
+``rebuild`` scans the order segments and any legacy ``order_*.json`` files in
+parallel worker processes and rewrites every day as a sealed segment. Other
+commands seal finished days' logs first.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from menu import current, normalize
+from order_model import line_items
+from order_store import DEFAULT_ORDERS_DIR, SEGMENT_PREFIX, SEGMENT_SUFFIX
+
+logger = logging.getLogger("agent.order_index")
+
+SEGMENT_VERSION = 1
+
+# Row layout in day logs and column names in sealed segments
+COLUMNS = ("time", "drink", "size", "milk", "extras", "name")
+# Fields with a secondary index (hour is derived from time)
+INDEXED = ("drink", "size", "milk", "extras", "hour")
+
+# Index field -> menu category
+_CATEGORY = {"drink": "drink", "size": "size", "milk": "milk", "extras": "extra"}
+
+
+def canonical(field: str, value: Any) -> str | None:
+    """Menu spelling of ``value`` for ``field``; unknown values are normalized."""
+    if value is None or value == "":
+        return None
+    member = current().indexes[_CATEGORY[field]].resolve(str(value))
+    return member.value if member is not None else normalize(str(value))
+
+
+def encode(order: dict[str, Any]) -> tuple[str, list[list[Any]]] | None:
+    """The day and index rows (one per drink) for a saved order.
+
+    Returns None for an order without a timestamp.
+    """
+    try:
+        stamp = datetime.fromisoformat(order["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    seconds = stamp.hour * 3600 + stamp.minute * 60 + stamp.second
+    rows = []
+    for item in line_items(order):
+        extras = [canonical("extras", extra) for extra in item.get("extras") or []]
+        row = [
+            seconds,
+            canonical("drink", item.get("drinkType")),
+            canonical("size", item.get("size")),
+            canonical("milk", item.get("milk")),
+            [extra for extra in extras if extra],
+            order.get("name"),
+        ]
+        rows.extend([row] * max(1, int(item.get("quantity") or 1)))
+    return stamp.date().isoformat(), rows
+
+
+class DaySegment:
+    """One day of orders, stored by column, with postings per indexed value."""
+
+    def __init__(self, day: str) -> None:
+        self.day = day
+        self.columns: dict[str, list[Any]] = {name: [] for name in COLUMNS}
+        self.postings: dict[str, dict[str, list[int]]] = {
+            name: defaultdict(list) for name in INDEXED
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["time"])
+
+    def append(self, row: list[Any]) -> None:
+        number = len(self)
+        for name, value in zip(COLUMNS, row):
+            self.columns[name].append(value)
+        time, drink, size, milk, extras, _ = row
+        for name, value in (("drink", drink), ("size", size), ("milk", milk)):
+            if value is not None:
+                self.postings[name][value].append(number)
+        for extra in dict.fromkeys(extras):
+            self.postings["extras"][extra].append(number)
+        self.postings["hour"][str(time // 3600)].append(number)
+
+    def counts(self, field: str) -> dict[str, int]:
+        return {value: len(rows) for value, rows in self.postings[field].items()}
+
+    def matches(self, filters: dict[str, str]) -> list[int]:
+        """Row numbers matching every filter, in time order within the day."""
+        if not filters:
+            return list(range(len(self)))
+        # Walk the shortest posting list and check the rest per row
+        lists = sorted(
+            (
+                (self.postings[field].get(value, []), field, value)
+                for field, value in filters.items()
+            ),
+            key=lambda item: len(item[0]),
+        )
+        rows, *_ = lists[0]
+        for _, field, value in lists[1:]:
+            if field == "extras":
+                column = self.columns["extras"]
+                rows = [row for row in rows if value in column[row]]
+            elif field == "hour":
+                column = self.columns["time"]
+                rows = [row for row in rows if str(column[row] // 3600) == value]
+            else:
+                column = self.columns[field]
+                rows = [row for row in rows if column[row] == value]
+        return rows
+
+    def order(self, row: int) -> dict[str, Any]:
+        seconds = self.columns["time"][row]
+        return {
+            "timestamp": f"{self.day}T{seconds // 3600:02d}:"
+            f"{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+            "drinkType": self.columns["drink"][row],
+            "size": self.columns["size"][row],
+            "milk": self.columns["milk"][row],
+            "extras": list(self.columns["extras"][row]),
+            "name": self.columns["name"][row],
+        }
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "v": SEGMENT_VERSION,
+            "day": self.day,
+            "rows": len(self),
+            "columns": self.columns,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> DaySegment:
+        segment = cls(data["day"])
+        segment.columns = data["columns"]
+        for name in INDEXED:
+            segment.postings[name].update(data["postings"][name])
+        return segment
+
+
+class OrderIndex:
+    """Daily order segments under ``root``, with a query API.
+
+    Args:
+        root: Directory holding the ``<day>.log`` and ``<day>.seg`` files.
+        cache_days: How many sealed days to keep parsed in memory.
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike = Path(DEFAULT_ORDERS_DIR) / "index",
+        cache_days: int = 64,
+    ) -> None:
+        self.root = Path(root)
+        self.cache_days = cache_days
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, DaySegment] = OrderedDict()
+
+    @classmethod
+    def from_env(cls, orders_dir: str | None = None) -> OrderIndex | None:
+        """The index for ``ORDERS_DIR`` unless ``ORDER_INDEX=0``."""
+        if os.getenv("ORDER_INDEX", "1").lower() in ("0", "off", "false"):
+            return None
+        orders_dir = orders_dir or os.getenv("ORDERS_DIR", DEFAULT_ORDERS_DIR)
+        return cls(Path(orders_dir) / "index")
+
+    def _log(self, day: str) -> Path:
+        return self.root / f"{day}.log"
+
+    def _seg(self, day: str) -> Path:
+        return self.root / f"{day}.seg"
+
+    # -- writing -------------------------------------------------------------
+
+    def add(self, orders: Iterable[dict[str, Any]]) -> int:
+        """Append ``orders`` to their days' logs (blocking). Returns rows added."""
+        lines: dict[str, list[str]] = defaultdict(list)
+        for order in orders:
+            encoded = encode(order)
+            if encoded is None:
+                logger.warning("Not indexing order without a timestamp: %r", order)
+                continue
+            day, rows = encoded
+            lines[day].extend(
+                json.dumps(row, separators=(",", ":")) + "\n" for row in rows
+            )
+
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            for day, rows in lines.items():
+                with open(self._log(day), "a", encoding="utf-8") as f:
+                    f.write("".join(rows))
+                self._cache.pop(day, None)
+        return sum(len(rows) for rows in lines.values())
+
+    def seal(self, before: str | None = None) -> list[str]:
+        """Turn the logs of days before ``before`` (default today) into segments."""
+        before = before or date.today().isoformat()
+        sealed = []
+        for path in sorted(self.root.glob("*.log")):
+            day = path.stem
+            if day >= before:
+                continue
+            self._write_segment(self.load(day))
+            path.unlink()
+            sealed.append(day)
+        return sealed
+
+    def _write_segment(self, segment: DaySegment) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._seg(segment.day).with_suffix(".seg.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(segment.to_json(), f, separators=(",", ":"))
+        os.replace(tmp, self._seg(segment.day))
+
+    # -- reading -------------------------------------------------------------
+
+    def days(self) -> list[str]:
+        """Every day with indexed orders, oldest first."""
+        return sorted(
+            {p.stem for p in self.root.glob("*.log")}
+            | {p.stem for p in self.root.glob("*.seg")}
+        )
+
+    def load(self, day: str) -> DaySegment:
+        """The segment for ``day``: sealed columns plus any rows logged since."""
+        with self._lock:
+            cached = self._cache.get(day)
+            if cached is not None:
+                self._cache.move_to_end(day)
+                return cached
+
+        try:
+            with open(self._seg(day), encoding="utf-8") as f:
+                segment = DaySegment.from_json(json.load(f))
+        except FileNotFoundError:
+            segment = DaySegment(day)
+        log = self._log(day)
+        if log.exists():
+            with open(log, encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):  # skip a torn last line
+                        segment.append(json.loads(line))
+            # Today's log keeps growing; only cache days that are finished
+            if day >= date.today().isoformat():
+                return segment
+
+        with self._lock:
+            self._cache[day] = segment
+            while len(self._cache) > self.cache_days:
+                self._cache.popitem(last=False)
+        return segment
+
+    def _segments(self, start: str | None, end: str | None) -> Iterator[DaySegment]:
+        for day in self.days():
+            if (start is None or day >= start) and (end is None or day <= end):
+                yield self.load(day)
+
+    @staticmethod
+    def filters(
+        drink: str | None = None,
+        size: str | None = None,
+        milk: str | None = None,
+        extra: str | None = None,
+        hour: int | None = None,
+    ) -> dict[str, str]:
+        """Canonical filter values keyed by indexed field."""
+        given = {"drink": drink, "size": size, "milk": milk, "extras": extra}
+        result = {
+            field: canonical(field, value)
+            for field, value in given.items()
+            if value is not None
+        }
+        if hour is not None:
+            result["hour"] = str(hour)
+        return result
+
+    def count(
+        self, start: str | None = None, end: str | None = None, **filters: Any
+    ) -> int:
+        """Orders between ``start`` and ``end`` (inclusive days) matching filters."""
+        wanted = self.filters(**filters)
+        total = 0
+        for segment in self._segments(start, end):
+            if not wanted:
+                total += len(segment)
+            elif len(wanted) == 1:
+                ((field, value),) = wanted.items()
+                total += len(segment.postings[field].get(value, ()))
+            else:
+                total += len(segment.matches(wanted))
+        return total
+
+    def group_by(
+        self,
+        field: str,
+        start: str | None = None,
+        end: str | None = None,
+        **filters: Any,
+    ) -> dict[str, int]:
+        """Order counts per value of ``field``, most popular first."""
+        if field == "extra":
+            field = "extras"
+        if field not in INDEXED:
+            raise ValueError(f"Can't group by {field!r}, expected one of {INDEXED}")
+        wanted = self.filters(**filters)
+        totals: dict[str, int] = defaultdict(int)
+        for segment in self._segments(start, end):
+            if not wanted:
+                for value, count in segment.counts(field).items():
+                    totals[value] += count
+                continue
+            rows = set(segment.matches(wanted))
+            for value, posting in segment.postings[field].items():
+                totals[value] += len(rows.intersection(posting))
+        return dict(sorted(totals.items(), key=lambda kv: (-kv[1], kv[0])))
+
+    def query(
+        self, start: str | None = None, end: str | None = None, **filters: Any
+    ) -> Iterator[dict[str, Any]]:
+        """Matching orders, oldest first, one day loaded at a time."""
+        wanted = self.filters(**filters)
+        for segment in self._segments(start, end):
+            for row in segment.matches(wanted):
+                yield segment.order(row)
+
+
+# -- rebuild -----------------------------------------------------------------
+
+
+def _scan(paths: list[str]) -> tuple[dict[str, list[list[Any]]], list[str]]:
+    """Index rows by day from order files, plus the legacy files they came from."""
+    rows: dict[str, list[list[Any]]] = defaultdict(list)
+    legacy: list[str] = []
+
+    def _add(order: dict[str, Any]) -> None:
+        encoded = encode(order)
+        if encoded is not None:
+            rows[encoded[0]].extend(encoded[1])
+        if order.get("legacyFile"):
+            legacy.append(order["legacyFile"])
+
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                if path.endswith(SEGMENT_SUFFIX):
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        _add(json.loads(line))
+                else:
+                    _add(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable order file %s: %s", path, e)
+    return rows, legacy
+
+
+def _chunks(paths: list[Path], size: int) -> list[list[str]]:
+    return [[str(p) for p in paths[i : i + size]] for i in range(0, len(paths), size)]
+
+
+def rebuild(
+    index: OrderIndex,
+    orders_dir: str | os.PathLike = DEFAULT_ORDERS_DIR,
+    workers: int | None = None,
+) -> int:
+    """Rewrite ``index`` from the order segments and legacy order files.
+
+    Files are parsed in ``workers`` processes. Legacy files that were migrated
+    into the segment store (tagged ``legacyFile``) are counted once. Returns
+    the number of orders indexed.
+    """
+    orders_dir = Path(orders_dir)
+    segments = sorted(
+        (orders_dir / "segments").glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+    )
+    files = sorted(orders_dir.glob("order_*.json"))
+
+    days: dict[str, list[list[Any]]] = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        migrated: set[str] = set()
+        for rows, legacy in pool.map(_scan, _chunks(segments, 1)):
+            for day, day_rows in rows.items():
+                days[day].extend(day_rows)
+            migrated.update(legacy)
+
+        pending = [p for p in files if p.name not in migrated]
+        for rows, _ in pool.map(_scan, _chunks(pending, 256)):
+            for day, day_rows in rows.items():
+                days[day].extend(day_rows)
+
+    with index._lock:
+        index._cache.clear()
+        index.root.mkdir(parents=True, exist_ok=True)
+        for path in [*index.root.glob("*.log"), *index.root.glob("*.seg")]:
+            path.unlink()
+    for day, rows in days.items():
+        segment = DaySegment(day)
+        for row in sorted(rows, key=lambda row: row[0]):
+            segment.append(row)
+        index._write_segment(segment)
+    return sum(len(rows) for rows in days.values())
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+def _day(text: str) -> str:
+    if text == "today":
+        return date.today().isoformat()
+    if text == "yesterday":
+        return (date.today() - timedelta(days=1)).isoformat()
+    return date.fromisoformat(text).isoformat()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the Brown Cafe order index")
+    parser.add_argument(
+        "--orders-dir", default=os.getenv("ORDERS_DIR", DEFAULT_ORDERS_DIR)
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = sub.add_parser("rebuild", help="reindex every saved order")
+    rebuild_parser.add_argument("--workers", type=int, default=None)
+
+    count = sub.add_parser("count", help="count matching orders")
+    group = sub.add_parser("group-by", help="count matching orders per value")
+    group.add_argument("field", choices=["drink", "size", "milk", "extra", "hour"])
+    query = sub.add_parser("query", help="list matching orders")
+    query.add_argument("--json", action="store_true", help="JSON lines output")
+    for command in (count, group, query):
+        command.add_argument("--from", dest="start", type=_day, default=None)
+        command.add_argument("--to", dest="end", type=_day, default=None)
+        command.add_argument("--day", type=_day, help="one day (default: today)")
+        command.add_argument("--all", action="store_true", help="every day")
+        for field in ("drink", "size", "milk", "extra"):
+            command.add_argument(f"--{field}")
+        command.add_argument("--hour", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = OrderIndex(Path(args.orders_dir) / "index")
+
+    if args.command == "rebuild":
+        print(f"Indexed {rebuild(index, args.orders_dir, args.workers)} orders")
+        return
+
+    index.seal()
+    if args.all:
+        start = end = None
+    elif args.start or args.end:
+        start, end = args.start, args.end
+    else:
+        start = end = args.day or _day("today")
+    filters = {
+        field: getattr(args, field)
+        for field in ("drink", "size", "milk", "extra", "hour")
+        if getattr(args, field) is not None
+    }
+
+    if args.command == "count":
+        print(index.count(start, end, **filters))
+    elif args.command == "group-by":
+        for value, total in index.group_by(args.field, start, end, **filters).items():
+            print(f"{total:>8}  {value}")
+    else:
+        for order in index.query(start, end, **filters):
+            if args.json:
+                print(json.dumps(order))
+            else:
+                extras = ", ".join(order["extras"]) or "no extras"
+                print(
+                    f"{order['timestamp']}  {order['size']} {order['drinkType']}"
+                    f" with {order['milk']} ({extras}) for {order['name']}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Write-ahead log of orders in progress, so a restarted job can resume them.
+
+An order lives in memory (``OrderSession``) until it is saved. If the worker
+process dies, or the job is moved to another worker, mid-conversation, the
+customer would have to start over. ``OrderLog`` keeps one small JSON Lines
+file per customer, keyed by room and participant identity, under
+``ORDERS_DIR/wal``. In single-session mode nothing is logged or restored until
+the customer has joined, so an order left by one customer is never handed to
+the next one to join the room:
+
+- Every tool that changes the order appends one record naming the ``Order``
+  method and its canonical arguments, e.g.
+  ``{"op": "set_size", "args": ["large", 0]}``. Replaying the same calls in
+  the same order rebuilds the same order, including which item is current.
+- The fast path sets several fields at once, so it logs a ``snapshot`` of the
+  whole order instead.
+- After ``compact_every`` records the file is rewritten as a single snapshot,
+  so a file never holds more than a few dozen short lines.
+- Saving the order deletes the file.
+
+``record`` never blocks: records are encoded on the caller's side and written
+by one writer thread, like the order store's appends. Writes are not fsynced
+by default; a crashed process loses nothing that reached the OS, and
+``ORDER_LOG_FSYNC=1`` also covers power loss.
+
+``restore`` reads the file back, in a worker thread, when a job starts serving
+a customer whose order isn't in memory. Files older than ``ORDER_LOG_MAX_AGE``
+seconds (default 1800) belong to customers who left and are ignored, and deleted
+when the log is opened. ``ORDER_LOG=0`` turns the log off.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from order_model import CartError, MenuError, Order
+from order_store import DEFAULT_ORDERS_DIR
+from sessions import OrderSession
+
+logger = logging.getLogger("agent.order_log")
+
+# Order methods a record may replay
+OPS = frozenset(
+    {
+        "add_drink",
+        "add_extra",
+        "remove_extra",
+        "remove_item",
+        "set_drink",
+        "set_milk",
+        "set_name",
+        "set_quantity",
+        "set_size",
+    }
+)
+
+# Tells the writer thread to exit
+_STOP = object()
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+def snapshot(order: Order) -> dict[str, Any]:
+    """A record that restores ``order`` on its own."""
+    current = order.item()
+    return {
+        "op": "snapshot",
+        "order": order.to_dict(),
+        "current": current.line if current is not None else None,
+    }
+
+
+def replay(session: OrderSession, records: list[dict[str, Any]]) -> int:
+    """Apply ``records`` to ``session``; returns how many applied cleanly."""
+    applied = 0
+    for record in records:
+        op = record.get("op")
+        try:
+            if op == "snapshot":
+                session.order = Order.from_dict(record["order"])
+                for number, item in enumerate(session.order.items, 1):
+                    if item.line == record.get("current"):
+                        session.order.item(number)
+            elif op == "order_id":
+                session.order_id = record["args"][0]
+            elif op in OPS:
+                getattr(session.order, op)(*record.get("args", ()))
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (CartError, MenuError, KeyError, TypeError, ValueError) as e:
+            # e.g. a drink taken off the menu since; the rest still applies
+            logger.warning("Skipping order log record %s: %s", record, e)
+            continue
+        applied += 1
+    return applied
+
+
+class OrderLog:
+    """Per-customer write-ahead logs of order mutations.
+
+    Args:
+        root: Directory holding one ``<key>.jsonl`` file per customer.
+        compact_every: Rewrite a file as one snapshot after this many records.
+        max_age: Seconds after the last write that a log is still restored.
+        fsync: Make each batch of writes durable against power loss too.
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike = Path(DEFAULT_ORDERS_DIR) / "wal",
+        *,
+        compact_every: int = 32,
+        max_age: float = 1800.0,
+        fsync: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.compact_every = compact_every
+        self.max_age = max_age
+        self.fsync = fsync
+
+        self.stats = {"records": 0, "compactions": 0, "restored": 0, "write_errors": 0}
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # Records appended to each file since it was last rewritten
+        self._counts: dict[Path, int] = {}
+
+    @classmethod
+    def from_env(cls, orders_dir: str | None = None) -> OrderLog | None:
+        """The log under ``<orders_dir>/wal``, or None when ``ORDER_LOG=0``."""
+        if os.getenv("ORDER_LOG", "1") == "0":
+            return None
+        orders_dir = orders_dir or os.getenv("ORDERS_DIR", DEFAULT_ORDERS_DIR)
+        return cls(
+            Path(orders_dir) / "wal",
+            max_age=float(os.getenv("ORDER_LOG_MAX_AGE", "1800")),
+            fsync=os.getenv("ORDER_LOG_FSYNC") == "1",
+        )
+
+    def path(self, room: str, identity: str) -> Path:
+        key = f"{room}\0{identity}".encode()
+        return self.root / f"{hashlib.sha1(key).hexdigest()[:20]}.jsonl"
+
+    def _path(self, session: OrderSession) -> Path | None:
+        # None until the session knows which customer it is serving
+        if not session.customer:
+            return None
+        return self.path(session.room, session.customer)
+
+    def open(self) -> None:
+        """Delete stale logs and start the writer thread (idempotent, blocking)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            cutoff = time.time() - self.max_age
+            for path in self.root.glob("*.jsonl"):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                except OSError as e:
+                    logger.warning("Couldn't prune order log %s: %s", path.name, e)
+            self._thread = threading.Thread(
+                target=self._run, name="order-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    # -- event loop side -----------------------------------------------------
+
+    def record(self, session: OrderSession, op: str, *args: Any) -> None:
+        """Log a successful ``session.order.<op>(*args)``. Never blocks."""
+        self._append(session, {"op": op, "args": list(args)})
+
+    def record_snapshot(self, session: OrderSession) -> None:
+        """Log the whole order, after changes made outside the ``OPS`` methods."""
+        self._append(session, snapshot(session.order))
+
+    def compact(self, session: OrderSession) -> None:
+        """Replace the session's log with one snapshot of its order."""
+        path = self._path(session)
+        if path is None:
+            return
+        records = [snapshot(session.order)]
+        if session.order_id:
+            records.append({"op": "order_id", "args": [session.order_id]})
+        with self._lock:
+            self._counts[path] = len(records)
+            self.stats["compactions"] += 1
+        self._put(path, "replace", records)
+
+    def clear(self, session: OrderSession) -> None:
+        """Forget the session's log (its order was saved)."""
+        path = self._path(session)
+        if path is None:
+            return
+        with self._lock:
+            self._counts.pop(path, None)
+        self._put(path, "delete", [])
+
+    def _append(self, session: OrderSession, record: dict[str, Any]) -> None:
+        path = self._path(session)
+        if path is None:
+            return
+        with self._lock:
+            count = self._counts[path] = self._counts.get(path, 0) + 1
+        if count > self.compact_every:
+            # The snapshot already includes this record's change
+            self.compact(session)
+        else:
+            self._put(path, "append", [record])
+
+    def _put(self, path: Path, mode: str, records: list[dict[str, Any]]) -> None:
+        if self._thread is None:
+            self.open()
+        # Encoded here so later changes to the order can't race the writer
+        payload = b"".join(
+            json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+            + b"\n"
+            for record in records
+        )
+        with self._lock:
+            self.stats["records"] += len(records)
+        self._queue.put((path, mode, payload))
+
+    async def restore(self, session: OrderSession) -> bool:
+        """Rebuild ``session``'s order from its log, if there is a recent one."""
+        path = self._path(session)
+        if path is None:
+            return False
+        # Records still queued for this file would be missing from what is read
+        await self.flush()
+        try:
+            data = await asyncio.to_thread(self._read, path)
+        except OSError as e:
+            logger.error("Couldn't read order log %s: %s", path.name, e)
+            return False
+        if data is None:
+            return False
+
+        records = []
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # torn write from the crash
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        if not records:
+            return False
+
+        replay(session, records)
+        with self._lock:
+            self._counts[path] = len(records)
+            self.stats["restored"] += 1
+        return True
+
+    def _read(self, path: Path) -> bytes | None:
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def flush(self) -> None:
+        """Wait until everything recorded so far is written."""
+        if self._thread is None:
+            return
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.put(
+            (None, "flush", lambda: loop.call_soon_threadsafe(_resolve, fut))
+        )
+        await fut
+
+    async def aclose(self) -> None:
+        if self._thread is None:
+            return
+        await self.flush()
+        self._queue.put(_STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever else is already queued, so a burst of tool calls
+            # from one turn costs one write per file
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self._commit([item for item in batch if item is not _STOP])
+            if stop:
+                return
+
+    def _commit(self, batch: list) -> None:
+        # Per file, in queue order: a rewrite or delete supersedes the records
+        # before it, so only what follows it still needs appending
+        pending: dict[Path, dict[str, Any]] = {}
+        callbacks = []
+        for path, mode, payload in batch:
+            if mode == "flush":
+                callbacks.append(payload)
+                continue
+            state = pending.setdefault(
+                path, {"delete": False, "replace": None, "appends": []}
+            )
+            if mode == "append":
+                state["appends"].append(payload)
+            elif mode == "replace":
+                state.update(delete=False, replace=payload, appends=[])
+            else:
+                state.update(delete=True, replace=None, appends=[])
+
+        for path, state in pending.items():
+            try:
+                self._write(path, state)
+            except OSError as e:
+                # The order itself is fine; only a crash now would lose it
+                with self._lock:
+                    self.stats["write_errors"] += 1
+                logger.error("Failed to write order log %s: %s", path.name, e)
+
+        for callback in callbacks:
+            callback()
+
+    def _write(self, path: Path, state: dict[str, Any]) -> None:
+        if state["delete"]:
+            path.unlink(missing_ok=True)
+        if state["replace"] is not None:
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                f.write(state["replace"])
+                self._sync(f)
+            os.replace(tmp, path)
+        if state["appends"]:
+            with open(path, "ab") as f:
+                f.write(b"".join(state["appends"]))
+                self._sync(f)
+
+    def _sync(self, f) -> None:
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
@@ -0,0 +1,301 @@
+"""Typed order model with menu normalization.
+
+Tool arguments come from the LLM, which in turn hears the customer through STT,
+so the same choice arrives as "Oat Milk", "oat milk", "oatmilk" or "oak milk".
+Every value is resolved to a menu enum through the current menu's
+``AliasIndex`` (see menu.py): an exact lookup in a precomputed table of
+normalized aliases, then a fuzzy match for STT near-misses. Orders therefore
+only ever hold canonical values, which is what the visualization, receipts and
+persisted orders see via ``Order.to_dict()``.
+
+An ``Order`` is a cart: any number of line items, each a drink with its own
+size, milk, extras and quantity, plus the customer's name. Tools edit the
+*current* item (the one most recently added or edited) unless they are given
+an item number, which is the item's 1-based position in the order. Each item
+also has a ``line`` number that is never reused within an order, so updates
+sent to the frontend can refer to one item even after others are removed.
+
+``Drink``, ``Size``, ``Milk``, ``Extra``, their indexes (``DRINKS``...) and
+``ALIASES`` are looked up on the current menu each time they are accessed as
+module attributes.
+"""
+
+from __future__ import annotations
+
+from enum import Enum
+from typing import Any
+
+from menu import AliasIndex, Menu, MenuError, current, normalize
+
+__all__ = [
+    "AliasIndex",
+    "CartError",
+    "LineItem",
+    "MenuError",
+    "Order",
+    "line_items",
+    "normalize",
+    "order_total",
+]
+
+_MENU_ATTRIBUTES = {
+    "Drink": "Drink",
+    "Size": "Size",
+    "Milk": "Milk",
+    "Extra": "Extra",
+    "DRINKS": "drinks",
+    "SIZES": "sizes",
+    "MILKS": "milks",
+    "EXTRAS": "extras",
+    "ALIASES": "aliases",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _MENU_ATTRIBUTES:
+        return getattr(current(), _MENU_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class CartError(ValueError):
+    """An item number or quantity that doesn't fit the order."""
+
+
+class LineItem:
+    """One drink in an order. Extras keep insertion order and are unique."""
+
+    __slots__ = ("drink", "extras", "line", "milk", "quantity", "size")
+
+    def __init__(self, line: int = 1, quantity: int = 1) -> None:
+        self.line = line
+        self.quantity = quantity
+        self.drink: Enum | None = None
+        self.size: Enum | None = None
+        self.milk: Enum | None = None
+        # dict as an ordered set: O(1) membership, stable display order
+        self.extras: dict[Enum, None] = {}
+
+    def missing(self) -> list[str]:
+        missing = []
+        if self.drink is None:
+            missing.append("drink type")
+        if self.size is None:
+            missing.append("size")
+        if self.milk is None:
+            missing.append("milk preference")
+        return missing
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "line": self.line,
+            "drinkType": self.drink.value if self.drink else None,
+            "size": self.size.value if self.size else None,
+            "milk": self.milk.value if self.milk else None,
+            "extras": [extra.value for extra in self.extras],
+            "quantity": self.quantity,
+        }
+
+
+def _current_item_field(field: str) -> property:
+    def get(order: Order) -> Any:
+        item = order.item()
+        return getattr(item, field) if item is not None else None
+
+    def set_(order: Order, value: Any) -> None:
+        setattr(order.item(create=True), field, value)
+
+    return property(get, set_, doc=f"``{field}`` of the current item.")
+
+
+class Order:
+    """A customer's order: line items and the name it is for."""
+
+    __slots__ = ("_current", "_next_line", "items", "name")
+
+    def __init__(self) -> None:
+        self.items: list[LineItem] = []
+        self.name: str | None = None
+        self._current: LineItem | None = None
+        self._next_line = 1
+
+    # Shortcuts to the current item, for single-drink orders
+    drink = _current_item_field("drink")
+    size = _current_item_field("size")
+    milk = _current_item_field("milk")
+
+    @property
+    def extras(self) -> dict[Enum, None]:
+        """Extras of the current item (empty, and not stored, without one)."""
+        item = self.item()
+        return item.extras if item is not None else {}
+
+    def item(self, number: int | None = None, create: bool = False) -> LineItem | None:
+        """Item ``number`` (1-based), or the current item when it is None or 0.
+
+        With ``create``, an order without items gets its first one. Raises
+        ``CartError`` for numbers that aren't in the order.
+        """
+        if number:
+            if not 0 < number <= len(self.items):
+                raise CartError(
+                    f"There is no item {number}; the order has "
+                    f"{len(self.items)} item{'' if len(self.items) == 1 else 's'}."
+                )
+            self._current = self.items[number - 1]
+        elif self._current is None and create:
+            self.add_item()
+        return self._current
+
+    def number(self, item: LineItem) -> int:
+        """1-based position of ``item``."""
+        return self.items.index(item) + 1
+
+    def add_item(self, quantity: int = 1) -> LineItem:
+        """Start a new line item and make it the current one."""
+        _check_quantity(quantity)
+        item = LineItem(self._next_line, quantity)
+        self._next_line += 1
+        self.items.append(item)
+        self._current = item
+        return item
+
+    def add_drink(self, text: str, quantity: int = 1) -> LineItem:
+        """Add ``quantity`` of a drink as a new item and make it the current one.
+
+        A current item without a drink yet (the customer said "large" before
+        naming anything) is filled in instead.
+        """
+        drink = current().drinks.parse(text)
+        item = self.item()
+        if item is not None and item.drink is None:
+            self.set_quantity(quantity)
+        else:
+            item = self.add_item(quantity)
+        item.drink = drink
+        return item
+
+    def remove_item(self, number: int | None = None) -> LineItem:
+        """Remove item ``number`` (default the current item)."""
+        item = self.item(number)
+        if item is None:
+            raise CartError("The order has no items yet.")
+        self.items.remove(item)
+        self._current = self.items[-1] if self.items else None
+        return item
+
+    def set_quantity(self, quantity: int, number: int | None = None) -> LineItem:
+        _check_quantity(quantity)
+        item = self.item(number, create=True)
+        item.quantity = quantity
+        return item
+
+    def set_drink(self, text: str, number: int | None = None) -> Enum:
+        drink = current().drinks.parse(text)
+        self.item(number, create=True).drink = drink
+        return drink
+
+    def set_size(self, text: str, number: int | None = None) -> Enum:
+        size = current().sizes.parse(text)
+        self.item(number, create=True).size = size
+        return size
+
+    def set_milk(self, text: str, number: int | None = None) -> Enum:
+        milk = current().milks.parse(text)
+        self.item(number, create=True).milk = milk
+        return milk
+
+    def add_extra(self, text: str, number: int | None = None) -> Enum:
+        extra = current().extras.parse(text)
+        self.item(number, create=True).extras[extra] = None
+        return extra
+
+    def remove_extra(self, text: str, number: int | None = None) -> Enum:
+        extra = current().extras.parse(text)
+        # Checked before item() makes ``number`` the current item
+        if number and 0 < number <= len(self.items):
+            item = self.items[number - 1]
+        else:
+            item = self.item(number)
+        if item is None or extra not in item.extras:
+            raise CartError(f"There is no {extra.value} to remove.")
+        del item.extras[extra]
+        self._current = item
+        return extra
+
+    def set_name(self, name: str) -> str:
+        self.name = " ".join(name.split())
+        return self.name
+
+    def missing(self) -> list[str]:
+        """Required details that haven't been given yet."""
+        if len(self.items) <= 1:
+            missing = (self.items[0] if self.items else LineItem()).missing()
+        else:
+            missing = [
+                f"{field} for item {number}"
+                for number, item in enumerate(self.items, 1)
+                for field in item.missing()
+            ]
+        if not self.name:
+            missing.append("name")
+        return missing
+
+    def is_complete(self) -> bool:
+        return not self.missing()
+
+    def is_empty(self) -> bool:
+        return not (self.items or self.name)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Plain, canonical form used on the wire, in receipts and in storage."""
+        return {"items": [item.to_dict() for item in self.items], "name": self.name}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Order:
+        """Inverse of ``to_dict``; values are normalized, unknown ones dropped.
+
+        Also accepts the single-drink form orders were saved in before carts.
+        """
+        menu = current()
+        order = cls()
+        for entry in line_items(data):
+            item = order.add_item(max(1, int(entry.get("quantity") or 1)))
+            item.line = entry.get("line") or item.line
+            item.drink = (
+                menu.drinks.resolve(entry["drinkType"])
+                if entry.get("drinkType")
+                else None
+            )
+            item.size = menu.sizes.resolve(entry["size"]) if entry.get("size") else None
+            item.milk = menu.milks.resolve(entry["milk"]) if entry.get("milk") else None
+            for text in entry.get("extras") or ():
+                extra = menu.extras.resolve(text)
+                if extra is not None:
+                    item.extras[extra] = None
+        order._next_line = max((item.line for item in order.items), default=0) + 1
+        order.name = data.get("name")
+        return order
+
+
+def _check_quantity(quantity: int) -> None:
+    if quantity < 1:
+        raise CartError("Quantity must be at least 1; remove the item instead.")
+
+
+_ITEM_FIELDS = ("drinkType", "size", "milk", "extras")
+
+
+def line_items(order: dict[str, Any]) -> list[dict[str, Any]]:
+    """Line items of an order dict, including single-drink orders saved before carts."""
+    items = order.get("items")
+    if items is not None:
+        return items
+    if not any(order.get(field) for field in _ITEM_FIELDS):
+        return []
+    return [{**{field: order.get(field) for field in _ITEM_FIELDS}, "quantity": 1}]
+
+
+def order_total(order: dict[str, Any], menu: Menu | None = None) -> int:
+    """Price in cents of an order dict; items no longer on the menu add nothing."""
+    menu = menu or current()
+    return sum(menu.line_total(item) for item in line_items(order))
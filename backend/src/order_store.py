@@ -0,0 +1,553 @@
+"""Order persistence for the barista agent.
+
+Orders used to be written with a blocking ``json.dump`` straight from the
+``save_order`` tool, on the same event loop that drives STT/LLM/TTS. The stores
+in this module keep all disk I/O off the loop:
+
+- ``JsonlOrderStore`` (default) appends orders to JSON Lines segment files from
+  a single writer thread. Appends that arrive within ``flush_interval`` seconds
+  (or until ``max_batch`` orders are queued) are written together and made
+  durable with one ``fsync``, so a lunch rush costs one disk flush per batch
+  rather than one per order.
+- ``JsonFileOrderStore`` keeps the original ``orders/order_*.json`` layout for
+  anyone still consuming those files, but writes them in a worker thread.
+
+Both stores can also keep an ``OrderIndex`` up to date (see order_index.py);
+the index is written from the same worker thread once orders are durable.
+
+Every job process writes its own segment, named by a ULID so segments sort by
+creation time, and holds an ``flock`` on it while open. A store only reuses an
+existing segment (and truncates a torn tail a crash left in it) when no live
+process holds it, so one process never cuts off a batch another is appending.
+
+Run ``python src/order_store.py migrate`` to import existing ``order_*.json``
+files into the segment store, or ``python src/order_store.py recover`` to check
+and repair the segments after a crash.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from order_ids import new_order_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: run one writer process per orders directory
+    fcntl = None
+
+if TYPE_CHECKING:
+    from order_index import OrderIndex
+
+logger = logging.getLogger("agent.order_store")
+
+DEFAULT_ORDERS_DIR = "orders"
+SEGMENT_PREFIX = "orders-"
+SEGMENT_SUFFIX = ".jsonl"
+
+# Tells the writer thread to commit what it has and exit
+_STOP = object()
+
+# How many recent order IDs a store remembers to drop repeated appends
+RECENT_ORDER_IDS = 1024
+
+
+def _resolve(fut: asyncio.Future, exc: BaseException | None) -> None:
+    if fut.done():
+        return
+    if exc is None:
+        fut.set_result(None)
+    else:
+        fut.set_exception(exc)
+
+
+class OrderStore:
+    """Interface implemented by all order persistence backends."""
+
+    index: OrderIndex | None = None
+
+    def open(self) -> None:
+        """Prepare the store for writing (blocking, call from prewarm)."""
+
+    async def append(self, order: dict[str, Any]) -> None:
+        """Persist a completed order. Returns once the order is durable."""
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        """Wait until every order appended so far is durable."""
+
+    async def aclose(self) -> None:
+        """Flush pending orders and release resources."""
+        await self.flush()
+
+    def iter_orders(self) -> Iterator[dict[str, Any]]:
+        """Iterate over all persisted orders, oldest first (blocking)."""
+        raise NotImplementedError
+
+    def find(self, order_id: str) -> dict[str, Any] | None:
+        """The persisted order with ``order_id``, if any (blocking)."""
+        for order in self.iter_orders():
+            if order.get("orderId") == order_id:
+                return order
+        return None
+
+    def _update_index(self, orders: list[dict[str, Any]]) -> None:
+        # The orders are already durable; a failing index only needs a rebuild
+        if self.index is None:
+            return
+        try:
+            self.index.add(orders)
+        except (OSError, ValueError) as e:
+            logger.error("Failed to index orders, run order_index.py rebuild: %s", e)
+
+
+class JsonFileOrderStore(OrderStore):
+    """Legacy one-file-per-order layout, written in a worker thread."""
+
+    def __init__(
+        self,
+        orders_dir: str | os.PathLike = DEFAULT_ORDERS_DIR,
+        *,
+        index: OrderIndex | None = None,
+    ) -> None:
+        self.orders_dir = Path(orders_dir)
+        self.index = index
+
+    def _filename(self, order: dict[str, Any]) -> str:
+        if order.get("orderId"):
+            return f"order_{order['orderId']}.json"
+        timestamp = order.get("timestamp") or time.strftime("%Y-%m-%dT%H:%M:%S")
+        stamp = timestamp[:19].replace("-", "").replace(":", "").replace("T", "_")
+        name = str(order.get("name") or "guest").replace(" ", "_")
+        return f"order_{stamp}_{name}.json"
+
+    def _write(self, order: dict[str, Any]) -> Path:
+        self.orders_dir.mkdir(parents=True, exist_ok=True)
+        filepath = self.orders_dir / self._filename(order)
+        try:
+            f = open(filepath, "x" if order.get("orderId") else "w")  # noqa: SIM115
+        except FileExistsError:
+            # Same order ID: it was saved already, don't write or index it twice
+            logger.info("Order file %s already exists, not rewriting", filepath.name)
+            return filepath
+        with f:
+            json.dump(order, f, indent=2)
+        self._update_index([order])
+        return filepath
+
+    async def append(self, order: dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, order)
+
+    def iter_orders(self) -> Iterator[dict[str, Any]]:
+        for path in sorted(self.orders_dir.glob("order_*.json")):
+            try:
+                with open(path) as f:
+                    yield json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable order file %s: %s", path, e)
+
+    def find(self, order_id: str) -> dict[str, Any] | None:
+        path = self.orders_dir / self._filename({"orderId": order_id})
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Unreadable order file %s: %s", path, e)
+            return None
+
+
+class JsonlOrderStore(OrderStore):
+    """Append-only JSON Lines segments with batched, fsync-coalescing writes.
+
+    Args:
+        root: Directory holding the ``orders-<ULID>.jsonl`` segments.
+        max_batch: Commit as soon as this many orders are queued.
+        flush_interval: Longest time (seconds) an order waits for a batch to fill.
+        max_segment_bytes: Start a new segment once the current one exceeds this.
+        fsync: Disable only for tests/benchmarks; orders are not crash-safe without it.
+        index: Order index to update after each committed batch.
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike = Path(DEFAULT_ORDERS_DIR) / "segments",
+        *,
+        max_batch: int = 64,
+        flush_interval: float = 0.05,
+        max_segment_bytes: int = 8 * 1024 * 1024,
+        fsync: bool = True,
+        index: OrderIndex | None = None,
+    ) -> None:
+        self.root = Path(root)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.index = index
+
+        self.stats = {"appended": 0, "batches": 0, "fsyncs": 0, "recovered_bytes": 0}
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._file = None
+        # Order ID -> its append, so an order saved twice is written once
+        self._recent: dict[str, asyncio.Future] = {}
+
+    # -- segment management -------------------------------------------------
+
+    def segments(self) -> list[Path]:
+        """Segment files in the order they were created."""
+        return sorted(self.root.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    @staticmethod
+    def _claim(path: Path):
+        """``path`` opened for appending and locked, or None if a live writer has it."""
+        # Unbuffered, so a failed write leaves nothing behind to be flushed later
+        f = open(path, "ab", buffering=0)  # noqa: SIM115
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return None
+        return f
+
+    def recover(self) -> int:
+        """Truncate torn tails that crashed writers left in their segments.
+
+        Segments a live process is writing are skipped. Returns the number of
+        bytes dropped.
+        """
+        dropped = 0
+        for path in self.segments():
+            f = self._claim(path)
+            if f is not None:
+                with f:
+                    dropped += self._repair(path)
+        return dropped
+
+    def _repair(self, path: Path) -> int:
+        # The caller holds the segment's lock
+        with open(path, "rb") as f:
+            data = f.read()
+
+        good = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            good += len(line)
+
+        dropped = len(data) - good
+        if dropped:
+            logger.warning(
+                "Recovered %s: dropped %d bytes of torn writes", path.name, dropped
+            )
+            with open(path, "r+b") as f:
+                f.truncate(good)
+                f.flush()
+                os.fsync(f.fileno())
+            self.stats["recovered_bytes"] += dropped
+        return dropped
+
+    def open(self) -> None:
+        """Claim a segment and start the writer thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+
+            # Carry on with the newest segment if no live process is writing it
+            segments = self.segments()
+            f = self._claim(segments[-1]) if segments else None
+            if f is not None:
+                self._repair(segments[-1])
+                if os.fstat(f.fileno()).st_size < self.max_segment_bytes:
+                    self._file = f
+                else:
+                    f.close()
+
+            self._thread = threading.Thread(
+                target=self._run, name="order-store-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _open_segment(self) -> None:
+        path = self.root / f"{SEGMENT_PREFIX}{new_order_id()}{SEGMENT_SUFFIX}"
+        self._file = self._claim(path)
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            with contextlib.suppress(OSError):
+                self._file.close()
+            self._file = None
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # A flush request (no payload) commits immediately
+            while item[0] is not None and len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+        self._close_segment()
+
+    def _commit(self, batch: list) -> None:
+        waiters = []
+        records = []
+        for payload, loop, fut in batch:
+            if payload is not None:
+                records.append(payload)
+            waiters.append((loop, fut))
+
+        exc: BaseException | None = None
+        if records:
+            try:
+                exc = self._write_batch(records)
+            except Exception as e:
+                # Keep the writer alive: these waiters get the error and the
+                # segment is opened again for the next batch
+                logger.exception("Failed to write order batch")
+                exc = e
+                self._close_segment()
+
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_resolve, fut, exc)
+
+    def _write_batch(self, records: list[bytes]) -> OSError | None:
+        if self._file is None:
+            self._open_segment()
+        offset = os.fstat(self._file.fileno()).st_size
+        payload = b"".join(records)
+        try:
+            data = memoryview(payload)
+            while data:
+                data = data[self._file.write(data) :]
+            if self.fsync:
+                os.fsync(self._file.fileno())
+                self.stats["fsyncs"] += 1
+        except OSError as e:
+            logger.error("Failed to write order batch: %s", e)
+            self._discard_from(offset)
+            return e
+
+        self.stats["batches"] += 1
+        self.stats["appended"] += len(records)
+        if self.index is not None:
+            self._update_index([json.loads(record) for record in records])
+        if offset + len(payload) >= self.max_segment_bytes:
+            # The next batch starts the next segment
+            self._close_segment()
+        return None
+
+    def _discard_from(self, offset: int) -> None:
+        """Cut a failed batch off the segment so later batches stay readable.
+
+        A write can fail partway through (a full disk), leaving part of a line
+        that ``recover`` and ``iter_orders`` would stop at.
+        """
+        try:
+            os.ftruncate(self._file.fileno(), offset)
+        except OSError as e:
+            # recover() drops the torn line the next time the store is opened
+            logger.error("Failed to truncate a failed order batch: %s", e)
+            self._close_segment()
+
+    def _submit(self, payload: bytes | None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.put((payload, loop, fut))
+        return fut
+
+    # -- OrderStore ----------------------------------------------------------
+
+    async def append(self, order: dict[str, Any]) -> None:
+        if self._thread is None:
+            await asyncio.to_thread(self.open)
+        # Serialize on the caller's side so later mutations of the order dict
+        # can't race the writer thread; the encoded record is tiny.
+        order_id = order.get("orderId")
+        if order_id in self._recent:
+            # Same order ID: it was saved already, don't write or index it twice
+            logger.info("Order %s already appended, not rewriting", order_id)
+            await asyncio.shield(self._recent[order_id])
+            return
+
+        line = json.dumps(order, separators=(",", ":"), ensure_ascii=False) + "\n"
+        fut = self._submit(line.encode("utf-8"))
+        if order_id:
+            self._remember(order_id, fut)
+        # Shielded: the record is queued either way, and a repeated append of
+        # this order waits on the same future
+        await asyncio.shield(fut)
+
+    def _remember(self, order_id: str, fut: asyncio.Future) -> None:
+        self._recent[order_id] = fut
+        if len(self._recent) > RECENT_ORDER_IDS:
+            del self._recent[next(iter(self._recent))]
+
+        def forget_failed(fut: asyncio.Future) -> None:
+            # A failed write was cut off the segment, so it may be retried
+            failed = fut.cancelled() or fut.exception() is not None
+            if failed and self._recent.get(order_id) is fut:
+                del self._recent[order_id]
+
+        fut.add_done_callback(forget_failed)
+
+    async def flush(self) -> None:
+        if self._thread is None:
+            return
+        # An empty record rides the queue behind every pending append
+        await self._submit(None)
+
+    async def aclose(self) -> None:
+        if self._thread is None:
+            return
+        await self.flush()
+        self._queue.put(_STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    def iter_orders(self) -> Iterator[dict[str, Any]]:
+        for path in self.segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # torn tail of a segment that hasn't been recovered yet
+                        break
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        break
+
+    def find(self, order_id: str) -> dict[str, Any] | None:
+        # Newest segment first, and only lines that mention the ID are parsed
+        needle = f'"orderId":"{order_id}"'.encode()
+        for path in reversed(self.segments()):
+            with open(path, "rb") as f:
+                for line in f:
+                    if needle in line and line.endswith(b"\n"):
+                        try:
+                            return json.loads(line)
+                        except ValueError:
+                            break
+        return None
+
+
+def create_order_store(
+    kind: str | None = None, orders_dir: str | None = None
+) -> OrderStore:
+    """Build the order store selected by ``ORDER_STORE`` (``jsonl`` or ``json``).
+
+    The store keeps the order index under ``<orders_dir>/index`` up to date
+    unless ``ORDER_INDEX=0``.
+    """
+    from order_index import OrderIndex  # order_index imports this module
+
+    kind = (kind or os.getenv("ORDER_STORE", "jsonl")).lower()
+    orders_dir = orders_dir or os.getenv("ORDERS_DIR", DEFAULT_ORDERS_DIR)
+    index = OrderIndex.from_env(orders_dir)
+
+    if kind == "jsonl":
+        return JsonlOrderStore(Path(orders_dir) / "segments", index=index)
+    if kind == "json":
+        return JsonFileOrderStore(orders_dir, index=index)
+    raise ValueError(f"Unknown ORDER_STORE {kind!r}, expected 'jsonl' or 'json'")
+
+
+async def import_legacy_orders(
+    store: OrderStore, orders_dir: str | os.PathLike = DEFAULT_ORDERS_DIR
+) -> int:
+    """Import ``order_*.json`` files into ``store``.
+
+    Imported orders are tagged with ``legacyFile`` so running the migration
+    again skips files that were already imported. The source files are left in
+    place. Returns the number of orders imported.
+    """
+
+    def _load_pending() -> list[dict[str, Any]]:
+        imported = {o.get("legacyFile") for o in store.iter_orders()}
+        pending = []
+        for path in sorted(Path(orders_dir).glob("order_*.json")):
+            if path.name in imported:
+                continue
+            try:
+                with open(path) as f:
+                    order = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable order file %s: %s", path, e)
+                continue
+            pending.append({**order, "legacyFile": path.name})
+        return pending
+
+    pending = await asyncio.to_thread(_load_pending)
+    # Appending concurrently lets the store commit them in a handful of batches
+    await asyncio.gather(*(store.append(order) for order in pending))
+    return len(pending)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the Brown Cafe order store")
+    parser.add_argument(
+        "--orders-dir", default=os.getenv("ORDERS_DIR", DEFAULT_ORDERS_DIR)
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="import legacy order_*.json files into segments")
+    sub.add_parser("recover", help="repair torn tails left in segments by a crash")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = JsonlOrderStore(Path(args.orders_dir) / "segments")
+
+    if args.command == "recover":
+        store.root.mkdir(parents=True, exist_ok=True)
+        print(f"Dropped {store.recover()} bytes")
+        return
+
+    async def _migrate() -> int:
+        try:
+            return await import_legacy_orders(store, args.orders_dir)
+        finally:
+            await store.aclose()
+
+    print(f"Imported {asyncio.run(_migrate())} orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Shared, pre-warmed connections to the speech and LLM providers.
+
+Each customer's ``AgentSession`` gets its own STT, LLM and TTS objects, and
+each of those used to bring its own HTTP client. So the first Deepgram stream,
+Gemini request and Murf stream of every session paid for DNS, TCP and a TLS
+handshake before the customer heard anything.
+
+``ProviderPool`` is created once per process in ``prewarm``. It holds what can
+be shared by every job in the process: the TLS context (loading the CA bundle
+takes tens of milliseconds) and the provider hosts to keep warm. Connections
+belong to an event loop, and LiveKit runs each job on its own loop (in its own
+process by default), so connections are pooled per loop:
+
+- ``attach()`` at job start creates one aiohttp session for the loop. Every
+  customer's STT, LLM and TTS in the job use it, so a connection opened for
+  one session is reused by the next.
+- It also opens ``PROVIDER_WARM_CONNECTIONS`` connections (default 1) to each
+  provider host in the background while the room connects. aiohttp hands an
+  idle keep-alive connection to the next request or websocket upgrade for the
+  same host, so the first stream or request skips the handshake.
+- Every ``PROVIDER_CHECK_SECONDS`` (default 20) the warm connections are
+  checked with a HEAD request, which also keeps them from idling out. A failed
+  check is logged and the broken connection dropped; the next round opens a
+  fresh one.
+
+Per host, ``stats`` counts the connections provider requests opened and
+reused, the connections health checks opened (``warmed``), and the time spent
+opening them. Health checks are marked through aiohttp's trace context and not
+counted as opened or reused. Each reuse took about the average connect time off
+the time to first token (or transcript, or audio) of the request that got it;
+``summary()`` is logged when a job ends. ``PROVIDER_POOL=0`` turns pooling off.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+from yarl import URL
+
+if TYPE_CHECKING:
+    from providers import ProviderConfig
+
+logger = logging.getLogger("agent.provider_pool")
+
+# ``trace_request_ctx`` of health checks, so they stay out of opened/reused
+_CHECK = SimpleNamespace(check=True)
+
+
+def _is_check(ctx: SimpleNamespace) -> bool:
+    return getattr(ctx.trace_request_ctx, "check", False)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """A provider host, and the URL used to open and check connections to it."""
+
+    url: str
+    # The Gemini SDK passes its SSL context with every request, and aiohttp
+    # only reuses a connection for requests with the same ``ssl`` argument
+    explicit_ssl: bool = False
+
+
+ENDPOINTS = {
+    "deepgram": Endpoint("https://api.deepgram.com/"),
+    "assemblyai": Endpoint("https://streaming.assemblyai.com/"),
+    "google": Endpoint("https://generativelanguage.googleapis.com/", explicit_ssl=True),
+    "murf": Endpoint("https://global.api.murf.ai/"),
+}
+
+
+class _LoopConnections:
+    __slots__ = ("genai_client", "jobs", "session", "task")
+
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        self.session = session
+        self.jobs = 0
+        self.task: asyncio.Task | None = None
+        self.genai_client: Any = None
+
+
+class ProviderPool:
+    """Provider connections shared by every session on an event loop.
+
+    Args:
+        endpoints: Hosts to keep warm, by provider name.
+        warm_connections: Idle connections kept open to each host.
+        check_interval: Seconds between health checks of the warm connections.
+        timeout: Seconds a connection or health check may take.
+        ssl_context: TLS settings for every connection; built once if omitted.
+    """
+
+    def __init__(
+        self,
+        endpoints: dict[str, Endpoint],
+        *,
+        warm_connections: int = 1,
+        check_interval: float = 20.0,
+        timeout: float = 5.0,
+        ssl_context: ssl.SSLContext | None = None,
+    ) -> None:
+        self.endpoints = endpoints
+        self.warm_connections = warm_connections
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+
+        # Host -> counters; shared by every loop, so guarded by _lock
+        self.stats: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._loops: dict[asyncio.AbstractEventLoop, _LoopConnections] = {}
+
+        self._trace = aiohttp.TraceConfig()
+        self._trace.on_request_start.append(self._on_request_start)
+        self._trace.on_connection_create_start.append(self._on_create_start)
+        self._trace.on_connection_create_end.append(self._on_create_end)
+        self._trace.on_connection_reuseconn.append(self._on_reuse)
+
+    @classmethod
+    def from_env(cls, config: ProviderConfig) -> ProviderPool | None:
+        """A pool for the configured providers, or None when ``PROVIDER_POOL=0``."""
+        if os.getenv("PROVIDER_POOL", "1") == "0":
+            return None
+        names = dict.fromkeys((config.stt, config.llm, config.tts))
+        return cls(
+            {name: ENDPOINTS[name] for name in names if name in ENDPOINTS},
+            warm_connections=int(os.getenv("PROVIDER_WARM_CONNECTIONS", "1")),
+            check_interval=float(os.getenv("PROVIDER_CHECK_SECONDS", "20")),
+        )
+
+    # -- per-loop connections --------------------------------------------------
+
+    def _connections(self) -> _LoopConnections:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            conns = self._loops.get(loop)
+            if conns is None:
+                connector = aiohttp.TCPConnector(
+                    ssl=self.ssl_context,
+                    # Outlives the gap between health checks
+                    keepalive_timeout=max(30.0, 3 * self.check_interval),
+                    ttl_dns_cache=300,
+                )
+                conns = self._loops[loop] = _LoopConnections(
+                    aiohttp.ClientSession(
+                        connector=connector, trace_configs=[self._trace]
+                    )
+                )
+            return conns
+
+    def session(self) -> aiohttp.ClientSession:
+        """The shared aiohttp session for the running event loop."""
+        return self._connections().session
+
+    def genai_client(self) -> Any:
+        """A Gemini SDK client whose requests go through ``session()``.
+
+        Credentials come from the same environment variables the LiveKit
+        Google plugin reads (``GOOGLE_API_KEY``, ``GOOGLE_GENAI_USE_VERTEXAI``).
+        """
+        conns = self._connections()
+        if conns.genai_client is None:
+            from google.genai import Client, types
+
+            conns.genai_client = Client(
+                http_options=types.HttpOptions(
+                    aiohttp_client=conns.session,
+                    async_client_args={"ssl": self.ssl_context},
+                )
+            )
+        return conns.genai_client
+
+    async def attach(self) -> None:
+        """Start keeping connections warm for a job on the running loop.
+
+        Returns at once; connections are opened in the background.
+        """
+        conns = self._connections()
+        conns.jobs += 1
+        if conns.task is None and self.warm_connections > 0 and self.endpoints:
+            conns.task = asyncio.create_task(
+                self._keep_warm(), name="provider-pool-warm"
+            )
+
+    async def release(self) -> None:
+        """Undo ``attach``; the loop's connections close with its last job."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            conns = self._loops.get(loop)
+            if conns is None:
+                return
+            conns.jobs -= 1
+            if conns.jobs > 0:
+                return
+            del self._loops[loop]
+        if conns.task is not None:
+            conns.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await conns.task
+        await conns.session.close()
+
+    # -- warming and health checks ---------------------------------------------
+
+    async def _keep_warm(self) -> None:
+        while True:
+            await self.warm()
+            await asyncio.sleep(self.check_interval)
+
+    async def warm(self) -> None:
+        """Open (or check) ``warm_connections`` connections to every host."""
+        await asyncio.gather(
+            *(
+                self._check(name, endpoint)
+                for name, endpoint in self.endpoints.items()
+                for _ in range(self.warm_connections)
+            )
+        )
+
+    async def _check(self, name: str, endpoint: Endpoint) -> None:
+        kwargs: dict[str, Any] = (
+            {"ssl": self.ssl_context} if endpoint.explicit_ssl else {}
+        )
+        try:
+            async with self.session().head(
+                endpoint.url,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_request_ctx=_CHECK,
+                **kwargs,
+            ) as response:
+                # Any HTTP answer means the connection works; reading the
+                # (empty) body hands it back to the pool
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._count(URL(endpoint.url).host, "failed_checks")
+            logger.warning("Health check of %s failed: %r", name, e)
+        else:
+            self._count(URL(endpoint.url).host, "checks")
+
+    # -- stats -------------------------------------------------------------------
+
+    def _count(self, host: str, key: str, amount: float = 1) -> None:
+        with self._lock:
+            stats = self.stats.setdefault(
+                host,
+                {
+                    "opened": 0,
+                    "reused": 0,
+                    "warmed": 0,
+                    "connect_ms": 0.0,
+                    "checks": 0,
+                    "failed_checks": 0,
+                },
+            )
+            stats[key] += amount
+
+    async def _on_request_start(
+        self, session: Any, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        ctx.host = params.url.host
+
+    async def _on_create_start(
+        self, session: Any, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        ctx.connect_started = time.perf_counter()
+
+    async def _on_create_end(
+        self, session: Any, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self._count(ctx.host, "warmed" if _is_check(ctx) else "opened")
+        ms = (time.perf_counter() - ctx.connect_started) * 1000
+        self._count(ctx.host, "connect_ms", ms)
+
+    async def _on_reuse(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        if not _is_check(ctx):
+            self._count(ctx.host, "reused")
+
+    def summary(self) -> str:
+        """Connections opened and reused per host, and the handshake time saved."""
+        parts = []
+        with self._lock:
+            stats = {host: dict(values) for host, values in self.stats.items()}
+        for host, s in sorted(stats.items()):
+            connections = s["opened"] + s["warmed"]
+            avg = s["connect_ms"] / connections if connections else 0.0
+            parts.append(
+                f"{host}: {s['warmed']:.0f} warmed, {s['opened']:.0f} opened "
+                f"({avg:.0f}ms each), "
+                f"{s['reused']:.0f} reused (~{avg * s['reused']:.0f}ms saved), "
+                f"{s['failed_checks']:.0f}/{s['checks'] + s['failed_checks']:.0f} "
+                "checks failed"
+            )
+        return "; ".join(parts) or "no connections"
@@ -0,0 +1,131 @@
+"""Speech and LLM provider selection, imported only when configured.
+
+Importing every plugin up front costs the supervisor and each job process
+close to a second (``livekit.plugins.google`` alone is ~0.7 s), most of it
+for providers that are not in use. ``STT_PROVIDER``, ``LLM_PROVIDER`` and
+``TTS_PROVIDER`` choose one provider each and only those plugin modules are
+imported.
+
+LiveKit plugins register themselves when imported and must do so on the
+main thread, so ``import_plugins`` runs when ``agent.py`` is loaded rather
+than in ``prewarm`` (which runs on a worker thread with
+``AGENT_JOB_EXECUTOR=thread``). That also keeps ``download-files`` working
+for the configured providers.
+
+Given a ``ProviderPool`` (see provider_pool.py), the clients send their
+requests and streams through the pool's shared, pre-warmed connections.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
+
+from livekit.agents import tokenize
+
+from tts_cache import TTS_STYLE, TTS_VOICE
+
+if TYPE_CHECKING:
+    from provider_pool import ProviderPool
+
+logger = logging.getLogger("agent.providers")
+
+PLUGIN_MODULES = {
+    "assemblyai": "livekit.plugins.assemblyai",
+    "deepgram": "livekit.plugins.deepgram",
+    "google": "livekit.plugins.google",
+    "murf": "livekit.plugins.murf",
+}
+
+STT_PROVIDERS = ("deepgram", "assemblyai")
+LLM_PROVIDERS = ("google",)
+TTS_PROVIDERS = ("murf",)
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    stt: str = "deepgram"
+    llm: str = "google"
+    tts: str = "murf"
+
+    @classmethod
+    def from_env(cls) -> ProviderConfig:
+        config = cls(
+            stt=os.getenv("STT_PROVIDER", cls.stt).lower(),
+            llm=os.getenv("LLM_PROVIDER", cls.llm).lower(),
+            tts=os.getenv("TTS_PROVIDER", cls.tts).lower(),
+        )
+        for kind, name, choices in (
+            ("STT", config.stt, STT_PROVIDERS),
+            ("LLM", config.llm, LLM_PROVIDERS),
+            ("TTS", config.tts, TTS_PROVIDERS),
+        ):
+            if name not in choices:
+                raise ValueError(
+                    f"Unknown {kind}_PROVIDER {name!r}, expected one of {choices}"
+                )
+        return config
+
+
+_plugins: dict[str, ModuleType] = {}
+
+
+def import_plugins(config: ProviderConfig) -> dict[str, float]:
+    """Import the configured plugins; returns import time per plugin in ms."""
+    timings = {}
+    for name in dict.fromkeys((config.stt, config.llm, config.tts)):
+        start = time.perf_counter()
+        _plugins[name] = importlib.import_module(PLUGIN_MODULES[name])
+        timings[f"import_{name}"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def _plugin(name: str) -> ModuleType:
+    if name not in _plugins:
+        raise RuntimeError(f"Provider plugin {name!r} was not imported at startup")
+    return _plugins[name]
+
+
+def create_stt(config: ProviderConfig, pool: ProviderPool | None = None) -> Any:
+    http_session = pool.session() if pool else None
+    if config.stt == "assemblyai":
+        return _plugin("assemblyai").STT(http_session=http_session)
+    return _plugin("deepgram").STT(model="nova-3", http_session=http_session)
+
+
+def create_llm(config: ProviderConfig, pool: ProviderPool | None = None) -> Any:
+    llm = _plugin("google").LLM(model="gemini-2.5-flash")
+    if pool is not None:
+        _share_genai_client(llm, pool)
+    return llm
+
+
+def _share_genai_client(llm: Any, pool: ProviderPool) -> None:
+    """Point ``llm`` at the pool's Gemini client, if the plugin allows it.
+
+    The plugin builds a Gemini client (and HTTP session) per LLM and has no
+    option to pass one in, so this replaces its private ``_client``. Should a
+    plugin release rename it, the LLM keeps its own client.
+    """
+    if not hasattr(llm, "_client"):
+        logger.warning(
+            "google LLM has no _client attribute; Gemini requests won't use "
+            "the provider pool"
+        )
+        return
+    llm._client = pool.genai_client()
+
+
+def create_tts(config: ProviderConfig, pool: ProviderPool | None = None) -> Any:
+    return _plugin("murf").TTS(
+        voice=TTS_VOICE,
+        style=TTS_STYLE,
+        tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+        text_pacing=True,
+        http_session=pool.session() if pool else None,
+    )
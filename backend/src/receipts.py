@@ -0,0 +1,245 @@
+"""Customer receipts: rendered once per order and served again on request.
+
+``save_order`` used to render the receipt HTML and publish it once; a client
+that missed the message, or closed the receipt, had no way to get it back, and
+nothing about it was kept with the order.
+
+A ``Receipt`` is built once when an order is saved. Its prices are the ones the
+customer was charged, so they are stored with the order as one compact field,
+``"receipt": {"lineCents": [450, 900]}``. Everything else on a receipt is in
+the order record already, and the time comes from the order ID. A receipt
+renders its HTML and plain text at most once. It also encodes ESC/POS bytes for
+58 mm thermal printers.
+
+``ReceiptCache`` keeps the most recent ``RECEIPT_CACHE_SIZE`` receipts (default
+256) for every job in the process. Asking it again for an order (a reprint, a
+reconnecting client, the ``get_receipt`` tool) returns the same object. If the
+order has dropped out of the cache, it is rebuilt from the order store, with
+the prices the order was saved with.
+
+Print a saved order's receipt from the command line::
+
+    python src/receipts.py 01JD5Q3Z8X4N2C6V0T8R1M3K5P              # plain text
+    python src/receipts.py 01JD5Q3Z8X4N2C6V0T8R1M3K5P --escpos > /dev/usb/lp0
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+from menu import current
+from order_ids import created_at
+from order_model import line_items
+from templates import render_receipt_html
+
+if TYPE_CHECKING:
+    from order_store import OrderStore
+
+RECEIPT_TOPIC = "order_receipt"
+# A client asking for its last receipt again (after reconnecting, or to reprint)
+RECEIPT_REQUEST_TOPIC = "order_receipt_request"
+
+# Characters per line on a 58 mm printer with the default font
+TEXT_WIDTH = 32
+
+# ESC/POS commands
+_INIT = b"\x1b@"
+_CENTER = b"\x1ba\x01"
+_LEFT = b"\x1ba\x00"
+_BOLD_ON = b"\x1bE\x01"
+_BOLD_OFF = b"\x1bE\x00"
+_FEED_AND_CUT = b"\x1dVB\x03"
+
+
+class Receipt:
+    """The receipt for one saved order.
+
+    Args:
+        order_id: The order's ID; also the receipt number and time.
+        order: The order as saved (``name`` and ``items``).
+        line_cents: Price of each line item when the order was saved.
+    """
+
+    def __init__(
+        self, order_id: str, order: dict[str, Any], line_cents: list[int]
+    ) -> None:
+        self.order_id = order_id
+        self.order = order
+        self.line_cents = line_cents
+        self.total_cents = sum(line_cents)
+
+    @classmethod
+    def for_order(cls, order: dict[str, Any], order_id: str) -> Receipt:
+        """A receipt for ``order`` at current menu prices."""
+        menu = current()
+        return cls(order_id, order, [menu.line_total(i) for i in line_items(order)])
+
+    @classmethod
+    def from_record(cls, record: dict[str, Any]) -> Receipt:
+        """The receipt for an order record from the order store.
+
+        Orders saved before receipts were stored are priced from the menu.
+        """
+        line_cents = (record.get("receipt") or {}).get("lineCents")
+        if line_cents is None or len(line_cents) != len(line_items(record)):
+            return cls.for_order(record, record["orderId"])
+        return cls(record["orderId"], record, list(line_cents))
+
+    def compact(self) -> dict[str, Any]:
+        """What is stored with the order to rebuild this receipt."""
+        return {"lineCents": self.line_cents}
+
+    @functools.cached_property
+    def html(self) -> str:
+        order_time = created_at(self.order_id).strftime("%B %d, %Y at %I:%M %p")
+        return render_receipt_html(
+            self.order, self.order_id, order_time, self.total_cents, self.line_cents
+        )
+
+    @functools.cached_property
+    def text(self) -> str:
+        return self.to_text()
+
+    def to_text(self, width: int = TEXT_WIDTH) -> str:
+        """Plain text, ``width`` characters per line."""
+        menu = current()
+        rule = "-" * width
+
+        def row(left: str, right: str = "") -> str:
+            if not right:
+                return left[:width]
+            return f"{left[: width - len(right) - 1]:<{width - len(right)}}{right}"
+
+        lines = [
+            "BROWN CAFE".center(width).rstrip(),
+            f"Order {self.order_id}"[:width],
+            created_at(self.order_id).strftime("%Y-%m-%d %H:%M"),
+            row(f"Name: {self.order.get('name') or ''}"),
+            rule,
+        ]
+        for item, cents in zip(line_items(self.order), self.line_cents):
+            quantity = item.get("quantity") or 1
+            drink = (item.get("drinkType") or "").title()
+            label = f"{quantity} x {drink}" if quantity > 1 else drink
+            lines.append(row(label, menu.format_price(cents)))
+            lines.append(
+                row(f"  {(item.get('size') or '').title()}, {item.get('milk')}")
+            )
+            for extra in item.get("extras") or ():
+                lines.append(row(f"  + {extra}"))
+        lines += [rule, row("TOTAL", menu.format_price(self.total_cents))]
+        return "\n".join(lines) + "\n"
+
+    def to_escpos(self, width: int = TEXT_WIDTH) -> bytes:
+        """The plain-text receipt as ESC/POS commands, ending with a cut.
+
+        Text is encoded in code page 437, the default on most printers;
+        characters it lacks print as ``?``.
+        """
+        header, _, body = self.to_text(width).partition("\n")
+        return b"".join(
+            (
+                _INIT,
+                _CENTER,
+                _BOLD_ON,
+                header.strip().encode("cp437", "replace") + b"\n",
+                _BOLD_OFF,
+                _LEFT,
+                body.encode("cp437", "replace"),
+                _FEED_AND_CUT,
+            )
+        )
+
+
+class ReceiptCache:
+    """The most recent receipts by order ID, shared by every job in the process.
+
+    Args:
+        max_entries: Receipts kept; the least recently used is dropped first.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "loaded": 0}
+        self._receipts: OrderedDict[str, Receipt] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._receipts)
+
+    def put(self, receipt: Receipt) -> None:
+        with self._lock:
+            self._receipts[receipt.order_id] = receipt
+            self._receipts.move_to_end(receipt.order_id)
+            while len(self._receipts) > self.max_entries:
+                self._receipts.popitem(last=False)
+
+    def get_cached(self, order_id: str) -> Receipt | None:
+        with self._lock:
+            receipt = self._receipts.get(order_id)
+            if receipt is None:
+                self.stats["misses"] += 1
+                return None
+            self._receipts.move_to_end(order_id)
+            self.stats["hits"] += 1
+            return receipt
+
+    async def get(
+        self, order_id: str, store: OrderStore | None = None
+    ) -> Receipt | None:
+        """The receipt for ``order_id``, loaded from ``store`` on a miss."""
+        receipt = self.get_cached(order_id)
+        if receipt is not None or store is None:
+            return receipt
+        # Scans the order store, so off the event loop
+        record = await asyncio.to_thread(store.find, order_id)
+        if record is None:
+            return None
+        receipt = Receipt.from_record(record)
+        with self._lock:
+            self.stats["loaded"] += 1
+        self.put(receipt)
+        return receipt
+
+
+_cache: ReceiptCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_receipt_cache() -> ReceiptCache:
+    """The process-wide cache, sized from ``RECEIPT_CACHE_SIZE``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReceiptCache(int(os.getenv("RECEIPT_CACHE_SIZE", "256")))
+        return _cache
+
+
+def main() -> None:
+    from order_store import create_order_store
+
+    parser = argparse.ArgumentParser(description="Print a saved order's receipt")
+    parser.add_argument("order_id")
+    parser.add_argument("--escpos", action="store_true", help="ESC/POS bytes")
+    parser.add_argument("--width", type=int, default=TEXT_WIDTH)
+    args = parser.parse_args()
+
+    record = create_order_store().find(args.order_id)
+    if record is None:
+        sys.exit(f"No saved order {args.order_id}")
+    receipt = Receipt.from_record(record)
+    if args.escpos:
+        sys.stdout.buffer.write(receipt.to_escpos(args.width))
+    else:
+        sys.stdout.write(receipt.to_text(args.width))
+
+
+if __name__ == "__main__":
+    main()
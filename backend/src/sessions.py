@@ -0,0 +1,165 @@
+"""Per-customer order sessions and the process-wide session registry.
+
+Concurrency model
+-----------------
+- A job is one LiveKit room. With the default process executor every job gets its
+  own worker process; with ``AGENT_JOB_EXECUTOR=thread`` many rooms share one
+  process, each job running on its own thread and event loop.
+- With ``MULTI_SESSION=1`` a job starts one ``AgentSession`` + ``Assistant`` per
+  customer (remote participant) in the room, all on that job's event loop. Each
+  customer's order lives in its own ``OrderSession``, which is only ever touched
+  from that one loop, so order mutations need no locking.
+- ``SessionRegistry`` is shared by every job in the process and keyed by
+  ``(room, participant identity)``. Its bookkeeping is guarded by a
+  ``threading.Lock`` that is held only for dictionary operations, never across
+  an ``await`` or I/O, so it is safe from any job thread and never stalls a loop.
+- Memory is bounded. A session is *attached* while a customer is connected and
+  *detached* once they leave; detached sessions are kept for ``idle_timeout``
+  seconds so a reconnecting customer resumes their order, then dropped. When the
+  registry holds ``max_sessions`` sessions the least recently detached one is
+  evicted; if every session is attached, ``acquire`` raises ``SessionLimitError``
+  and the customer is not served by this worker.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from order_model import Order
+
+
+class SessionLimitError(RuntimeError):
+    """Raised when the registry is full of attached sessions."""
+
+
+class OrderSession:
+    """Order state for one customer in one room.
+
+    ``order_id`` is assigned when the current order is first saved and kept
+    across retries; ``saved_order_id`` is the customer's last saved order.
+    ``customer`` is the identity of the participant being served: ``identity``
+    in multi-session mode, and set once someone joins in single-session mode,
+    where ``identity`` stays None.
+    """
+
+    __slots__ = (
+        "attached",
+        "customer",
+        "identity",
+        "last_active",
+        "order",
+        "order_id",
+        "room",
+        "saved_order_id",
+    )
+
+    def __init__(self, room: str = "", identity: str | None = None) -> None:
+        self.room = room
+        self.identity = identity
+        self.customer = identity
+        self.order = Order()
+        self.order_id: str | None = None
+        self.saved_order_id: str | None = None
+        self.attached = False
+        self.last_active = time.monotonic()
+
+    def reset_order(self) -> None:
+        self.order = Order()
+        self.order_id = None
+
+
+class SessionRegistry:
+    """Bounded registry of ``OrderSession``s keyed by (room, participant identity).
+
+    Args:
+        max_sessions: Most sessions (attached or not) kept in this process.
+        idle_timeout: Seconds a detached session is kept before eviction.
+    """
+
+    def __init__(self, max_sessions: int = 256, idle_timeout: float = 300.0) -> None:
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.stats = {"created": 0, "resumed": 0, "evicted": 0}
+
+        self._lock = threading.Lock()
+        # Ordered by last detach, least recent first; attached sessions are
+        # moved to the end so eviction scans start with the best candidates
+        self._sessions: OrderedDict[tuple[str, str], OrderSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, room: str, identity: str) -> OrderSession | None:
+        return self._sessions.get((room, identity))
+
+    def acquire(self, room: str, identity: str) -> OrderSession:
+        """Attach to the customer's session, creating it if needed."""
+        key = (room, identity)
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+            session = self._sessions.get(key)
+            if session is not None:
+                self.stats["resumed"] += 1
+            else:
+                if len(self._sessions) >= self.max_sessions:
+                    self._evict_one()
+                session = OrderSession(room, identity)
+                self._sessions[key] = session
+                self.stats["created"] += 1
+
+            session.attached = True
+            self._sessions.move_to_end(key)
+            return session
+
+    def release(self, room: str, identity: str) -> None:
+        """Detach a customer who left; their session expires after ``idle_timeout``."""
+        key = (room, identity)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return
+            session.attached = False
+            session.last_active = time.monotonic()
+            self._sessions.move_to_end(key)
+            self._evict_idle(session.last_active)
+
+    def _evict_idle(self, now: float) -> None:
+        expired = [
+            key
+            for key, session in self._sessions.items()
+            if not session.attached and now - session.last_active > self.idle_timeout
+        ]
+        for key in expired:
+            del self._sessions[key]
+        self.stats["evicted"] += len(expired)
+
+    def _evict_one(self) -> None:
+        for key, session in self._sessions.items():
+            if not session.attached:
+                del self._sessions[key]
+                self.stats["evicted"] += 1
+                return
+        raise SessionLimitError(
+            f"All {self.max_sessions} order sessions in this worker are in use"
+        )
+
+
+_registry: SessionRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SessionRegistry:
+    """The process-wide registry, sized from ``MAX_ORDER_SESSIONS`` and
+    ``ORDER_SESSION_IDLE_TIMEOUT``."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SessionRegistry(
+                max_sessions=int(os.getenv("MAX_ORDER_SESSIONS", "256")),
+                idle_timeout=float(os.getenv("ORDER_SESSION_IDLE_TIMEOUT", "300")),
+            )
+        return _registry
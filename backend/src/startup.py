@@ -0,0 +1,54 @@
+"""Worker startup timing and per-process shared models.
+
+``prewarm`` runs once per job process before any job is assigned, so anything
+loaded there is off the critical path of a customer's first turn. Each phase
+is timed with ``PhaseTimer`` and the result is logged and kept in
+``proc.userdata["startup_timings"]``; jobs add their own time to ready and to
+first audio, which is what autoscaling cold starts are made of.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from collections.abc import Iterator
+from typing import Any
+
+# Registers the turn detector's inference runner, which has to happen on the
+# main thread of the main process, i.e. at import time
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+
+class PhaseTimer:
+    """Records how long each named startup phase takes, in milliseconds."""
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name}={ms:.0f}ms" for name, ms in self.timings.items())
+        return f"{sum(self.timings.values()):.0f}ms ({phases})"
+
+
+def shared_turn_detector(userdata: dict[str, Any], inference_executor: Any) -> Any:
+    """One turn detector per inference executor, reused by every session on it.
+
+    The model binds to the current job's inference executor when it is built,
+    so it can't be created in ``prewarm``. Sessions on the same executor (all
+    customers of a ``MULTI_SESSION`` job, or jobs of a thread executor) share
+    one instance and its parsed language table.
+    """
+    detectors = userdata.setdefault("turn_detectors", {})
+    key = id(inference_executor)
+    if key not in detectors:
+        # Keep the executor referenced so its id can't be reused
+        detectors[key] = (inference_executor, MultilingualModel())
+    return detectors[key][1]
@@ -0,0 +1,209 @@
+"""Structured, low-overhead logging for the agent.
+
+With ``LOG_FORMAT=json`` the ``agent`` loggers stop going through LiveKit's
+handlers and are written as JSON lines instead::
+
+    {"ts": 1732373198.123, "level": "INFO", "logger": "agent",
+     "msg": "Updated size: large", "room": "cafe-1", "participant": "sam"}
+
+Three things keep logging off the event loop's critical path:
+
+- Messages use ``%`` arguments (``logger.info("Updated size: %s", size)``),
+  so nothing is formatted for a level that is switched off.
+- Records that pass the level and sampling checks are put on a queue by a
+  ``QueueHandler`` and encoded and written by a listener thread, so a slow
+  terminal or log shipper never blocks a tool.
+- Loggers for high-frequency events (every visualization publish) are
+  sampled: only every ``LOG_SAMPLE_EVERY``-th record per message is kept
+  (default 20, 1 keeps all of them), tagged with ``"sampled": N``.
+
+``bind(room=..., participant=...)`` tags every record logged from the current
+task, and from tasks it starts afterwards, so each customer's lines can be
+told apart when several share a worker. ``LOG_FORMAT=text`` (the default)
+leaves LiveKit's logging setup alone; sampling and ``bind`` fields still apply.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Any, TextIO
+
+LOG_FORMATS = ("text", "json")
+
+# Loggers whose records are sampled
+SAMPLED_LOGGERS = ("agent.publish",)
+
+_context: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar(
+    "agent_log_context", default=None
+)
+
+
+def bind(**fields: Any) -> None:
+    """Add ``fields`` to every record logged from the current context."""
+    _context.set({**(_context.get() or {}), **fields})
+
+
+def log_format() -> str:
+    """Output format from ``LOG_FORMAT``, defaulting to ``text``."""
+    fmt = os.getenv("LOG_FORMAT", "text").lower()
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Unknown LOG_FORMAT {fmt!r}, expected one of {LOG_FORMATS}")
+    return fmt
+
+
+class ContextFilter(logging.Filter):
+    """Copies the ``bind`` fields onto each record, in the thread that logs it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keeps the first and then every ``every``-th record of each message.
+
+    Records are counted per logger and message template, so a rare message on
+    a sampled logger is not drowned out by a frequent one. Warnings and
+    errors are always kept.
+    """
+
+    def __init__(self, every: int, loggers: tuple[str, ...] = SAMPLED_LOGGERS):
+        super().__init__()
+        self.every = every
+        self.loggers = loggers
+        self._counters: dict[tuple[str, str], itertools.count] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            self.every <= 1
+            or record.levelno >= logging.WARNING
+            or not record.name.startswith(self.loggers)
+        ):
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            counter = self._counters.setdefault(key, itertools.count())
+            n = next(counter)
+        record.sampled = self.every
+        return n % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and context."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        sampled = getattr(record, "sampled", None)
+        if sampled:
+            entry["sampled"] = sampled
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, as the stdlib handler does: the arguments may
+        # be objects the caller keeps changing (stats dicts, the order), and
+        # the traceback is gone by the time the listener thread gets to it
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# What configure() changed, so shutdown() can undo it
+_installed: list[tuple[logging.Logger, Any]] | None = None
+_listener: logging.handlers.QueueListener | None = None
+_lock = threading.Lock()
+
+
+def configure(
+    fmt: str | None = None,
+    *,
+    stream: TextIO | None = None,
+    level: int = logging.INFO,
+    sample_every: int | None = None,
+) -> None:
+    """Set up agent logging for ``fmt`` (default ``LOG_FORMAT``). Idempotent.
+
+    Args:
+        fmt: ``text`` or ``json``.
+        stream: Where JSON lines go (default stderr).
+        level: Level of the ``agent`` logger in JSON mode.
+        sample_every: Keep every N-th record of sampled loggers (default
+            ``LOG_SAMPLE_EVERY``).
+    """
+    global _installed, _listener
+    fmt = fmt or log_format()
+    if sample_every is None:
+        sample_every = int(os.getenv("LOG_SAMPLE_EVERY", "20"))
+    agent_logger = logging.getLogger("agent")
+
+    with _lock:
+        if _installed is not None:
+            return
+        _installed = []
+        filters = [ContextFilter(), SampleFilter(sample_every)]
+        if fmt == "text":
+            # Filters on a logger only see its own records, not its children's
+            for name in ("agent", *SAMPLED_LOGGERS):
+                for f in filters:
+                    logging.getLogger(name).addFilter(f)
+                    _installed.append((logging.getLogger(name), f))
+            return
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter())
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        for f in filters:
+            handler.addFilter(f)
+
+        agent_logger.addHandler(handler)
+        agent_logger.setLevel(level)
+        agent_logger.propagate = False
+        _installed.append((agent_logger, handler))
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Write out queued records and undo ``configure``."""
+    global _installed, _listener
+    with _lock:
+        installed, _installed = _installed or [], None
+        listener, _listener = _listener, None
+    for logger, item in installed:
+        if isinstance(item, logging.Handler):
+            logger.removeHandler(item)
+            logger.propagate = True
+            logger.setLevel(logging.NOTSET)
+        else:
+            logger.removeFilter(item)
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,375 @@
+"""Per-turn latency tracing for the voice pipeline.
+
+A turn starts when the customer stops speaking and ends when they stop
+speaking again (or the session closes). ``TurnTracer`` follows the session's
+events and assembles one span per turn:
+
+- ``end_of_utterance``: VAD end of speech until the turn was committed
+- ``stt_final``: end of speech until the final transcript
+- ``on_user_turn_completed``: the agent's pre-LLM hook (e.g. the fast path)
+- ``llm_ttft`` / ``llm_duration``: time to first token and full generation
+- ``tts_ttfb``: text sent until the first synthesized audio
+- ``response``: end of speech until the agent's audio starts, end to end
+- ``playout``: how long the agent spoke
+- every tool call and every ``publish_data`` with its duration
+- ``tokens``: the LLM's reported prompt tokens (and how many were cached),
+  and the context window's estimate before and after trimming
+
+Every stage, tool and publish is also observed in Prometheus histograms. Set
+``PROMETHEUS_PORT`` and the LiveKit worker serves them on ``/metrics``. To
+include job processes, export ``PROMETHEUS_MULTIPROC_DIR`` before starting the
+worker. Quantiles come from ``histogram_quantile``.
+
+Without Prometheus, set ``TELEMETRY_DIR`` to write spans as JSON lines (one
+file per process) and summarize them offline::
+
+    python src/telemetry.py report telemetry/
+
+Each session also logs its own p50/p95/p99 per stage when it ends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any
+
+import prometheus_client
+
+logger = logging.getLogger("agent.telemetry")
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30)
+
+STAGE_SECONDS = prometheus_client.Histogram(
+    "barista_turn_stage_seconds",
+    "Latency of each voice pipeline stage, per turn",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+TOOL_SECONDS = prometheus_client.Histogram(
+    "barista_tool_call_seconds",
+    "Function tool execution time",
+    ["tool"],
+    buckets=_BUCKETS,
+)
+PUBLISH_SECONDS = prometheus_client.Histogram(
+    "barista_publish_data_seconds",
+    "Time spent in publish_data, by topic",
+    ["topic"],
+    buckets=_BUCKETS,
+)
+PROMPT_TOKENS = prometheus_client.Histogram(
+    "barista_llm_prompt_tokens",
+    "Prompt tokens per LLM request, as reported by the provider",
+    ["kind"],
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000),
+)
+TURNS = prometheus_client.Counter(
+    "barista_turns_total", "Completed turns, by who answered", ["path"]
+)
+
+
+def percentiles(samples: list[float], points=(50, 95, 99)) -> dict[str, float]:
+    """Nearest-rank percentiles of ``samples``."""
+    ordered = sorted(samples)
+    return {
+        f"p{p}": ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] for p in points
+    }
+
+
+class SpanFileExporter:
+    """Appends finished spans as JSON lines to ``<dir>/spans-<pid>.jsonl``.
+
+    Spans are buffered and written off the event loop in batches. Every
+    session's exporter in the process appends to the same file, so writes
+    take a process-wide lock; ``flush`` also waits for writes in flight.
+    """
+
+    _write_lock = threading.Lock()
+
+    def __init__(self, directory: Path | str, batch: int = 32) -> None:
+        self.path = Path(directory) / f"spans-{os.getpid()}.jsonl"
+        self.batch = batch
+        self._pending: list[str] = []
+        self._writes: set[asyncio.Future] = set()
+
+    @classmethod
+    def from_env(cls) -> SpanFileExporter | None:
+        directory = os.getenv("TELEMETRY_DIR")
+        return cls(directory) if directory else None
+
+    def export(self, span: dict[str, Any]) -> None:
+        self._pending.append(json.dumps(span, separators=(",", ":")))
+        if len(self._pending) >= self.batch:
+            self._start_write()
+
+    async def flush(self) -> None:
+        if self._pending:
+            self._start_write()
+        if self._writes:
+            # Failures are logged by _write_done
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _start_write(self) -> None:
+        fut = asyncio.get_running_loop().run_in_executor(
+            None, self._write, self._take()
+        )
+        self._writes.add(fut)
+        fut.add_done_callback(self._write_done)
+
+    def _write_done(self, fut: asyncio.Future) -> None:
+        self._writes.discard(fut)
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.error("Failed to write spans to %s: %s", self.path, fut.exception())
+
+    def _take(self) -> list[str]:
+        lines, self._pending = self._pending, []
+        return lines
+
+    def _write(self, lines: list[str]) -> None:
+        with self._write_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+
+class TurnTracer:
+    """Builds per-turn spans for one customer's session.
+
+    Args:
+        room: Room name, recorded on every span.
+        identity: Customer identity in multi-session mode.
+        exporter: Where finished spans go, if anywhere.
+        window: How many recent samples per stage are kept for the session's
+            own percentile summary.
+    """
+
+    def __init__(
+        self,
+        room: str = "",
+        identity: str | None = None,
+        exporter: SpanFileExporter | None = None,
+        window: int = 512,
+    ) -> None:
+        self.room = room
+        self.identity = identity
+        self.exporter = exporter
+        self.turns = 0
+        self.samples: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.token_samples: dict[str, deque[int]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+
+        self._span: dict[str, Any] | None = None
+        self._user_stopped: float | None = None
+        self._speaking_since: float | None = None
+
+    def attach(self, session: Any) -> None:
+        """Follow ``session``'s events."""
+        session.on("metrics_collected", lambda ev: self.on_metrics(ev.metrics))
+        session.on("user_state_changed", lambda ev: self.on_user_state(ev.new_state))
+        session.on(
+            "agent_state_changed",
+            lambda ev: self.on_agent_state(ev.old_state, ev.new_state),
+        )
+
+    # -- session events -------------------------------------------------------
+
+    def on_user_state(self, state: str, now: float | None = None) -> None:
+        if state == "listening":  # the customer stopped speaking
+            self.finish_turn()
+            self._user_stopped = time.perf_counter() if now is None else now
+            self._current()
+
+    def on_agent_state(self, old: str, new: str, now: float | None = None) -> None:
+        now = time.perf_counter() if now is None else now
+        if new == "speaking":
+            self._speaking_since = now
+            span = self._current()
+            if self._user_stopped is not None and "response" not in span["stages"]:
+                span["stages"]["response"] = now - self._user_stopped
+        elif old == "speaking" and self._speaking_since is not None:
+            stages = self._current()["stages"]
+            stages["playout"] = stages.get("playout", 0.0) + now - self._speaking_since
+            self._speaking_since = None
+
+    def on_metrics(self, metrics: Any) -> None:
+        stages = self._current()["stages"]
+        kind = getattr(metrics, "type", None)
+        if kind == "eou_metrics":
+            stages["end_of_utterance"] = metrics.end_of_utterance_delay
+            stages["stt_final"] = metrics.transcription_delay
+            stages["on_user_turn_completed"] = metrics.on_user_turn_completed_delay
+        elif kind == "llm_metrics":
+            stages.setdefault("llm_ttft", metrics.ttft)
+            stages["llm_duration"] = stages.get("llm_duration", 0.0) + metrics.duration
+            tokens = self._current()["tokens"]
+            for name, count in (
+                ("prompt", metrics.prompt_tokens),
+                ("cached", metrics.prompt_cached_tokens),
+            ):
+                PROMPT_TOKENS.labels(kind=name).observe(count)
+                tokens[name] = tokens.get(name, 0) + count
+        elif kind == "tts_metrics":
+            stages.setdefault("tts_ttfb", metrics.ttfb)
+
+    # -- agent-side work ------------------------------------------------------
+
+    def record_tool(self, name: str, seconds: float) -> None:
+        TOOL_SECONDS.labels(tool=name).observe(seconds)
+        self.samples[f"tool:{name}"].append(seconds)
+        self._current()["tools"].append({"name": name, "ms": round(seconds * 1e3, 3)})
+
+    def record_publish(self, topic: str, seconds: float, size: int) -> None:
+        PUBLISH_SECONDS.labels(topic=topic).observe(seconds)
+        self.samples[f"publish:{topic}"].append(seconds)
+        self._current()["publishes"].append(
+            {"topic": topic, "ms": round(seconds * 1e3, 3), "bytes": size}
+        )
+
+    def record_context(self, stats: dict[str, int]) -> None:
+        """Record the context window's size for an LLM request this turn."""
+        tokens = self._current()["tokens"]
+        for name in ("est_tokens", "est_tokens_untrimmed", "dropped"):
+            tokens[name] = tokens.get(name, 0) + stats[name]
+
+    def mark_path(self, path: str) -> None:
+        """Record who answered this turn (``llm`` unless told otherwise)."""
+        self._current()["path"] = path
+
+    # -- spans ----------------------------------------------------------------
+
+    def _current(self) -> dict[str, Any]:
+        if self._span is None:
+            self._span = {
+                "room": self.room,
+                "identity": self.identity,
+                "turn": self.turns + 1,
+                "ts": time.time(),
+                "path": "llm",
+                "stages": {},
+                "tools": [],
+                "publishes": [],
+                "tokens": {},
+            }
+        return self._span
+
+    def finish_turn(self) -> dict[str, Any] | None:
+        """Close the current span, record it and return it."""
+        span, self._span = self._span, None
+        if span is None or not (
+            span["stages"] or span["tools"] or span["publishes"] or span["tokens"]
+        ):
+            return None
+
+        self.turns += 1
+        TURNS.labels(path=span["path"]).inc()
+        for stage, seconds in span["stages"].items():
+            STAGE_SECONDS.labels(stage=stage).observe(seconds)
+            self.samples[stage].append(seconds)
+        for name, count in span["tokens"].items():
+            self.token_samples[name].append(count)
+        span["stages"] = {k: round(v * 1e3, 3) for k, v in span["stages"].items()}
+        if self.exporter is not None:
+            self.exporter.export(span)
+        return span
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """p50/p95/p99 in milliseconds for every stage, tool and topic seen."""
+        return {
+            name: {k: round(v * 1e3, 1) for k, v in percentiles(list(values)).items()}
+            for name, values in self.samples.items()
+            if values
+        }
+
+    async def aclose(self) -> None:
+        self.finish_turn()
+        if self.exporter is not None:
+            await self.exporter.flush()
+        if self.turns:
+            logger.info(
+                "Turn latency over %d turns (ms): %s", self.turns, self.summary()
+            )
+        if self.token_samples:
+            tokens = {
+                name: percentiles(list(values))
+                for name, values in self.token_samples.items()
+            }
+            logger.info("LLM context tokens per turn: %s", tokens)
+
+
+def timed_tool(fn):
+    """Time a function tool on ``self.tracer``. Apply below ``@function_tool``."""
+
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(self, *args, **kwargs)
+        finally:
+            self.tracer.record_tool(fn.__name__, time.perf_counter() - start)
+
+    return wrapper
+
+
+def report(directory: Path) -> dict[str, dict[str, float]]:
+    """Percentiles per stage, tool and publish topic (ms) and token count."""
+    samples: dict[str, list[float]] = defaultdict(list)
+    turns: dict[str, int] = defaultdict(int)
+    for path in sorted(directory.glob("spans-*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                span = json.loads(line)
+                turns[span["path"]] += 1
+                for stage, ms in span["stages"].items():
+                    samples[stage].append(ms)
+                for tool in span["tools"]:
+                    samples[f"tool:{tool['name']}"].append(tool["ms"])
+                for publish in span["publishes"]:
+                    samples[f"publish:{publish['topic']}"].append(publish["ms"])
+                for name, count in span.get("tokens", {}).items():
+                    samples[f"tokens:{name}"].append(count)
+
+    result = {
+        name: {"count": len(values), **percentiles(values)}
+        for name, values in sorted(samples.items())
+    }
+    result["turns"] = dict(turns)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize exported turn spans")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument(
+        "directory", nargs="?", default=os.getenv("TELEMETRY_DIR", "telemetry")
+    )
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    result = report(Path(args.directory))
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"turns: {result.pop('turns')}")
+    print(f"{'':>32} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}  (ms or tokens)")
+    for name, stats in result.items():
+        print(
+            f"{name:>32} {stats['count']:>7} "
+            f"{stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Pre-parsed HTML templates for the drink visualization and the receipt.
+
+The static markup is split into literal chunks once at import time, so a render
+only joins those chunks with the few values that change per order. The cup
+fragment depends on nothing but drink, size and whether there is whipped cream,
+so rendered cups are kept in an LRU cache of ``CUP_CACHE_SIZE`` (256) entries
+keyed on those three values; ``prewarm`` fills it for the whole menu when the
+worker process starts. Cup colors and sizes come from the menu (see menu.py),
+and the cache is cleared whenever the menu is reloaded.
+
+The drink visualization shows a single drink (the order's current item); the
+receipt lists every line item of the order.
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+from string import Formatter
+from typing import Any
+
+from menu import current, on_reload
+from order_model import line_items
+
+# Cup and color until the customer has picked a size and drink
+DEFAULT_SIZE = {"height": "95px", "width": "70px"}
+DEFAULT_DRINK_COLOR = "#A67C52"
+
+EMPTY_FIELD = "—"
+EMPTY_EXTRAS = '<span style="color: #6b5d52; font-size: 10px;">—</span>'
+
+
+class Template:
+    """A ``str.format``-style template split into literal chunks once.
+
+    Each field gets a slot between the chunks, so a render only fills the slots
+    and joins the list, with no per-call parsing of the template.
+    """
+
+    __slots__ = ("_fields", "_parts")
+
+    def __init__(self, source: str) -> None:
+        self._parts: list[str] = []
+        # (slot in _parts, field name)
+        self._fields: list[tuple[int, str]] = []
+        for literal, field, _, _ in Formatter().parse(source):
+            if literal:
+                self._parts.append(literal)
+            if field is not None:
+                if not field.isidentifier():
+                    raise ValueError(f"Template fields must be identifiers: {field!r}")
+                self._fields.append((len(self._parts), field))
+                self._parts.append("")
+
+    def render(self, **values: Any) -> str:
+        parts = self._parts.copy()
+        for slot, field in self._fields:
+            parts[slot] = str(values[field])
+        return "".join(parts)
+
+
+_DRINK_SHELL = Template(
+    """
+        <div style="font-family: 'Inter', -apple-system, sans-serif; padding: 16px; background: linear-gradient(135deg, #3a3330 0%, #2a2522 100%); border-radius: 2px; max-width: 280px; margin: 0 auto; color: #a89584; box-shadow: 0 8px 32px rgba(0,0,0,0.4); border: 1px solid #8b7355/20;">
+            <div style="text-align: center; margin-bottom: 12px; padding-bottom: 12px; border-bottom: 1px solid #8b7355/20;">
+                <h2 style="margin: 0; font-size: 14px; font-weight: 300; letter-spacing: 0.3em; text-transform: uppercase; color: #8b7355;">
+                    <span style="font-size: 16px; margin-right: 8px;">☕</span>
+                    <span>Brown Cafe</span>
+                </h2>
+            </div>
+
+            <div style="background: #1a1816; border-radius: 2px; padding: 14px; color: #a89584; border: 1px solid #8b7355/10;">
+                <h3 style="margin: 0 0 12px 0; color: #8b7355; text-align: center; font-size: 12px; font-weight: 300; letter-spacing: 0.2em; text-transform: uppercase; padding-bottom: 8px; border-bottom: 1px solid #8b7355/20;">Your Order</h3>
+
+                <!-- Drink Visualization -->
+                <div style="display: flex; justify-content: center; align-items: center; margin: 12px 0; padding: 16px; background: #2a2522; border-radius: 2px; border: 1px solid #8b7355/10;">
+{cup}                </div>
+
+                <!-- Order Details -->
+                <div style="margin-top: 12px; background: #2a2522; border-radius: 2px; padding: 10px; font-size: 11px; border: 1px solid #8b7355/10;">
+                    <div style="display: grid; grid-template-columns: auto 1fr; gap: 6px 12px; align-items: start;">
+                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Drink:</strong>
+                        <span style="color: #a89584;">{drink}</span>
+
+                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Size:</strong>
+                        <span style="color: #a89584;">{size}</span>
+
+                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Milk:</strong>
+                        <span style="color: #a89584;">{milk}</span>
+
+                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Extras:</strong>
+                        <div style="color: #a89584;">{extras}</div>
+
+                        <strong style="color: #8b7355; font-weight: 300; letter-spacing: 0.1em; text-transform: uppercase; font-size: 10px;">Name:</strong>
+                        <span style="color: #a89584;">{name}</span>
+                    </div>
+                </div>
+            </div>
+        </div>
+        """
+)
+
+_CUP = Template(
+    """                    <div style="position: relative; display: inline-block;">
+                        <!-- Minimalist Cup -->
+                        <div style="position: relative; width: {width}; height: {height}; background: linear-gradient(to bottom, {drink_color} 0%, {drink_color} 85%, #3e2723 100%); border-radius: 0 0 12px 12px; box-shadow: 0 4px 16px rgba(0,0,0,0.3), inset -3px 0 8px rgba(0,0,0,0.2), inset 3px 0 8px rgba(255,255,255,0.1); border: 2px solid #3e2723; border-top: none;">
+                            <!-- Cup Top/Rim -->
+                            <div style="position: absolute; top: -6px; left: -2px; right: -2px; height: 10px; background: {drink_color}; border: 2px solid #3e2723; border-radius: 50%; box-shadow: inset 0 -2px 4px rgba(0,0,0,0.3);"></div>
+
+                            <!-- Whipped Cream -->
+                            {whipped_cream}
+
+                            <!-- Cup Handle -->
+                            <div style="position: absolute; right: -20px; top: 25%; width: 24px; height: 40%; border: 3px solid #3e2723; border-left: none; border-radius: 0 50% 50% 0; background: linear-gradient(to right, transparent 0%, {drink_color} 50%); opacity: 0.7;"></div>
+                        </div>
+
+                        <!-- Size Badge -->
+                        <div style="text-align: center; margin-top: 10px;">
+                            <span style="display: inline-block; background: #8b7355; color: #1a1816; padding: 4px 12px; border-radius: 1px; font-weight: 300; font-size: 10px; letter-spacing: 0.2em; text-transform: uppercase; box-shadow: 0 2px 8px rgba(0,0,0,0.2);">
+                                {size_badge}
+                            </span>
+                        </div>
+                    </div>
+"""
+)
+
+_WHIPPED_CREAM = """<div style="position: absolute; top: -22px; left: 50%; transform: translateX(-50%); width: calc(100% - 8px); height: 30px; background: radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%); border-radius: 50% 50% 40% 40%; box-shadow: 0 2px 6px rgba(0,0,0,0.2); border: 1px solid #F0E5D8;"></div>
+                            <div style="position: absolute; top: -26px; left: 50%; transform: translateX(-50%); width: 55%; height: 18px; background: radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%); border-radius: 50%; opacity: 0.9;"></div>"""
+
+_RECEIPT = Template(
+    """
+        <div style="font-family: 'Inter', -apple-system, sans-serif; padding: 24px; background: #f5f3f0; border-radius: 2px; max-width: 380px; margin: 0 auto; color: #3a3330; box-shadow: 0 12px 48px rgba(0,0,0,0.2); border: 1px solid #8b7355/20;">
+            <div style="text-align: center; border-bottom: 1px solid #8b7355/20; padding-bottom: 18px; margin-bottom: 18px;">
+                <div style="font-size: 28px; margin-bottom: 10px; opacity: 0.8;">☕</div>
+                <h2 style="margin: 0; font-size: 18px; font-weight: 300; letter-spacing: 0.3em; color: #8b7355; text-transform: uppercase;">Brown Cafe</h2>
+                <p style="margin: 6px 0 0 0; font-size: 11px; color: #6b5d52; letter-spacing: 0.2em; text-transform: uppercase;">Order Receipt</p>
+            </div>
+
+            <div style="margin-bottom: 18px;">
+                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Order #:</strong> {order_number}</p>
+                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Date:</strong> {order_time}</p>
+                <p style="margin: 6px 0; font-size: 12px; color: #6b5d52;"><strong style="font-weight: 400; color: #8b7355;">Customer:</strong> {name}</p>
+            </div>
+
+            <div style="border-top: 1px solid #8b7355/20; border-bottom: 1px solid #8b7355/20; padding: 14px 0; margin: 18px 0;">{items}
+                <p style="margin: 14px 0 0 0; font-size: 14px; color: #3a3330; text-align: right;"><strong style="font-weight: 400; color: #8b7355;">TOTAL:</strong> {total}</p>
+            </div>
+
+            <div style="text-align: center; margin-top: 18px; padding-top: 18px; border-top: 1px solid #8b7355/20;">
+                <p style="margin: 10px 0; font-size: 16px; font-weight: 300; color: #8b7355; letter-spacing: 0.2em; text-transform: uppercase;">✓ Confirmed</p>
+                <p style="margin: 10px 0; font-size: 12px; color: #6b5d52;">Your order will be ready shortly</p>
+            </div>
+
+            <div style="text-align: center; margin-top: 18px; padding-top: 14px; border-top: 1px solid #8b7355/10;">
+                <p style="margin: 5px 0; font-size: 10px; color: #6b5d52/60; letter-spacing: 0.1em;">Thank you for choosing Brown Cafe</p>
+                <p style="margin: 5px 0; font-size: 10px; color: #6b5d52/60; letter-spacing: 0.1em;">Powered by Murf Falcon TTS</p>
+            </div>
+        </div>
+        """
+)
+
+
+# One line item on the receipt
+_RECEIPT_ITEM = Template(
+    """
+                <p style="margin: 10px 0; font-size: 13px; color: #3a3330;"><strong style="font-weight: 400; color: #8b7355;">ITEM:</strong> {drink}<span style="float: right;">{price}</span></p>
+                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Size: {size}</p>
+                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Milk: {milk}</p>
+                <p style="margin: 10px 0; font-size: 13px; padding-left: 20px; color: #6b5d52;">Extras: {extras}</p>"""
+)
+
+
+# Every combination of a drink (or none yet), a size (or none yet) and whipped
+# cream is one entry: (6 + 1) x (3 + 1) x 2 = 56 for today's menu. 256 leaves
+# room for menu.json to grow to about 30 drinks before cups are re-rendered, and
+# at ~2 KB per cup the cache stays around half a megabyte.
+CUP_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=CUP_CACHE_SIZE)
+def render_cup(drink_type: str | None, size: str | None, whipped_cream: bool) -> str:
+    """Cup, whipped cream and size badge for one (drink, size, whipped) combination."""
+    menu = current()
+    cup_size = menu.cups.get(size, DEFAULT_SIZE)
+    return _CUP.render(
+        width=cup_size["width"],
+        height=cup_size["height"],
+        drink_color=menu.colors.get(drink_type, DEFAULT_DRINK_COLOR),
+        whipped_cream=_WHIPPED_CREAM if whipped_cream else "",
+        size_badge=size.upper() if size else "SIZE",
+    )
+
+
+def has_whipped_cream(extras: list[str]) -> bool:
+    return any("whipped cream" in extra.lower() for extra in extras)
+
+
+def render_drink_html(order_state: dict[str, Any]) -> str:
+    """HTML visualization of an in-progress order."""
+    extras = order_state["extras"]
+    if extras:
+        extras_items = "".join(
+            f"<div style='margin: 2px 0; font-size: 12px;'>• {extra}</div>"
+            for extra in extras
+        )
+        extras_html = f'<div style="margin: 0;">{extras_items}</div>'
+    else:
+        extras_html = EMPTY_EXTRAS
+
+    return _DRINK_SHELL.render(
+        cup=render_cup(
+            order_state["drinkType"],
+            order_state["size"],
+            has_whipped_cream(extras),
+        ),
+        drink=order_state["drinkType"] or EMPTY_FIELD,
+        size=order_state["size"] or EMPTY_FIELD,
+        milk=order_state["milk"] or EMPTY_FIELD,
+        extras=extras_html,
+        name=order_state["name"] or EMPTY_FIELD,
+    )
+
+
+def render_receipt_html(
+    order_state: dict[str, Any],
+    order_number: str,
+    order_time: str,
+    total_cents: int | None = None,
+    line_cents: list[int] | None = None,
+) -> str:
+    """HTML receipt for a completed order, priced from the menu by default.
+
+    ``line_cents`` are the prices of the order's line items when it was saved.
+    """
+    menu = current()
+    items = line_items(order_state)
+    if line_cents is None:
+        line_cents = [menu.line_total(item) for item in items]
+    if total_cents is None:
+        total_cents = sum(line_cents)
+    rendered = []
+    for item, cents in zip(items, line_cents):
+        quantity = item.get("quantity") or 1
+        drink = item["drinkType"].title()
+        extras = item["extras"]
+        rendered.append(
+            _RECEIPT_ITEM.render(
+                drink=f"{quantity} x {drink}" if quantity > 1 else drink,
+                price=menu.format_price(cents),
+                size=item["size"].title(),
+                milk=item["milk"],
+                extras=", ".join(extras) if extras else "None",
+            )
+        )
+    return _RECEIPT.render(
+        order_number=order_number,
+        order_time=order_time,
+        name=order_state["name"],
+        items="".join(rendered),
+        total=menu.format_price(total_cents),
+    )
+
+
+def prewarm() -> None:
+    """Render every menu cup once so the first customer hits a warm cache."""
+    menu = current()
+    for drink_type, size, whipped_cream in itertools.product(
+        menu.colors, menu.cups, (False, True)
+    ):
+        render_cup(drink_type, size, whipped_cream)
+
+
+on_reload(lambda menu: render_cup.cache_clear())
@@ -0,0 +1,329 @@
+"""Content-addressed cache of synthesized speech for the barista's fixed phrases.
+
+Each entry is the audio for one sentence, keyed by a hash of (voice, style,
+sample rate, text) and stored as its own file under ``TTS_CACHE_DIR``::
+
+    <key[:2]>/<key>.pcm    12-byte header + 16-bit little-endian PCM
+
+Hits are read through ``mmap`` (mapped in a worker thread by ``speak``) and cut
+into 20 ms ``rtc.AudioFrame``s, so a cached sentence starts playing without a
+TTS request and without loading the whole clip into memory. Misses are
+synthesized as usual and stored on the way through. The cache is bounded by ``TTS_CACHE_MAX_MB``: entries are evicted least
+recently used first, using file mtimes to restore that order across restarts.
+
+``python src/tts_cache.py warm`` synthesizes the agent's fixed phrases ahead of
+time (needs ``MURF_API_KEY``); ``python src/tts_cache.py stats`` shows what is
+cached.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable, Iterator
+from pathlib import Path
+
+from livekit import rtc
+
+logger = logging.getLogger("agent.tts_cache")
+
+# The barista's voice; part of every cache key
+TTS_VOICE = "en-US-matthew"
+TTS_STYLE = "Conversation"
+TTS_SAMPLE_RATE = 24000
+
+_HEADER = struct.Struct("<4sBBHI")  # magic, version, channels, reserved, rate
+_MAGIC = b"TTSC"
+_VERSION = 1
+_FRAME_MS = 20
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split a reply into the sentence units that are cached independently."""
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+class CachedAudio:
+    """A cache hit: memory-mapped PCM that can be replayed as audio frames."""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, channels, _, rate = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != _VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a TTS cache entry")
+        self.num_channels = channels
+        self.sample_rate = rate
+
+    @property
+    def duration(self) -> float:
+        samples = (len(self._map) - _HEADER.size) // (2 * self.num_channels)
+        return samples / self.sample_rate
+
+    def frames(self) -> Iterator[rtc.AudioFrame]:
+        """Yield the clip as 20 ms frames, then release the mapping."""
+        samples_per_frame = self.sample_rate * _FRAME_MS // 1000
+        frame_bytes = samples_per_frame * self.num_channels * 2
+        try:
+            for start in range(_HEADER.size, len(self._map), frame_bytes):
+                with memoryview(self._map)[start : start + frame_bytes] as chunk:
+                    yield rtc.AudioFrame(
+                        chunk,
+                        self.sample_rate,
+                        self.num_channels,
+                        len(chunk) // (2 * self.num_channels),
+                    )
+        finally:
+            self._map.close()
+
+
+class TTSCache:
+    """Size-bounded, content-addressed store of synthesized sentences.
+
+    Args:
+        root: Directory holding the cache entries.
+        max_bytes: Total size of all entries before the least recently used are
+            evicted.
+
+    ``stats`` counts ``hits``, ``misses``, ``stores`` and ``evictions``; ``size``
+    is the current total in bytes. Safe to share between jobs in one process.
+    """
+
+    def __init__(
+        self, root: Path | str = "tts_cache", max_bytes: int = 64 * 1024 * 1024
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._lock = threading.Lock()
+        # key -> entry size, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> TTSCache:
+        return cls(
+            os.getenv("TTS_CACHE_DIR", "tts_cache"),
+            int(float(os.getenv("TTS_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def key(
+        text: str,
+        voice: str = TTS_VOICE,
+        style: str = TTS_STYLE,
+        sample_rate: int = TTS_SAMPLE_RATE,
+    ) -> str:
+        text = " ".join(text.split())
+        material = f"{voice}\x1f{style}\x1f{sample_rate}\x1f{text}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pcm"
+
+    def open(self) -> None:
+        """Index the entries already on disk, oldest access first."""
+        entries = []
+        if self.root.exists():
+            for path in self.root.glob("*/*.pcm"):
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+        entries.sort()
+        with self._lock:
+            self._entries = OrderedDict((key, size) for _, key, size in entries)
+            self.size = sum(self._entries.values())
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> CachedAudio | None:
+        if not self._touch(key):
+            return None
+        return self._load(key)
+
+    async def aget(self, key: str) -> CachedAudio | None:
+        """``get`` for the event loop: a hit's file is mapped in a worker thread.
+
+        A miss is answered from memory without leaving the loop.
+        """
+        if not self._touch(key):
+            return None
+        return await asyncio.to_thread(self._load, key)
+
+    def _touch(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return False
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return True
+
+    def _load(self, key: str) -> CachedAudio | None:
+        path = self._path(key)
+        try:
+            audio = CachedAudio(path)
+            os.utime(path)  # remember recency for the next open()
+        except (OSError, ValueError) as e:
+            logger.warning("Dropping unreadable TTS cache entry %s: %s", key, e)
+            self._forget(key)
+            return None
+        return audio
+
+    def put(self, key: str, frames: Iterable[rtc.AudioFrame]) -> int:
+        """Store synthesized frames under ``key``; returns the entry size."""
+        frames = list(frames)
+        if not frames:
+            return 0
+        header = _HEADER.pack(
+            _MAGIC, _VERSION, frames[0].num_channels, 0, frames[0].sample_rate
+        )
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, so concurrent stores of one key (two
+        # sessions missing the same phrase) never write into the same file
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{key}.", suffix=".tmp", delete=False
+        ) as f:
+            try:
+                f.write(header)
+                for frame in frames:
+                    f.write(frame.data.cast("B"))
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+        size = path.stat().st_size
+        with self._lock:
+            self.size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.stats["stores"] += 1
+            self._evict()
+        return size
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self.size -= self._entries.pop(key, 0)
+        with contextlib.suppress(FileNotFoundError):
+            self._path(key).unlink()
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.stats["evictions"] += 1
+            with contextlib.suppress(FileNotFoundError):
+                self._path(key).unlink()
+
+
+async def speak(
+    tts,
+    cache: TTSCache,
+    text: str,
+    *,
+    voice: str = TTS_VOICE,
+    style: str = TTS_STYLE,
+    private: Iterable[str] = (),
+) -> AsyncIterator[rtc.AudioFrame]:
+    """Audio for ``text``, sentence by sentence, from the cache or ``tts``.
+
+    Missed sentences are streamed from ``tts`` as they are synthesized and then
+    cached, unless they contain one of the ``private`` strings (customer names).
+    """
+    private = [word for word in private if word]
+    for sentence in split_sentences(text):
+        key = TTSCache.key(sentence, voice, style, tts.sample_rate)
+        cached = await cache.aget(key)
+        if cached is not None:
+            for frame in cached.frames():
+                yield frame
+            continue
+
+        frames = []
+        async with tts.synthesize(sentence) as stream:
+            async for event in stream:
+                frames.append(event.frame)
+                yield event.frame
+        if not any(word in sentence for word in private):
+            await asyncio.to_thread(cache.put, key, frames)
+
+
+def fixed_phrases() -> list[str]:
+    """Sentences the agent speaks verbatim, for ``warm``."""
+    from fast_path import reply_for
+    from menu import current
+    from order_model import Order
+
+    menu = current()
+    phrases: dict[str, None] = {}
+    for drink in menu.Drink:
+        for size in (None, *menu.Size):
+            for milk in (None, *menu.Milk):
+                order = Order()
+                order.drink, order.size, order.milk = drink, size, milk
+                for sentence in split_sentences(reply_for(order)):
+                    phrases[sentence] = None
+    return list(phrases)
+
+
+async def _warm(cache: TTSCache, phrases: list[str], concurrency: int) -> None:
+    import aiohttp
+    from livekit.plugins import murf
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as http_session:
+        tts = murf.TTS(voice=TTS_VOICE, style=TTS_STYLE, http_session=http_session)
+
+        async def synthesize(sentence: str) -> None:
+            key = TTSCache.key(sentence, sample_rate=tts.sample_rate)
+            if key in cache:
+                return
+            async with semaphore, tts.synthesize(sentence) as stream:
+                frames = [event.frame async for event in stream]
+            cache.put(key, frames)
+
+        await asyncio.gather(*(synthesize(sentence) for sentence in phrases))
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv(".env.local")
+    load_dotenv(".env")
+
+    parser = argparse.ArgumentParser(description="Manage the TTS phrase cache")
+    parser.add_argument("command", choices=["warm", "stats"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    cache = TTSCache.from_env()
+    cache.open()
+    if args.command == "warm":
+        phrases = fixed_phrases()
+        asyncio.run(_warm(cache, phrases, args.concurrency))
+        print(f"Warmed {len(phrases)} phrases")
+    print(f"{len(cache)} entries, {cache.size / 1024 / 1024:.1f} MB in {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
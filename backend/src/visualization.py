@@ -0,0 +1,229 @@
+"""Wire protocol for the live drink visualization.
+
+The agent used to render a ~6 KB HTML document on every order update and publish
+it on the ``drink_visualization`` topic. It now publishes the order state itself
+on ``drink_state`` and the frontend renders the cups from its own template.
+
+Every message is compact JSON::
+
+    {"v": 2, "seq": 7, "kind": "delta", "items": {"2": {"size": "large"}}}
+
+- ``v`` is the protocol version. Clients ignore versions they don't know.
+- ``seq`` increases by one per message within an agent session.
+- ``kind`` is ``"snapshot"`` (every field of the order and of every item) or
+  ``"delta"`` (only what changed since the previous message).
+- ``set`` holds order-level fields: ``name`` and ``lines``, the line numbers of
+  the order's items in display order. Items whose line is no longer listed
+  have been removed.
+- ``items`` maps a line number to that item's fields (``drinkType``, ``size``,
+  ``milk``, ``extras``, ``quantity``). An edit to one drink of a group order
+  sends just that item's changed fields.
+- ``menu`` holds how cups are drawn, from ``menu.json``: ``colors`` by drink,
+  ``cups`` (``width`` and ``height``) by size, and the ``default`` color and
+  cup before a drink or size is picked. It is in every snapshot, and in a delta
+  when the menu file changed.
+
+Each of these keys is left out when it has nothing to say.
+
+A client that sees a gap in ``seq`` (e.g. after reconnecting) publishes anything
+on ``drink_state_sync``; the agent then answers with a snapshot. Snapshots are
+also sent periodically so a client can never drift for long.
+
+``DRINK_VIZ_MODE`` selects what the agent publishes: ``state`` (default),
+``html`` (legacy full-HTML messages only, for old clients; they show the
+drink being ordered, not the whole cart) or ``both``.
+
+Tools don't publish directly. They mark the order dirty on an ``UpdateScheduler``,
+which sends one coalesced message per LLM turn (or per debounce window), so
+"large oat latte with an extra shot for Sam" costs one publish instead of five
+and no tool waits on the network.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from collections.abc import Awaitable
+from typing import TYPE_CHECKING, Any, Callable
+
+from templates import DEFAULT_DRINK_COLOR, DEFAULT_SIZE
+
+if TYPE_CHECKING:
+    from menu import Menu
+
+logger = logging.getLogger("agent.visualization")
+
+PROTOCOL_VERSION = 2
+
+STATE_TOPIC = "drink_state"
+SYNC_TOPIC = "drink_state_sync"
+LEGACY_HTML_TOPIC = "drink_visualization"
+
+VIZ_MODES = ("state", "html", "both")
+
+
+def visualization_mode() -> str:
+    """Publishing mode from ``DRINK_VIZ_MODE``, defaulting to ``state``."""
+    mode = os.getenv("DRINK_VIZ_MODE", "state").lower()
+    if mode not in VIZ_MODES:
+        raise ValueError(
+            f"Unknown DRINK_VIZ_MODE {mode!r}, expected one of {VIZ_MODES}"
+        )
+    return mode
+
+
+def cup_styles(menu: Menu) -> dict[str, Any]:
+    """The ``menu`` field of a message: how ``menu``'s cups are drawn."""
+    return {
+        "colors": menu.colors,
+        "cups": menu.cups,
+        "default": {"color": DEFAULT_DRINK_COLOR, "cup": DEFAULT_SIZE},
+    }
+
+
+def _copy(fields: dict[str, Any]) -> dict[str, Any]:
+    # Copy lists so later in-place mutations (extras.append) show up as changes
+    return {k: list(v) if isinstance(v, list) else v for k, v in fields.items()}
+
+
+def _diff(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+class DrinkStateEncoder:
+    """Turns successive order states into snapshot/delta messages.
+
+    Args:
+        snapshot_every: Send a full snapshot at least every N messages.
+    """
+
+    def __init__(self, snapshot_every: int = 20) -> None:
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self._last: dict[str, Any] | None = None
+        self._last_items: dict[str, dict[str, Any]] = {}
+        self._last_styles: dict[str, Any] | None = None
+        self._since_snapshot = 0
+
+    def request_snapshot(self) -> None:
+        """Make the next message a full snapshot (e.g. a client asked to resync)."""
+        self._last = None
+
+    def encode(
+        self, state: dict[str, Any], styles: dict[str, Any] | None = None
+    ) -> bytes | None:
+        """Encode ``state`` (as from ``Order.to_dict``), or None when unchanged.
+
+        ``styles`` (from ``cup_styles``) is sent with snapshots and when it
+        differs from what was last sent.
+        """
+        order = {
+            "name": state["name"],
+            "lines": [item["line"] for item in state["items"]],
+        }
+        items = {
+            str(item["line"]): _copy({k: v for k, v in item.items() if k != "line"})
+            for item in state["items"]
+        }
+
+        if self._last is None or self._since_snapshot >= self.snapshot_every:
+            kind = "snapshot"
+            changed, changed_items, changed_styles = order, items, styles
+            self._since_snapshot = 0
+        else:
+            changed = _diff(self._last, order)
+            changed_items = {}
+            for line, fields in items.items():
+                diff = _diff(self._last_items.get(line, {}), fields)
+                if diff:
+                    changed_items[line] = diff
+            changed_styles = styles if styles != self._last_styles else None
+            if not changed and not changed_items and not changed_styles:
+                return None
+            kind = "delta"
+            self._since_snapshot += 1
+
+        # Removed items are forgotten, like on the client
+        self._last, self._last_items = order, items
+        if styles is not None:
+            self._last_styles = styles
+        self.seq += 1
+        message: dict[str, Any] = {"v": PROTOCOL_VERSION, "seq": self.seq, "kind": kind}
+        if changed:
+            message["set"] = changed
+        if changed_items:
+            message["items"] = changed_items
+        if changed_styles:
+            message["menu"] = changed_styles
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+
+
+class UpdateScheduler:
+    """Coalesces order updates into a single publish.
+
+    ``mark_dirty`` never blocks: it schedules ``publish`` to run after at most
+    ``debounce`` seconds, and any further updates in the meantime ride along with
+    that same publish. ``flush_soon`` skips the rest of the window (called at the
+    end of an LLM turn), and ``drain`` waits until nothing is pending.
+
+    ``stats`` counts ``requested`` updates, actual ``published`` flushes and the
+    ``suppressed`` updates that were folded into another flush.
+    """
+
+    def __init__(
+        self, publish: Callable[[], Awaitable[None]], debounce: float = 0.15
+    ) -> None:
+        self.debounce = debounce
+        self.stats = {"requested": 0, "published": 0, "suppressed": 0}
+
+        self._publish = publish
+        self._dirty = False
+        self._kick = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> bool:
+        return self._dirty
+
+    def mark_dirty(self) -> None:
+        """Record an order change; publishing happens in the background."""
+        self.stats["requested"] += 1
+        if self._dirty:
+            self.stats["suppressed"] += 1
+            return
+
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._kick.clear()
+            self._task = asyncio.create_task(self._run())
+
+    def flush_soon(self) -> None:
+        """Publish pending changes now instead of waiting out the debounce window."""
+        self._kick.set()
+
+    async def drain(self) -> None:
+        """Publish anything pending and wait for it to go out."""
+        if self._task is not None and not self._task.done():
+            self.flush_soon()
+            await asyncio.shield(self._task)
+
+    async def aclose(self) -> None:
+        await self.drain()
+
+    async def _run(self) -> None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._kick.wait(), self.debounce)
+
+        # Changes made while a publish is in flight trigger one more round
+        while self._dirty:
+            self._dirty = False
+            self.stats["published"] += 1
+            try:
+                await self._publish()
+            except Exception as e:
+                logger.error("Failed to publish order update: %s", e)
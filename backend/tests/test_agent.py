@@ -1,7 +1,10 @@
+import asyncio
+
 import pytest
 from livekit.agents import AgentSession, inference, llm
 
 from agent import Assistant
+from order_store import OrderStore
 
 
 def _llm() -> llm.LLM:
@@ -108,3 +111,39 @@ async def test_refuses_harmful_request() -> None:
 
         # Ensures there are no function calls or other unexpected events
         result.expect.no_more_events()
+
+
+class _SlowStore(OrderStore):
+    """Keeps appends in memory, each one waiting until ``release`` is set."""
+
+    def __init__(self) -> None:
+        self.orders: list[dict] = []
+        self.release = asyncio.Event()
+
+    async def append(self, order: dict) -> None:
+        await self.release.wait()
+        self.orders.append(order)
+
+    def iter_orders(self):
+        return iter(self.orders)
+
+
+async def test_cancelled_save_is_not_saved_twice() -> None:
+    store = _SlowStore()
+    assistant = Assistant(order_store=store)
+    order = assistant.order
+    order.set_drink("latte")
+    order.set_size("medium")
+    order.set_milk("oat milk")
+    order.set_name("Alex")
+
+    first = asyncio.create_task(assistant.save_order(None))
+    while not assistant._saving:
+        await asyncio.sleep(0)
+    first.cancel()
+    second = asyncio.create_task(assistant.save_order(None))
+    await asyncio.sleep(0)
+    store.release.set()
+
+    assert "Order saved successfully" in await second
+    assert len(store.orders) == 1
@@ -0,0 +1,68 @@
+from livekit.agents import llm
+
+from context_window import ContextWindow, order_line
+from order_model import Order
+
+
+def _conversation(turns: int) -> llm.ChatContext:
+    ctx = llm.ChatContext()
+    ctx.add_message(role="system", content="You are a barista.")
+    for i in range(turns):
+        ctx.add_message(role="user", content=f"turn {i}")
+        ctx.add_message(role="assistant", content=f"reply {i}")
+    return ctx
+
+
+def _texts(ctx: llm.ChatContext) -> list[str]:
+    return [item.text_content for item in ctx.items]
+
+
+def test_order_line_is_compact() -> None:
+    order = Order()
+    order.set_drink("latte")
+    order.add_extra("extra shot")
+
+    assert order_line(order) == (
+        "[Order: drink=latte size=? milk=? extras=extra shot name=?"
+        " | need: size, milk preference, name]"
+    )
+
+
+def test_customer_messages_keep_their_first_order_line() -> None:
+    window = ContextWindow()
+    order = Order()
+    ctx = _conversation(1)
+
+    first, _ = window.prepare(ctx, order)
+    order.set_drink("mocha")
+    ctx.add_message(role="user", content="large please")
+    second, _ = window.prepare(ctx, order)
+
+    # Everything sent before is resent unchanged, so cached prefixes still match
+    assert _texts(second)[: len(first.items)] == _texts(first)
+    assert _texts(second)[-1].startswith("[Order: drink=mocha")
+    assert _texts(ctx)[1] == "turn 0"  # the session's history is untouched
+
+
+def test_old_turns_are_cut_in_steps() -> None:
+    window = ContextWindow(max_turns=4, keep_turns=2)
+    ctx = _conversation(4)
+
+    prepared, stats = window.prepare(ctx, Order())
+    assert stats["dropped"] == 0
+
+    ctx.add_message(role="user", content="turn 4")
+    prepared, stats = window.prepare(ctx, Order())
+    assert stats["dropped"] == 6
+    assert [t.split("\n")[-1] for t in _texts(prepared)] == [
+        "You are a barista.",
+        "turn 3",
+        "reply 3",
+        "turn 4",
+    ]
+
+    # The cut stays put until max_turns accumulate again
+    ctx.add_message(role="assistant", content="reply 4")
+    ctx.add_message(role="user", content="turn 5")
+    prepared, stats = window.prepare(ctx, Order())
+    assert _texts(prepared)[1].endswith("turn 3")
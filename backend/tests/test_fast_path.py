@@ -0,0 +1,97 @@
+import pytest
+
+from fast_path import FastPath, get_extractor
+from order_model import Drink, Extra, Milk, Order, Size
+
+
+def test_full_order_in_one_turn() -> None:
+    result = get_extractor().extract(
+        "Hi, can I get a large oat milk latte with an extra shot? My name is Sam."
+    )
+
+    assert result.hit
+    assert (result.drink, result.size, result.milk) == (
+        Drink.LATTE,
+        Size.LARGE,
+        Milk.OAT,
+    )
+    assert result.extras == [Extra.EXTRA_SHOT]
+    assert result.name == "Sam"
+
+
+def test_longest_alias_wins() -> None:
+    result = get_extractor().extract("extra large cold brew")
+    assert (result.drink, result.size) == (Drink.COLD_BREW, Size.LARGE)
+
+
+@pytest.mark.parametrize(
+    ("transcript", "reason"),
+    [
+        ("a latte but no whipped cream", "unknown_words"),
+        ("which milk goes with a latte", "question"),
+        ("do you have oat milk", "question"),
+        ("you have oat milk?", "question"),
+        ("two lattes", "no_match"),
+        ("a latte and a mocha", "conflict"),
+        ("yes that's all", "no_match"),
+        ("", "empty"),
+    ],
+)
+def test_unresolvable_turns_fall_through(transcript: str, reason: str) -> None:
+    assert get_extractor().extract(transcript).miss == reason
+
+
+@pytest.mark.parametrize(
+    ("transcript", "name"),
+    [
+        ("medium latte, my name is Sam", "Sam"),
+        ("a mocha, name's Priya", "Priya"),
+        ("call me Jo, large latte", "Jo"),
+        ("a large latte, it's for Sam", "Sam"),
+        ("a latte for two", None),
+        ("a large latte for later", None),
+        ("a large latte for takeaway", None),
+        ("a mocha for pickup", None),
+        ("a latte under Sam", None),
+        ("a large latte, it's for later", None),
+        ("my name is two", None),
+        ("it's for Sam, a large latte", None),
+    ],
+)
+def test_name_only_from_explicit_phrases(transcript: str, name: str | None) -> None:
+    result = get_extractor().extract(transcript)
+    assert result.name == name
+    if name is None:
+        assert not result.hit
+
+
+def test_hit_updates_order_and_asks_next_question() -> None:
+    fast_path = FastPath("fast")
+    order = Order()
+
+    reply = fast_path.handle("medium mocha please", order)
+
+    assert order.drink is Drink.MOCHA and order.size is Size.MEDIUM
+    assert reply.startswith("Got it, a medium mocha.")
+    assert "milk" in reply
+    assert fast_path.handle("hmm let me think", order) is None
+    assert fast_path.stats["hits"] == 1
+    assert fast_path.stats["miss_no_match"] == 1
+    assert fast_path.hit_rate == 0.5
+
+
+def test_llm_arm_only_counts(monkeypatch) -> None:
+    monkeypatch.setenv("FAST_PATH", "ab")
+    arms = {FastPath.for_customer("kiosk", f"customer-{i}").arm for i in range(20)}
+    assert arms == {"fast", "llm"}
+
+    fast_path = FastPath("llm")
+    order = Order()
+    assert fast_path.handle("large latte", order) is None
+    assert order.drink is None
+    assert fast_path.stats["hits"] == 1
+
+
+def test_disabled_by_default(monkeypatch) -> None:
+    monkeypatch.delenv("FAST_PATH", raising=False)
+    assert FastPath.for_customer("kiosk", None) is None
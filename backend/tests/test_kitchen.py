@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from kitchen import FileSink, KitchenQueue, KitchenSink, UnixSocketSink, listen
+
+
+def _order(i: int) -> dict:
+    return {"orderId": f"id{i}", "drinkType": "latte", "size": "large", "name": f"g{i}"}
+
+
+class _RecordingSink(KitchenSink):
+    def __init__(self, fail_first: int = 0, delay: float = 0.0) -> None:
+        self.batches = []
+        self.fail_first = fail_first
+        self.delay = delay
+
+    async def send(self, batch) -> None:
+        await asyncio.sleep(self.delay)
+        if self.fail_first:
+            self.fail_first -= 1
+            raise ConnectionRefusedError("display offline")
+        self.batches.append([order["orderId"] for order in batch])
+
+
+async def test_burst_is_batched() -> None:
+    sink = _RecordingSink()
+    queue = KitchenQueue(sink, batch=8, linger=0.02)
+
+    for i in range(10):
+        queue.submit(_order(i))
+    await queue.aclose()
+
+    assert sink.batches == [[f"id{i}" for i in range(8)], ["id8", "id9"]]
+    assert queue.stats["sent"] == 10 and queue.stats["batches"] == 2
+
+
+async def test_slow_sink_drops_oldest_without_blocking() -> None:
+    sink = _RecordingSink(delay=0.2)
+    queue = KitchenQueue(sink, maxsize=4, batch=2, linger=0)
+
+    started = asyncio.get_running_loop().time()
+    for i in range(10):
+        queue.submit(_order(i))
+        await asyncio.sleep(0)
+    assert asyncio.get_running_loop().time() - started < 0.05
+    assert len(queue) == 4
+
+    await queue.aclose(timeout=1.0)
+    assert queue.stats["dropped"] == 6
+    assert sink.batches[-1] == ["id8", "id9"]
+
+
+async def test_failed_batches_are_retried() -> None:
+    sink = _RecordingSink(fail_first=2)
+    queue = KitchenQueue(sink, linger=0, retry_delay=0.01)
+
+    queue.submit(_order(1))
+    await queue.aclose()
+
+    assert sink.batches == [["id1"]]
+    assert queue.stats["failed"] == 2
+
+
+async def test_sink_bug_drops_the_batch_and_keeps_sending() -> None:
+    class _BrokenSink(_RecordingSink):
+        async def send(self, batch) -> None:
+            if batch[0]["orderId"] == "id1":
+                raise KeyError("milk")
+            await super().send(batch)
+
+    sink = _BrokenSink()
+    queue = KitchenQueue(sink, batch=1, linger=0)
+
+    queue.submit(_order(1))
+    await asyncio.sleep(0.01)
+    queue.submit(_order(2))
+    await queue.aclose()
+
+    assert sink.batches == [["id2"]]
+    assert queue.stats["dropped"] == 1 and queue.stats["sent"] == 1
+
+
+async def test_unix_socket_and_file_sinks(tmp_path, capsys) -> None:
+    path = str(tmp_path / "kitchen.sock")
+    server = asyncio.create_task(listen(path))
+    await asyncio.sleep(0.05)
+
+    queue = KitchenQueue(UnixSocketSink(path), linger=0)
+    queue.submit(_order(1))
+    await queue.aclose()
+    await asyncio.sleep(0.05)
+    server.cancel()
+    assert "#id1  g1" in capsys.readouterr().out
+
+    sink = FileSink(tmp_path / "tickets.jsonl")
+    await sink.send([_order(2), _order(3)])
+    lines = (tmp_path / "tickets.jsonl").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["g2", "g3"]
@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+
+import pytest
+
+from menu import DEFAULT_MENU_PATH, Menu, MenuSource, load
+
+
+def _data() -> dict:
+    return json.loads(DEFAULT_MENU_PATH.read_text())
+
+
+def _write(path, data: dict, mtime_ns: int) -> None:
+    path.write_text(json.dumps(data))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_catalog_lookups_and_prices() -> None:
+    menu = load(DEFAULT_MENU_PATH)
+
+    assert menu.milks.parse("oatmilk") is menu.Milk.OAT
+    assert menu.Drink.COLD_BREW == "cold brew"
+    assert menu.colors["latte"] == "#D4A574"
+    assert menu.cups["large"] == {"width": "80px", "height": "110px"}
+
+    item = {
+        "drinkType": "latte",
+        "size": "large",
+        "milk": "oat milk",
+        "extras": ["extra shot"],
+        "quantity": 2,
+    }
+    assert menu.format_price(menu.line_total(item)) == "$13.20"
+    assert "latte $4.25" in menu.text
+    assert "oat milk (+$0.60)" in menu.text
+    assert load(DEFAULT_MENU_PATH).text == menu.text
+
+
+def test_invalid_catalogs_are_rejected() -> None:
+    data = _data()
+    data["drinks"]["latte"]["price"] = -1
+    with pytest.raises(ValueError, match="price"):
+        Menu(data)
+
+    data = _data()
+    del data["sizes"]["small"]["cup"]
+    with pytest.raises(ValueError, match="cup"):
+        Menu(data)
+
+
+def test_source_reloads_changed_file(tmp_path, caplog) -> None:
+    path = tmp_path / "menu.json"
+    data = _data()
+    _write(path, data, 1_000_000_000)
+    reloaded = []
+    source = MenuSource(path, reload_seconds=0, listeners=[reloaded.append])
+
+    first = source.current()
+    assert source.current() is first
+
+    data["drinks"]["chai latte"] = {
+        "price": 4.0,
+        "color": "#C8A27A",
+        "aliases": ["chai"],
+    }
+    _write(path, data, 2_000_000_000)
+    second = source.check()
+    assert second.drinks.parse("chai") is second.Drink.CHAI_LATTE
+    assert reloaded == [second]
+    # Members from before the reload still match the new menu
+    assert first.Drink.LATTE == second.Drink.LATTE
+
+    path.write_text("{not json")
+    with caplog.at_level(logging.ERROR, logger="agent.menu"):
+        assert source.check() is second
+    assert "Keeping menu" in caplog.text
+
+
+def test_watcher_reloads_in_the_background(tmp_path) -> None:
+    path = tmp_path / "menu.json"
+    data = _data()
+    _write(path, data, 1_000_000_000)
+    reloaded = threading.Event()
+    source = MenuSource(path, reload_seconds=0.01, listeners=[lambda m: reloaded.set()])
+    try:
+        first = source.current()
+        data["drinks"]["chai latte"] = {"price": 4.0, "color": "#C8A27A"}
+        _write(path, data, 2_000_000_000)
+
+        assert reloaded.wait(5)
+        assert source.current() is not first
+        assert "chai latte" in source.current().prices["drink"]
+    finally:
+        source.close()
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from order_ids import ID_LENGTH, OrderIdGenerator, created_at
+from order_store import JsonFileOrderStore, OrderStore
+
+
+def test_ids_are_sortable_and_strictly_increasing() -> None:
+    generator = OrderIdGenerator()
+    now = 1_763_900_000.0
+
+    same_ms = [generator.new(now) for _ in range(1000)]
+    clock_stepped_back = generator.new(now - 5)
+    later = generator.new(now + 1)
+
+    ids = [*same_ms, clock_stepped_back, later]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(len(order_id) == ID_LENGTH for order_id in ids)
+    assert created_at(later) == datetime.fromtimestamp(now + 1)
+
+
+def test_created_at_rejects_other_strings() -> None:
+    with pytest.raises(ValueError):
+        created_at("20251123144638")
+
+
+class _CountingStore(OrderStore):
+    def __init__(self) -> None:
+        self.orders = []
+
+    async def append(self, order) -> None:
+        await asyncio.sleep(0.01)
+        self.orders.append(order)
+
+
+async def _assistant(store):
+    from agent import Assistant
+
+    assistant = Assistant(order_store=store)
+    for tool, value in (
+        (assistant.update_drink_type, "latte"),
+        (assistant.update_size, "large"),
+        (assistant.update_milk, "oat milk"),
+        (assistant.update_name, "Sam"),
+    ):
+        await tool(None, value)
+    return assistant
+
+
+async def test_duplicate_save_order_calls_write_once() -> None:
+    store = _CountingStore()
+    assistant = await _assistant(store)
+
+    results = await asyncio.gather(*(assistant.save_order(None) for _ in range(3)))
+    again = await assistant.save_order(None)
+
+    assert len(store.orders) == 1
+    assert len(set(results)) == 1 and results[0].startswith("Order saved")
+    order_id = store.orders[0]["orderId"]
+    assert assistant.order_session.saved_order_id == order_id
+    assert order_id in again
+    assert store.orders[0]["timestamp"] == created_at(order_id).isoformat()
+
+
+async def test_json_file_store_never_overwrites_an_order_id(tmp_path) -> None:
+    store = JsonFileOrderStore(tmp_path)
+    order = {"orderId": "01KAQ6W4D0ZZZZZZZZZZZZZZZZ", "name": "Sam"}
+
+    await store.append(order)
+    await store.append({**order, "name": "Alex"})
+
+    assert [p.name for p in tmp_path.iterdir()] == [f"order_{order['orderId']}.json"]
+    assert [o["name"] for o in store.iter_orders()] == ["Sam"]
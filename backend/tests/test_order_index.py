@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from order_index import OrderIndex, rebuild
+from order_store import JsonlOrderStore
+
+
+def _order(name, drink="latte", milk="oat milk", extras=(), at="2025-11-23T08:15:00"):
+    return {
+        "drinkType": drink,
+        "size": "large",
+        "milk": milk,
+        "extras": list(extras),
+        "name": name,
+        "timestamp": at,
+        "status": "completed",
+    }
+
+
+def _orders() -> list[dict]:
+    return [
+        _order("Alex", extras=["extra shot"]),
+        _order("Sam", milk="Oat", at="2025-11-23T09:05:00"),
+        _order("Jo", drink="mocha", milk="almond", at="2025-11-23T09:30:00"),
+        _order("Priya", at="2025-11-24T08:00:00"),
+    ]
+
+
+def test_counts_and_groups_with_canonical_values(tmp_path) -> None:
+    index = OrderIndex(tmp_path)
+    assert index.add(_orders()) == 4
+
+    day = "2025-11-23"
+    assert index.count(day, day) == 3
+    assert index.count(day, day, drink="latte", milk="oat") == 2
+    assert index.count(day, day, drink="Latte", hour=9) == 1
+    assert index.count(extra="shot") == 1
+    assert index.group_by("drink") == {"latte": 3, "mocha": 1}
+    assert index.group_by("hour", day, day, drink="latte") == {"8": 1, "9": 1}
+    assert [o["name"] for o in index.query(day, day, milk="oat milk")] == [
+        "Alex",
+        "Sam",
+    ]
+
+
+def test_seal_keeps_results_and_later_rows(tmp_path) -> None:
+    index = OrderIndex(tmp_path)
+    index.add(_orders())
+
+    assert index.seal(before="2025-11-24") == ["2025-11-23"]
+    assert not (tmp_path / "2025-11-23.log").exists()
+    # A late write for a sealed day lands in a new log on top of the segment
+    index.add([_order("Lee", at="2025-11-23T23:59:59")])
+
+    reopened = OrderIndex(tmp_path)
+    assert reopened.count("2025-11-23", "2025-11-23", drink="latte") == 3
+    assert [o["name"] for o in reopened.query("2025-11-23", "2025-11-23")][-1] == "Lee"
+
+
+@pytest.mark.asyncio
+async def test_store_updates_index_after_commit(tmp_path) -> None:
+    index = OrderIndex(tmp_path / "index")
+    store = JsonlOrderStore(tmp_path / "segments", fsync=False, index=index)
+    try:
+        for order in _orders():
+            await store.append(order)
+    finally:
+        await store.aclose()
+
+    assert index.count(drink="latte", milk="oat milk") == 3
+
+
+@pytest.mark.asyncio
+async def test_rebuild_scans_segments_and_unmigrated_files(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path / "segments", fsync=False)
+    try:
+        await store.append(_orders()[0])
+        await store.append({**_orders()[1], "legacyFile": "order_b.json"})
+    finally:
+        await store.aclose()
+    (tmp_path / "order_b.json").write_text(json.dumps(_orders()[1]))
+    (tmp_path / "order_c.json").write_text(json.dumps(_orders()[2]))
+
+    index = OrderIndex(tmp_path / "index")
+    index.add([_order("stale")])
+
+    assert rebuild(index, tmp_path, workers=2) == 3
+    assert index.days() == ["2025-11-23"]
+    assert index.group_by("drink") == {"latte": 2, "mocha": 1}
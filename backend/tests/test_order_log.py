@@ -0,0 +1,100 @@
+import os
+import time
+
+from order_log import OrderLog
+from sessions import OrderSession
+
+
+def _session() -> OrderSession:
+    return OrderSession("room-1", "customer-1")
+
+
+def _build(log: OrderLog, session: OrderSession) -> None:
+    order = session.order
+    steps = [
+        ("set_drink", order.set_drink("latte").value, 0),
+        ("set_size", order.set_size("large").value, 0),
+        ("add_drink", order.add_drink("mocha", 2).drink.value, 2),
+        ("add_extra", order.add_extra("whip").value, 0),
+        ("set_milk", order.set_milk("oat", 1).value, 1),
+        ("set_name", order.set_name("Sam")),
+    ]
+    for op, *args in steps:
+        log.record(session, op, *args)
+
+
+async def test_restore_replays_the_order(tmp_path) -> None:
+    log = OrderLog(tmp_path)
+    session = _session()
+    _build(log, session)
+    await log.flush()
+
+    restored = _session()
+    assert await OrderLog(tmp_path).restore(restored)
+    assert restored.order.to_dict() == session.order.to_dict()
+    # Tools without an item number keep editing the same drink
+    assert restored.order.item().line == session.order.item().line
+
+    log.clear(session)
+    await log.aclose()
+    assert not await OrderLog(tmp_path).restore(_session())
+
+
+async def test_log_is_compacted_to_a_snapshot(tmp_path) -> None:
+    log = OrderLog(tmp_path, compact_every=4)
+    session = _session()
+    _build(log, session)
+    session.order_id = "01JD5Q3Z8X0000000000000000"
+    for size in ("small", "medium", "large"):
+        log.record(session, "set_size", session.order.set_size(size).value, 0)
+    await log.aclose()
+
+    path = log.path(session.room, session.identity)
+    assert len(path.read_bytes().splitlines()) < 4
+    assert log.stats["compactions"] == 2
+
+    restored = _session()
+    assert await OrderLog(tmp_path).restore(restored)
+    assert restored.order.to_dict() == session.order.to_dict()
+    assert restored.order_id == session.order_id
+
+
+async def test_torn_and_stale_logs(tmp_path) -> None:
+    log = OrderLog(tmp_path, max_age=60)
+    session = _session()
+    _build(log, session)
+    await log.aclose()
+
+    path = log.path(session.room, session.identity)
+    with open(path, "ab") as f:
+        f.write(b'{"op": "set_size", "ar')
+    restored = _session()
+    assert await log.restore(restored)
+    assert restored.order.to_dict() == session.order.to_dict()
+
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+    assert not await log.restore(_session())
+    pruned = OrderLog(tmp_path, max_age=60)
+    pruned.open()
+    await pruned.aclose()
+    assert not path.exists()
+
+
+async def test_single_session_orders_belong_to_the_customer(tmp_path) -> None:
+    log = OrderLog(tmp_path)
+    session = OrderSession("room-1")
+    log.record(session, "set_drink", session.order.set_drink("latte").value, 0)
+    await log.flush()
+    assert not list(tmp_path.glob("*.jsonl"))
+
+    session.customer = "sam"
+    _build(log, session)
+    await log.aclose()
+
+    stranger = OrderSession("room-1")
+    stranger.customer = "alex"
+    assert not await OrderLog(tmp_path).restore(stranger)
+    returning = OrderSession("room-1")
+    returning.customer = "sam"
+    assert await OrderLog(tmp_path).restore(returning)
@@ -0,0 +1,169 @@
+import pytest
+
+from order_model import (
+    DRINKS,
+    MILKS,
+    SIZES,
+    CartError,
+    Drink,
+    Extra,
+    MenuError,
+    Milk,
+    Order,
+    Size,
+    order_total,
+)
+
+
+@pytest.mark.parametrize("text", ["Oat Milk", "oat milk", "oatmilk", "OAT", "oak milk"])
+def test_milk_spellings_normalize(text: str) -> None:
+    assert MILKS.parse(text) is Milk.OAT
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Cold-Brew", Drink.COLD_BREW),
+        ("capuccino", Drink.CAPPUCCINO),
+        ("expresso", Drink.ESPRESSO),
+        ("a latte please", Drink.LATTE),
+    ],
+)
+def test_drink_aliases_and_stt_errors(text: str, expected: Drink) -> None:
+    assert DRINKS.parse(text) is expected
+
+
+def test_unknown_value_lists_options() -> None:
+    with pytest.raises(MenuError) as excinfo:
+        DRINKS.parse("chai")
+
+    assert "cappuccino" in str(excinfo.value)
+    assert SIZES.resolve("gigantic") is None
+
+
+def test_extras_are_an_ordered_set() -> None:
+    order = Order()
+    order.add_extra("whipped cream")
+    order.add_extra("Extra Shot")
+    order.add_extra("whip")
+
+    assert list(order.extras) == [Extra.WHIPPED_CREAM, Extra.EXTRA_SHOT]
+
+
+def test_round_trip_and_completeness() -> None:
+    order = Order()
+    order.set_drink("Latte")
+    order.set_size("venti")
+    assert order.missing() == ["milk preference", "name"]
+
+    order.set_milk("no milk")
+    order.set_name("  Sam ")
+    assert order.is_complete()
+
+    data = order.to_dict()
+    assert data == {
+        "items": [
+            {
+                "line": 1,
+                "drinkType": "latte",
+                "size": "large",
+                "milk": "no milk",
+                "extras": [],
+                "quantity": 1,
+            }
+        ],
+        "name": "Sam",
+    }
+    restored = Order.from_dict(data)
+    assert restored.size is Size.LARGE
+    assert restored.to_dict() == data
+
+
+def test_orders_saved_before_carts_load_as_one_item() -> None:
+    legacy = {
+        "drinkType": "mocha",
+        "size": "small",
+        "milk": "oat milk",
+        "extras": ["whipped cream"],
+        "name": "Sam",
+    }
+    order = Order.from_dict(legacy)
+
+    assert [item.drink for item in order.items] == [Drink.MOCHA]
+    assert list(order.extras) == [Extra.WHIPPED_CREAM]
+    assert order_total(legacy) == order_total(order.to_dict()) == 475 + 60 + 50
+
+
+def test_cart_items_are_edited_by_number() -> None:
+    order = Order()
+    order.set_size("large")  # before any drink is named
+    order.add_drink("latte", quantity=2)
+    order.add_drink("mocha")
+    order.set_size("small")
+    order.set_milk("oat", number=1)
+    order.set_name("Sam")
+
+    assert [(i.line, i.drink, i.size, i.quantity) for i in order.items] == [
+        (1, Drink.LATTE, Size.LARGE, 2),
+        (2, Drink.MOCHA, Size.SMALL, 1),
+    ]
+    assert order.missing() == ["milk preference for item 2"]
+
+    with pytest.raises(CartError):
+        order.set_size("small", number=3)
+    with pytest.raises(CartError):
+        order.set_quantity(0)
+    # A failed edit leaves the current item alone, as replaying the log does
+    order.item(2)
+    with pytest.raises(CartError):
+        order.remove_extra("whipped cream", number=1)
+    assert order.item().line == 2
+
+    order.remove_item(1)
+    order.add_drink("espresso")
+    # Line numbers are never reused, positions close up
+    assert [(order.number(i), i.line) for i in order.items] == [(1, 2), (2, 3)]
+
+
+async def test_tools_store_canonical_values() -> None:
+    from agent import Assistant
+
+    assistant = Assistant()
+    assert await assistant.update_milk(None, "Oat Milk") == "Noted, oat milk."
+    assert "Options are" in await assistant.update_drink_type(None, "chai")
+    assert assistant.order.drink is None
+    await assistant.viz_scheduler.aclose()
+
+
+async def test_group_order_is_saved_once_with_a_total() -> None:
+    from agent import Assistant
+    from order_store import OrderStore
+
+    class _Store(OrderStore):
+        def __init__(self) -> None:
+            self.orders = []
+
+        async def append(self, order) -> None:
+            self.orders.append(order)
+
+    store = _Store()
+    assistant = Assistant(order_store=store)
+    assert await assistant.add_item(None, "latte", 2) == "Added item 1: 2 latte."
+    assert await assistant.add_item(None, "mocha") == "Added item 2: 1 mocha."
+    await assistant.update_size(None, "small")
+    await assistant.update_milk(None, "no milk")
+    await assistant.update_size(None, "large", item=1)
+    await assistant.update_milk(None, "oat", item=1)
+    assert "no item 3" in await assistant.remove_item(None, 3)
+    await assistant.update_name(None, "Sam")
+
+    result = await assistant.save_order(None)
+
+    (saved,) = store.orders
+    assert [(i["drinkType"], i["quantity"]) for i in saved["items"]] == [
+        ("latte", 2),
+        ("mocha", 1),
+    ]
+    assert saved["totalCents"] == 2 * (425 + 100 + 60) + 475
+    assert "$16.45" in result
+    await assistant.viz_scheduler.aclose()
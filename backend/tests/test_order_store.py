@@ -0,0 +1,176 @@
+import asyncio
+import errno
+import json
+
+import pytest
+
+from order_store import JsonFileOrderStore, JsonlOrderStore, import_legacy_orders
+
+
+def _order(name: str) -> dict:
+    return {
+        "drinkType": "latte",
+        "size": "medium",
+        "milk": "oat milk",
+        "extras": ["extra shot"],
+        "name": name,
+        "timestamp": "2025-11-23T14:46:38.123456",
+        "status": "completed",
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_share_fsyncs(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, max_batch=16, flush_interval=0.05)
+    store.open()
+    try:
+        await asyncio.gather(*(store.append(_order(f"guest{i}")) for i in range(40)))
+    finally:
+        await store.aclose()
+
+    orders = list(store.iter_orders())
+    assert [o["name"] for o in orders] == [f"guest{i}" for i in range(40)]
+    assert store.stats["appended"] == 40
+    assert store.stats["fsyncs"] < 40
+
+
+@pytest.mark.asyncio
+async def test_segments_rotate(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, max_batch=1, max_segment_bytes=200, fsync=False)
+    try:
+        for i in range(5):
+            await store.append(_order(f"guest{i}"))
+    finally:
+        await store.aclose()
+
+    assert len(store.segments()) > 1
+    assert len(list(store.iter_orders())) == 5
+
+
+@pytest.mark.asyncio
+async def test_recover_truncates_torn_tail(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, fsync=False)
+    try:
+        await store.append(_order("Alex"))
+    finally:
+        await store.aclose()
+
+    segment = store.segments()[-1]
+    with open(segment, "ab") as f:
+        f.write(b'{"drinkType": "mo')
+
+    reopened = JsonlOrderStore(tmp_path, fsync=False)
+    try:
+        await reopened.append(_order("Sam"))
+    finally:
+        await reopened.aclose()
+
+    assert reopened.stats["recovered_bytes"] == len(b'{"drinkType": "mo')
+    assert [o["name"] for o in reopened.iter_orders()] == ["Alex", "Sam"]
+
+
+async def test_live_segment_is_not_recovered_by_another_store(tmp_path) -> None:
+    first = JsonlOrderStore(tmp_path, fsync=False)
+    second = JsonlOrderStore(tmp_path, fsync=False)
+    try:
+        await first.append(_order("Alex"))
+        live = first.segments()[-1]
+        # A batch the first store is still writing looks like a torn tail
+        with open(live, "ab") as f:
+            f.write(b'{"drinkType": "mo')
+
+        await second.append(_order("Sam"))
+        assert second.recover() == 0
+        assert live.read_bytes().endswith(b'{"drinkType": "mo')
+        assert len(second.segments()) == 2
+    finally:
+        await first.aclose()
+        await second.aclose()
+
+
+async def test_repeated_order_id_is_written_once(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, fsync=False)
+    order = {**_order("Alex"), "orderId": "01JD0000000000000000000000"}
+    try:
+        await asyncio.gather(store.append(order), store.append(order))
+        await store.append(order)
+    finally:
+        await store.aclose()
+
+    assert [o["name"] for o in store.iter_orders()] == ["Alex"]
+
+
+class _FullDisk:
+    """A segment file whose next write stops halfway with ENOSPC."""
+
+    def __init__(self, file) -> None:
+        self._file = file
+        self.full = True
+
+    def write(self, data: bytes) -> int:
+        if not self.full:
+            return self._file.write(data)
+        self.full = False
+        self._file.write(data[: len(data) // 2])
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_cut_off(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, fsync=False)
+    try:
+        await store.append(_order("Alex"))
+        store._file = _FullDisk(store._file)
+        with pytest.raises(OSError):
+            await store.append(_order("Sam"))
+        await store.append(_order("Kim"))
+    finally:
+        await store.aclose()
+
+    assert [o["name"] for o in store.iter_orders()] == ["Alex", "Kim"]
+    assert store.recover() == 0
+    assert store.stats["appended"] == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_a_failed_reopen(tmp_path, monkeypatch) -> None:
+    store = JsonlOrderStore(tmp_path, fsync=False)
+    store.open()
+    reopen = store._open_segment
+
+    def fail_once() -> None:
+        monkeypatch.setattr(store, "_open_segment", reopen)
+        raise PermissionError("segment not writable")
+
+    try:
+        # e.g. the segment was closed after a rotation or a failed write
+        store._close_segment()
+        monkeypatch.setattr(store, "_open_segment", fail_once)
+        with pytest.raises(PermissionError):
+            await store.append(_order("Sam"))
+        await store.append(_order("Kim"))
+    finally:
+        await store.aclose()
+
+    assert [o["name"] for o in store.iter_orders()] == ["Kim"]
+
+
+@pytest.mark.asyncio
+async def test_import_legacy_orders_is_idempotent(tmp_path) -> None:
+    legacy = JsonFileOrderStore(tmp_path)
+    await legacy.append(_order("Alex"))
+    (tmp_path / "order_20251123_150000_Sam.json").write_text(json.dumps(_order("Sam")))
+
+    store = JsonlOrderStore(tmp_path / "segments", fsync=False)
+    try:
+        assert await import_legacy_orders(store, tmp_path) == 2
+        assert await import_legacy_orders(store, tmp_path) == 0
+    finally:
+        await store.aclose()
+
+    orders = list(store.iter_orders())
+    assert sorted(o["name"] for o in orders) == ["Alex", "Sam"]
+    assert all(o["legacyFile"].startswith("order_") for o in orders)
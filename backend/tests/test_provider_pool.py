@@ -0,0 +1,65 @@
+import socket
+
+import pytest
+from aiohttp import web
+
+from provider_pool import Endpoint, ProviderPool
+
+
+@pytest.fixture
+async def provider():
+    async def ok(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_route("*", "/", ok)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/"
+    finally:
+        await runner.cleanup()
+
+
+def _closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def test_requests_reuse_warm_connections(provider) -> None:
+    pool = ProviderPool({"stt": Endpoint(provider)}, warm_connections=2)
+    await pool.warm()
+    # Both sessions of a job get the loop's shared session
+    assert pool.session() is pool.session()
+
+    for _ in range(2):
+        async with pool.session().get(provider) as response:
+            assert await response.text() == "ok"
+    await pool.release()
+
+    stats = pool.stats["127.0.0.1"]
+    # Health checks opened the connections; the requests only reused them
+    assert stats["warmed"] == 2
+    assert stats["opened"] == 0
+    assert stats["reused"] == 2
+    assert stats["checks"] == 2
+    assert "2 warmed, 0 opened" in pool.summary()
+    assert "2 reused" in pool.summary()
+
+
+async def test_failed_checks_are_counted(provider) -> None:
+    down = f"http://127.0.0.1:{_closed_port()}/"
+    pool = ProviderPool({"stt": Endpoint(provider), "tts": Endpoint(down)})
+    await pool.warm()
+
+    assert pool.stats["127.0.0.1"]["checks"] == 1
+    assert pool.stats["127.0.0.1"]["failed_checks"] == 1
+    assert "1/2 checks failed" in pool.summary()
+    session = pool.session()
+    await pool.attach()
+    await pool.release()
+    assert session.closed
@@ -0,0 +1,80 @@
+from order_ids import new_order_id
+from order_model import Order
+from order_store import JsonFileOrderStore, JsonlOrderStore
+from receipts import TEXT_WIDTH, Receipt, ReceiptCache
+
+
+def _order() -> dict:
+    order = Order()
+    order.set_drink("latte")
+    order.set_size("large")
+    order.set_milk("oat")
+    order.add_extra("vanilla syrup")
+    order.add_drink("mocha", 2)
+    order.set_size("small")
+    order.set_milk("whole")
+    order.set_name("Sam")
+    return order.to_dict()
+
+
+def _record(receipt: Receipt) -> dict:
+    return {
+        **receipt.order,
+        "orderId": receipt.order_id,
+        "totalCents": receipt.total_cents,
+        "receipt": receipt.compact(),
+    }
+
+
+def test_saved_receipt_keeps_its_prices() -> None:
+    receipt = Receipt.for_order(_order(), new_order_id())
+    assert receipt.total_cents == sum(receipt.line_cents)
+    assert receipt.html is receipt.html  # rendered once
+
+    # e.g. the menu's prices went up since the order was saved
+    record = _record(receipt)
+    record["receipt"] = {"lineCents": [500, 1000]}
+    rebuilt = Receipt.from_record(record)
+    assert "$15.00" in rebuilt.html
+    assert rebuilt.text.splitlines()[-1].endswith("$15.00")
+
+    # Orders saved before receipts were stored are priced from the menu
+    del record["receipt"]
+    assert Receipt.from_record(record).line_cents == receipt.line_cents
+
+
+def test_text_and_escpos() -> None:
+    receipt = Receipt.for_order(_order(), new_order_id())
+    lines = receipt.text.splitlines()
+    assert all(len(line) <= TEXT_WIDTH for line in lines)
+    assert lines[0].strip() == "BROWN CAFE"
+    assert any(line.startswith("2 x Mocha") for line in lines)
+    assert "  + vanilla syrup" in lines
+
+    escpos = receipt.to_escpos()
+    assert escpos.startswith(b"\x1b@")
+    assert escpos.endswith(b"\x1dVB\x03")
+    assert b"TOTAL" in escpos
+
+
+async def test_cache_evicts_and_reloads_from_the_store(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path)
+    store.open()
+    first = Receipt.for_order(_order(), new_order_id())
+    await store.append(_record(first))
+
+    cache = ReceiptCache(max_entries=1)
+    cache.put(first)
+    cache.put(Receipt.for_order(_order(), new_order_id()))
+    assert len(cache) == 1
+
+    loaded = await cache.get(first.order_id, store)
+    assert loaded.line_cents == first.line_cents
+    assert await cache.get(first.order_id, store) is loaded
+    assert cache.stats == {"hits": 1, "misses": 1, "loaded": 1}
+    assert await cache.get(new_order_id(), store) is None
+    await store.aclose()
+
+    legacy = JsonFileOrderStore(tmp_path / "legacy")
+    await legacy.append(_record(first))
+    assert legacy.find(first.order_id)["receipt"] == first.compact()
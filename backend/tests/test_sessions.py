@@ -0,0 +1,63 @@
+import pytest
+
+from sessions import OrderSession, SessionLimitError, SessionRegistry
+
+
+def test_sessions_are_per_participant() -> None:
+    registry = SessionRegistry()
+    alex = registry.acquire("kiosk", "alex")
+    sam = registry.acquire("kiosk", "sam")
+    alex.order.set_drink("latte")
+
+    assert sam.order.drink is None
+    assert registry.acquire("other-room", "alex") is not alex
+
+
+def test_reconnect_resumes_order() -> None:
+    registry = SessionRegistry()
+    session = registry.acquire("kiosk", "alex")
+    session.order.set_size("large")
+    registry.release("kiosk", "alex")
+
+    assert registry.acquire("kiosk", "alex") is session
+    assert registry.stats["resumed"] == 1
+
+
+def test_idle_sessions_expire(monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr("sessions.time.monotonic", lambda: now[0])
+    registry = SessionRegistry(idle_timeout=60)
+
+    registry.acquire("kiosk", "alex")
+    registry.acquire("kiosk", "sam")
+    registry.release("kiosk", "alex")
+
+    now[0] += 61
+    registry.acquire("kiosk", "jo")
+    assert registry.get("kiosk", "alex") is None
+    assert registry.get("kiosk", "sam") is not None  # still attached
+
+
+def test_full_registry_evicts_detached_then_refuses() -> None:
+    registry = SessionRegistry(max_sessions=2)
+    registry.acquire("kiosk", "alex")
+    registry.acquire("kiosk", "sam")
+    registry.release("kiosk", "alex")
+
+    registry.acquire("kiosk", "jo")
+    assert registry.get("kiosk", "alex") is None
+    assert len(registry) == 2
+
+    with pytest.raises(SessionLimitError):
+        registry.acquire("kiosk", "max")
+
+
+def test_assistant_order_is_backed_by_session() -> None:
+    from agent import Assistant
+
+    session = OrderSession("kiosk", "alex")
+    assistant = Assistant(order_session=session)
+    assistant.order.set_name("Alex")
+
+    assert session.order.name == "Alex"
+    assert assistant.order_state["name"] == "Alex"
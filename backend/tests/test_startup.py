@@ -0,0 +1,26 @@
+import pytest
+
+from providers import ProviderConfig
+from startup import PhaseTimer
+
+
+def test_provider_config_from_env(monkeypatch) -> None:
+    monkeypatch.setenv("STT_PROVIDER", "AssemblyAI")
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+
+    assert ProviderConfig.from_env() == ProviderConfig(stt="assemblyai")
+
+    monkeypatch.setenv("TTS_PROVIDER", "cartesia")
+    with pytest.raises(ValueError, match="TTS_PROVIDER"):
+        ProviderConfig.from_env()
+
+
+def test_phase_timer_records_each_phase() -> None:
+    timer = PhaseTimer()
+    with timer.phase("vad"):
+        pass
+    with pytest.raises(RuntimeError), timer.phase("turn_detector"):
+        raise RuntimeError("model files missing")
+
+    assert list(timer.timings) == ["vad", "turn_detector"]
+    assert timer.summary().endswith("(vad=0ms, turn_detector=0ms)")
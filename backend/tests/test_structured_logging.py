@@ -0,0 +1,67 @@
+import asyncio
+import io
+import json
+import logging
+
+import pytest
+
+from structured_logging import bind, configure, shutdown
+
+
+@pytest.fixture
+def json_lines():
+    stream = io.StringIO()
+    configure("json", stream=stream, sample_every=3)
+    try:
+        yield lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+    finally:
+        shutdown()
+
+
+async def test_records_are_json_lines_with_context(json_lines) -> None:
+    async def customer(identity: str) -> None:
+        bind(participant=identity)
+        logging.getLogger("agent").info("Updated size: %s", "large")
+
+    bind(room="cafe-1")
+    await asyncio.gather(customer("sam"), customer("alex"))
+    try:
+        raise OSError("disk full")
+    except OSError:
+        logging.getLogger("agent.order_store").exception("Failed to save order")
+    shutdown()
+
+    lines = json_lines()
+    assert [(line["participant"], line["msg"]) for line in lines[:2]] == [
+        ("sam", "Updated size: large"),
+        ("alex", "Updated size: large"),
+    ]
+    assert all(line["room"] == "cafe-1" for line in lines)
+    assert lines[2]["logger"] == "agent.order_store"
+    assert "OSError: disk full" in lines[2]["exc"]
+
+
+def test_publish_records_are_sampled(json_lines) -> None:
+    publish = logging.getLogger("agent.publish")
+    for i in range(7):
+        publish.info("Published %s: %d bytes", "drink_state", i)
+    publish.warning("Publish failed")
+    shutdown()
+
+    lines = json_lines()
+    assert [line["msg"] for line in lines] == [
+        "Published drink_state: 0 bytes",
+        "Published drink_state: 3 bytes",
+        "Published drink_state: 6 bytes",
+        "Publish failed",
+    ]
+    assert lines[0]["sampled"] == 3
+
+
+def test_arguments_are_rendered_when_logged(json_lines) -> None:
+    stats = {"hits": 1}
+    logging.getLogger("agent").info("Cache: %s", stats)
+    stats["hits"] = 2
+    shutdown()
+
+    assert json_lines()[0]["msg"] == "Cache: {'hits': 1}"
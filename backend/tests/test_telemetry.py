@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from telemetry import SpanFileExporter, TurnTracer, percentiles, report
+
+
+def test_percentiles_nearest_rank() -> None:
+    samples = [float(i) for i in range(1, 101)]
+    assert percentiles(samples) == {"p50": 50.0, "p95": 95.0, "p99": 99.0}
+    assert percentiles([3.0]) == {"p50": 3.0, "p95": 3.0, "p99": 3.0}
+
+
+def _llm_metrics(ttft, duration, prompt, cached) -> SimpleNamespace:
+    return SimpleNamespace(
+        type="llm_metrics",
+        ttft=ttft,
+        duration=duration,
+        prompt_tokens=prompt,
+        prompt_cached_tokens=cached,
+    )
+
+
+def test_turn_span_from_session_events() -> None:
+    tracer = TurnTracer("kiosk", "alex")
+
+    tracer.on_user_state("listening", now=10.0)
+    tracer.on_metrics(
+        SimpleNamespace(
+            type="eou_metrics",
+            end_of_utterance_delay=0.4,
+            transcription_delay=0.2,
+            on_user_turn_completed_delay=0.001,
+        )
+    )
+    tracer.on_metrics(_llm_metrics(ttft=0.3, duration=0.5, prompt=900, cached=700))
+    tracer.record_tool("update_size", 0.002)
+    tracer.on_metrics(_llm_metrics(ttft=0.25, duration=0.4, prompt=950, cached=900))
+    tracer.on_metrics(SimpleNamespace(type="tts_metrics", ttfb=0.15))
+    tracer.on_agent_state("thinking", "speaking", now=11.2)
+    tracer.on_agent_state("speaking", "listening", now=13.2)
+
+    span = tracer.finish_turn()
+
+    assert span["stages"]["end_of_utterance"] == pytest.approx(400.0)
+    assert span["stages"]["stt_final"] == pytest.approx(200.0)
+    assert span["stages"]["tts_ttfb"] == pytest.approx(150.0)
+    assert span["stages"]["playout"] == pytest.approx(2000.0)
+    assert span["stages"]["response"] == pytest.approx(1200.0)
+    assert span["stages"]["llm_ttft"] == pytest.approx(300.0)
+    assert span["stages"]["llm_duration"] == pytest.approx(900.0)
+    assert span["tools"] == [{"name": "update_size", "ms": 2.0}]
+    assert span["tokens"] == {"prompt": 1850, "cached": 1600}
+    assert span["path"] == "llm"
+    assert tracer.turns == 1
+    assert tracer.finish_turn() is None
+
+
+async def test_spans_exported_and_reported(tmp_path) -> None:
+    tracer = TurnTracer("kiosk", exporter=SpanFileExporter(tmp_path))
+    for turn in range(4):
+        tracer.on_user_state("listening", now=float(turn))
+        if turn % 2:
+            tracer.mark_path("fast_path")
+        tracer.on_agent_state("listening", "speaking", now=turn + 0.1 * (turn + 1))
+    await tracer.aclose()
+
+    result = report(tmp_path)
+
+    assert result["turns"] == {"llm": 2, "fast_path": 2}
+    assert result["response"]["count"] == 4
+    assert result["response"]["p50"] == pytest.approx(200.0)
+    assert result["response"]["p99"] == pytest.approx(400.0)
+
+
+async def test_sessions_share_the_span_file(tmp_path, monkeypatch) -> None:
+    write = SpanFileExporter._write
+
+    def slow_write(self, lines: list[str]) -> None:
+        time.sleep(0.01)
+        write(self, lines)
+
+    monkeypatch.setattr(SpanFileExporter, "_write", slow_write)
+    exporters = [SpanFileExporter(tmp_path, batch=4) for _ in range(8)]
+    # Whole batches only: every span is in a write export already started
+    for i in range(192):
+        exporters[i % 8].export({"turn": i, "note": "x" * 2000})
+    await asyncio.gather(*(exporter.flush() for exporter in exporters))
+
+    lines = exporters[0].path.read_text().splitlines()
+    assert sorted(json.loads(line)["turn"] for line in lines) == list(range(192))
+
+
+async def test_assistant_records_tools_and_publishes() -> None:
+    from agent import Assistant
+
+    published = []
+
+    async def publish_data(payload, **kwargs):
+        published.append(kwargs["topic"])
+
+    assistant = Assistant()
+    assistant.room = SimpleNamespace(
+        local_participant=SimpleNamespace(publish_data=publish_data)
+    )
+    await assistant.update_size(None, "large")
+    await assistant.viz_scheduler.drain()
+
+    span = assistant.tracer.finish_turn()
+    assert [tool["name"] for tool in span["tools"]] == ["update_size"]
+    assert [p["topic"] for p in span["publishes"]] == published == ["drink_state"]
+    assert "tool:update_size" in assistant.tracer.summary()
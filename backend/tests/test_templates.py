@@ -0,0 +1,59 @@
+import pytest
+
+import templates
+from templates import Template, render_cup, render_drink_html, render_receipt_html
+
+
+def _state(**fields) -> dict:
+    return {
+        "drinkType": "latte",
+        "size": "large",
+        "milk": "oat milk",
+        "extras": [],
+        "name": "Sam",
+        **fields,
+    }
+
+
+def test_template_renders_repeated_and_adjacent_fields() -> None:
+    template = Template("<b>{a}{b}</b> {a}!")
+    assert template.render(a="x", b="y") == "<b>xy</b> x!"
+
+
+def test_template_rejects_expressions() -> None:
+    with pytest.raises(ValueError):
+        Template("{order['name']}")
+
+
+def test_prewarm_caches_every_menu_cup() -> None:
+    render_cup.cache_clear()
+    templates.prewarm()
+    assert render_cup.cache_info().currsize == 6 * 3 * 2
+
+    render_drink_html(_state(drinkType="mocha", size="small"))
+    assert render_cup.cache_info().hits >= 1
+
+
+def test_drink_html_fields_and_whipped_cream() -> None:
+    plain = render_drink_html(_state())
+    whipped = render_drink_html(_state(extras=["Whipped Cream", "extra shot"]))
+
+    assert "#D4A574" in plain
+    assert "LARGE" in plain
+    assert "radial-gradient(ellipse" not in plain
+    assert "radial-gradient(ellipse" in whipped
+    assert "• extra shot" in whipped
+
+    empty = render_drink_html(_state(drinkType=None, size=None, name=None))
+    assert "SIZE" in empty
+    assert empty.count("—") >= 3
+
+
+def test_receipt_html() -> None:
+    html = render_receipt_html(
+        _state(extras=["vanilla syrup"]), "20250102030405", "January 02, 2025"
+    )
+    assert "20250102030405" in html
+    assert "Latte" in html
+    assert "Extras: vanilla syrup" in html
+    assert "$6.35" in html  # large latte, oat milk, vanilla syrup
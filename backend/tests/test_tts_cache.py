@@ -0,0 +1,124 @@
+import os
+import threading
+from types import SimpleNamespace
+
+from livekit import rtc
+
+from tts_cache import TTSCache, fixed_phrases, speak
+
+
+def _frames(seconds: float, value: int = 1) -> list[rtc.AudioFrame]:
+    samples = int(24000 * seconds)
+    return [rtc.AudioFrame(bytes([value, 0]) * samples, 24000, 1, samples)]
+
+
+def test_round_trip_as_20ms_frames(tmp_path) -> None:
+    cache = TTSCache(tmp_path)
+    key = TTSCache.key("Perfect, large size.")
+    cache.put(key, _frames(0.05, value=7))
+
+    audio = cache.get(key)
+    frames = list(audio.frames())
+
+    assert [f.samples_per_channel for f in frames] == [480, 480, 240]
+    assert frames[0].sample_rate == 24000
+    assert frames[0].data[0] == 7
+    assert cache.get(TTSCache.key("Noted, oat milk.")) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_key_depends_on_voice_and_text() -> None:
+    assert TTSCache.key("Hi.") == TTSCache.key(" Hi. ")
+    assert TTSCache.key("Hi.") != TTSCache.key("Hi.", voice="en-US-natalie")
+    assert TTSCache.key("Hi.") != TTSCache.key("Hello.")
+
+
+def test_evicts_least_recently_used(tmp_path) -> None:
+    cache = TTSCache(tmp_path, max_bytes=25_000)
+    a, b, c = (TTSCache.key(text) for text in ("a", "b", "c"))
+    cache.put(a, _frames(0.25))  # ~12 KB each
+    cache.put(b, _frames(0.25))
+    cache.get(a)
+    cache.put(c, _frames(0.25))
+
+    assert a in cache and c in cache and b not in cache
+    assert cache.stats["evictions"] == 1
+    assert cache.size <= cache.max_bytes
+
+
+def test_open_restores_recency_from_disk(tmp_path) -> None:
+    cache = TTSCache(tmp_path)
+    old, new = TTSCache.key("old"), TTSCache.key("new")
+    cache.put(old, _frames(0.25))
+    cache.put(new, _frames(0.25))
+    os.utime(cache._path(old), (1, 1))
+
+    reopened = TTSCache(tmp_path, max_bytes=15_000)
+    reopened.open()
+
+    assert list(reopened._entries) == [new]
+    assert not cache._path(old).exists()
+
+
+class _FakeTTS:
+    sample_rate = 24000
+
+    def __init__(self) -> None:
+        self.requests = []
+
+    def synthesize(self, text: str):
+        self.requests.append(text)
+        tts = self
+
+        class _Stream:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def __aiter__(self):
+                return tts._events()
+
+        return _Stream()
+
+    async def _events(self):
+        for frame in _frames(0.04):
+            yield SimpleNamespace(frame=frame)
+
+
+async def test_speak_synthesizes_misses_once(tmp_path, monkeypatch) -> None:
+    cache = TTSCache(tmp_path)
+    tts = _FakeTTS()
+    # Hits open and map their file off the event loop
+    load, loaded_on = cache._load, []
+
+    def spy(key: str):
+        loaded_on.append(threading.get_ident())
+        return load(key)
+
+    monkeypatch.setattr(cache, "_load", spy)
+    text = "Got it, a latte for Sam. What size would you like?"
+
+    first = [frame async for frame in speak(tts, cache, text, private=["Sam"])]
+    second = [frame async for frame in speak(tts, cache, text, private=["Sam"])]
+
+    def samples(frames):
+        return sum(frame.samples_per_channel for frame in frames)
+
+    assert samples(first) == samples(second) == 2 * 960
+    # The sentence with the customer's name is never stored
+    assert tts.requests == [
+        "Got it, a latte for Sam.",
+        "What size would you like?",
+        "Got it, a latte for Sam.",
+    ]
+    assert loaded_on and threading.get_ident() not in loaded_on
+
+
+def test_fixed_phrases_cover_fast_path_replies() -> None:
+    phrases = fixed_phrases()
+
+    assert "What size would you like: small, medium, or large?" in phrases
+    assert "Got it, a large latte with oat milk." in phrases
+    assert len(phrases) == len(set(phrases))
@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+from visualization import DrinkStateEncoder, UpdateScheduler, cup_styles
+
+
+def _item(line: int = 1, **fields) -> dict:
+    return {
+        "line": line,
+        "drinkType": None,
+        "size": None,
+        "milk": None,
+        "extras": [],
+        "quantity": 1,
+        **fields,
+    }
+
+
+def _state(*items: dict, name: str | None = None) -> dict:
+    return {"items": list(items), "name": name}
+
+
+def test_first_message_is_snapshot_then_deltas() -> None:
+    encoder = DrinkStateEncoder()
+    state = _state(_item(drinkType="latte"))
+
+    first = json.loads(encoder.encode(state))
+    assert first == {
+        "v": 2,
+        "seq": 1,
+        "kind": "snapshot",
+        "set": {"name": None, "lines": [1]},
+        "items": {
+            "1": {k: v for k, v in _item(drinkType="latte").items() if k != "line"}
+        },
+    }
+
+    state["items"][0]["size"] = "large"
+    second = json.loads(encoder.encode(state))
+    assert second == {
+        "v": 2,
+        "seq": 2,
+        "kind": "delta",
+        "items": {"1": {"size": "large"}},
+    }
+
+
+def test_only_the_changed_item_is_sent() -> None:
+    encoder = DrinkStateEncoder()
+    state = _state(_item(1, drinkType="latte", quantity=2), _item(2, drinkType="mocha"))
+    encoder.encode(state)
+
+    state["items"][1]["milk"] = "oat milk"
+    assert json.loads(encoder.encode(state))["items"] == {"2": {"milk": "oat milk"}}
+
+    # Removing an item only changes the line list; the rest keep their numbers
+    del state["items"][0]
+    message = json.loads(encoder.encode(state))
+    assert message["set"] == {"lines": [2]} and "items" not in message
+
+    state["items"].append(_item(3, drinkType="espresso"))
+    message = json.loads(encoder.encode(state))
+    assert message["set"] == {"lines": [2, 3]}
+    assert list(message["items"]) == ["3"]
+
+
+def test_unchanged_state_sends_nothing() -> None:
+    encoder = DrinkStateEncoder()
+    state = _state(_item(drinkType="mocha"))
+    encoder.encode(state)
+
+    assert encoder.encode(state) is None
+    assert encoder.seq == 1
+
+
+def test_in_place_extras_mutation_is_a_change() -> None:
+    encoder = DrinkStateEncoder()
+    state = _state(_item())
+    encoder.encode(state)
+
+    state["items"][0]["extras"].append("extra shot")
+    message = json.loads(encoder.encode(state))
+    assert message["items"] == {"1": {"extras": ["extra shot"]}}
+
+
+def test_resync_and_periodic_snapshots() -> None:
+    encoder = DrinkStateEncoder(snapshot_every=2)
+    state = _state(_item())
+    kinds = []
+    for name in ["a", "b", "c", "d"]:
+        state["name"] = name
+        kinds.append(json.loads(encoder.encode(state))["kind"])
+    assert kinds == ["snapshot", "delta", "delta", "snapshot"]
+
+    encoder.request_snapshot()
+    state["name"] = "e"
+    assert json.loads(encoder.encode(state))["kind"] == "snapshot"
+
+
+def test_cup_styles_come_from_the_menu() -> None:
+    from menu import current
+
+    styles = cup_styles(current())
+    assert styles["colors"]["latte"] == "#D4A574"
+    assert styles["cups"]["large"] == {"width": "80px", "height": "110px"}
+
+    encoder = DrinkStateEncoder(snapshot_every=2)
+    state = _state(_item())
+    assert json.loads(encoder.encode(state, styles))["menu"] == styles
+
+    state["name"] = "Sam"
+    assert "menu" not in json.loads(encoder.encode(state, styles))
+
+    # The menu file changed: the new colors go out even with no order change
+    reloaded = {**styles, "colors": {**styles["colors"], "latte": "#C89B6D"}}
+    message = json.loads(encoder.encode(state, reloaded))
+    assert message["kind"] == "delta"
+    assert message["menu"]["colors"]["latte"] == "#C89B6D"
+
+    # Every snapshot carries them
+    state["name"] = "Kim"
+    message = json.loads(encoder.encode(state, reloaded))
+    assert message["kind"] == "snapshot" and message["menu"] == reloaded
+
+
+def test_payload_is_much_smaller_than_html() -> None:
+    from agent import Assistant
+
+    assistant = Assistant()
+    assistant.order_state = {
+        "drinkType": "latte",
+        "size": "large",
+        "milk": "oat milk",
+        "extras": ["extra shot"],
+        "name": "Sam",
+    }
+    snapshot = assistant.viz_encoder.encode(assistant.order_state)
+    html = assistant.generate_drink_html().encode("utf-8")
+
+    assert len(snapshot) * 10 < len(html)
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def publish(self) -> None:
+        self.calls += 1
+
+
+async def test_scheduler_coalesces_updates_in_one_window() -> None:
+    recorder = _Recorder()
+    scheduler = UpdateScheduler(recorder.publish, debounce=0.01)
+
+    for _ in range(5):
+        scheduler.mark_dirty()
+    assert recorder.calls == 0  # nothing is published inline
+
+    await asyncio.sleep(0.05)
+    assert recorder.calls == 1
+    assert scheduler.stats == {"requested": 5, "published": 1, "suppressed": 4}
+
+
+async def test_scheduler_flush_soon_skips_debounce() -> None:
+    recorder = _Recorder()
+    scheduler = UpdateScheduler(recorder.publish, debounce=60)
+
+    scheduler.mark_dirty()
+    scheduler.mark_dirty()
+    await asyncio.wait_for(scheduler.drain(), timeout=1)
+
+    assert recorder.calls == 1
+    assert not scheduler.pending
+
+
+async def test_tools_do_not_publish_inline() -> None:
+    from agent import Assistant
+
+    class _Participant:
+        def __init__(self) -> None:
+            self.published = []
+
+        async def publish_data(self, payload, *, topic="", **kwargs) -> None:
+            self.published.append((topic, payload))
+
+    class _Room:
+        local_participant = _Participant()
+
+    assistant = Assistant()
+    assistant.room = _Room()
+    await assistant.update_drink_type(None, "latte")
+    await assistant.update_size(None, "large")
+    await assistant.update_milk(None, "oat milk")
+    await assistant.add_extra(None, "extra shot")
+    await assistant.update_name(None, "Sam")
+    assert assistant.room.local_participant.published == []
+
+    await assistant.viz_scheduler.drain()
+    published = assistant.room.local_participant.published
+    assert len(published) == 1
+    assert json.loads(published[0][1])["set"]["name"] == "Sam"
@@ -1,53 +1,452 @@
 'use client';
 
-import React, { useEffect, useState } from 'react';
+import React, { memo, useRef, useState } from 'react';
 import { useDataChannel } from '@livekit/components-react';
 import { motion, AnimatePresence } from 'motion/react';
 
+// Structured order-state protocol (see backend/src/visualization.py)
+const PROTOCOL_VERSION = 2;
+const STATE_TOPIC = 'drink_state';
+const SYNC_TOPIC = 'drink_state_sync';
+// Ask again if a requested snapshot hasn't arrived by then (the request was lost)
+const SYNC_RETRY_MS = 3000;
+// Full-HTML messages from agents that predate the structured protocol
+const LEGACY_HTML_TOPIC = 'drink_visualization';
+
+interface ItemState {
+  drinkType: string | null;
+  size: string | null;
+  milk: string | null;
+  extras: string[];
+  quantity: number;
+}
+
+interface CupSize {
+  width: string;
+  height: string;
+}
+
+// How cups are drawn, from the agent's menu.json
+interface CupStyles {
+  colors: Record<string, string>;
+  cups: Record<string, CupSize>;
+  default: { color: string; cup: CupSize };
+}
+
+interface OrderState {
+  name: string | null;
+  // Line numbers of the order's items, in display order
+  lines: number[];
+  items: Record<string, ItemState>;
+  menu: CupStyles | null;
+}
+
+interface DrinkStateMessage {
+  v: number;
+  seq: number;
+  kind: 'snapshot' | 'delta';
+  set?: Partial<Pick<OrderState, 'name' | 'lines'>>;
+  items?: Record<string, Partial<ItemState>>;
+  menu?: CupStyles;
+}
+
+const EMPTY_ITEM: ItemState = {
+  drinkType: null,
+  size: null,
+  milk: null,
+  extras: [],
+  quantity: 1,
+};
+
+const EMPTY_STATE: OrderState = { name: null, lines: [], items: {}, menu: null };
+
+// Agents that predate menu styles in snapshots send none
+const FALLBACK_STYLES: CupStyles = {
+  colors: {},
+  cups: {},
+  default: { color: '#A67C52', cup: { width: '70px', height: '95px' } },
+};
+
+// Applies a message to the previous state; items no longer listed are dropped
+function applyMessage(prev: OrderState, msg: DrinkStateMessage): OrderState {
+  const lines = msg.set?.lines ?? prev.lines;
+  const items: Record<string, ItemState> = {};
+  for (const line of lines) {
+    const key = String(line);
+    items[key] = { ...EMPTY_ITEM, ...prev.items[key], ...msg.items?.[key] };
+  }
+  return {
+    name: msg.set?.name !== undefined ? msg.set.name : prev.name,
+    lines,
+    items,
+    menu: msg.menu ?? prev.menu,
+  };
+}
+
+const LABEL_STYLE: React.CSSProperties = {
+  color: '#8b7355',
+  fontWeight: 300,
+  letterSpacing: '0.1em',
+  textTransform: 'uppercase',
+  fontSize: '10px',
+};
+
+const VALUE_STYLE: React.CSSProperties = { color: '#a89584' };
+
+const decoder = new TextDecoder();
+const encoder = new TextEncoder();
+
+interface CupProps {
+  size: string | null;
+  drinkColor: string;
+  width: string;
+  height: string;
+  whippedCream: boolean;
+}
+
+// Only re-renders when the cup itself changes, not on milk/extras/name updates
+// or edits to another item
+const Cup = memo(function Cup({ size, drinkColor, width, height, whippedCream }: CupProps) {
+  return (
+    <div style={{ position: 'relative', display: 'inline-block' }}>
+      <div
+        style={{
+          position: 'relative',
+          width,
+          height,
+          background: `linear-gradient(to bottom, ${drinkColor} 0%, ${drinkColor} 85%, #3e2723 100%)`,
+          borderRadius: '0 0 12px 12px',
+          boxShadow:
+            '0 4px 16px rgba(0,0,0,0.3), inset -3px 0 8px rgba(0,0,0,0.2), inset 3px 0 8px rgba(255,255,255,0.1)',
+          border: '2px solid #3e2723',
+          borderTop: 'none',
+        }}
+      >
+        {/* Cup Top/Rim */}
+        <div
+          style={{
+            position: 'absolute',
+            top: '-6px',
+            left: '-2px',
+            right: '-2px',
+            height: '10px',
+            background: drinkColor,
+            border: '2px solid #3e2723',
+            borderRadius: '50%',
+            boxShadow: 'inset 0 -2px 4px rgba(0,0,0,0.3)',
+          }}
+        />
+
+        {/* Whipped Cream */}
+        {whippedCream && (
+          <>
+            <div
+              style={{
+                position: 'absolute',
+                top: '-22px',
+                left: '50%',
+                transform: 'translateX(-50%)',
+                width: 'calc(100% - 8px)',
+                height: '30px',
+                background:
+                  'radial-gradient(ellipse at center, #FFFEF7 0%, #FFF8E7 50%, #F5E6D3 100%)',
+                borderRadius: '50% 50% 40% 40%',
+                boxShadow: '0 2px 6px rgba(0,0,0,0.2)',
+                border: '1px solid #F0E5D8',
+              }}
+            />
+            <div
+              style={{
+                position: 'absolute',
+                top: '-26px',
+                left: '50%',
+                transform: 'translateX(-50%)',
+                width: '55%',
+                height: '18px',
+                background: 'radial-gradient(circle, #FFFFFF 0%, #FFFEF7 100%)',
+                borderRadius: '50%',
+                opacity: 0.9,
+              }}
+            />
+          </>
+        )}
+
+        {/* Cup Handle */}
+        <div
+          style={{
+            position: 'absolute',
+            right: '-20px',
+            top: '25%',
+            width: '24px',
+            height: '40%',
+            border: '3px solid #3e2723',
+            borderLeft: 'none',
+            borderRadius: '0 50% 50% 0',
+            background: `linear-gradient(to right, transparent 0%, ${drinkColor} 50%)`,
+            opacity: 0.7,
+          }}
+        />
+      </div>
+
+      {/* Size Badge */}
+      <div style={{ textAlign: 'center', marginTop: '10px' }}>
+        <span
+          style={{
+            display: 'inline-block',
+            background: '#8b7355',
+            color: '#1a1816',
+            padding: '4px 12px',
+            borderRadius: '1px',
+            fontWeight: 300,
+            fontSize: '10px',
+            letterSpacing: '0.2em',
+            textTransform: 'uppercase',
+            boxShadow: '0 2px 8px rgba(0,0,0,0.2)',
+          }}
+        >
+          {size ? size.toUpperCase() : 'SIZE'}
+        </span>
+      </div>
+    </div>
+  );
+});
+
+function hasWhippedCream(item: ItemState) {
+  return item.extras.some((extra) => extra.toLowerCase().includes('whipped cream'));
+}
+
+function DrinkCard({ order }: { order: OrderState }) {
+  const items = order.lines.map((line) => ({ line, ...order.items[String(line)] }));
+  if (items.length === 0) {
+    items.push({ line: 0, ...EMPTY_ITEM });
+  }
+  const styles = order.menu ?? FALLBACK_STYLES;
+
+  return (
+    <div
+      style={{
+        fontFamily: "'Inter', -apple-system, sans-serif",
+        padding: '16px',
+        background: 'linear-gradient(135deg, #3a3330 0%, #2a2522 100%)',
+        borderRadius: '2px',
+        maxWidth: '280px',
+        margin: '0 auto',
+        color: '#a89584',
+        boxShadow: '0 8px 32px rgba(0,0,0,0.4)',
+      }}
+    >
+      <div
+        style={{
+          textAlign: 'center',
+          marginBottom: '12px',
+          paddingBottom: '12px',
+        }}
+      >
+        <h2
+          style={{
+            margin: 0,
+            fontSize: '14px',
+            fontWeight: 300,
+            letterSpacing: '0.3em',
+            textTransform: 'uppercase',
+            color: '#8b7355',
+          }}
+        >
+          <span style={{ fontSize: '16px', marginRight: '8px' }}>☕</span>
+          <span>Brown Cafe</span>
+        </h2>
+      </div>
+
+      <div
+        style={{
+          background: '#1a1816',
+          borderRadius: '2px',
+          padding: '14px',
+          color: '#a89584',
+        }}
+      >
+        <h3
+          style={{
+            margin: '0 0 12px 0',
+            color: '#8b7355',
+            textAlign: 'center',
+            fontSize: '12px',
+            fontWeight: 300,
+            letterSpacing: '0.2em',
+            textTransform: 'uppercase',
+            paddingBottom: '8px',
+          }}
+        >
+          Your Order
+        </h3>
+
+        {/* Drink Visualization: one cup per item */}
+        <div
+          style={{
+            display: 'flex',
+            flexWrap: 'wrap',
+            justifyContent: 'center',
+            alignItems: 'flex-end',
+            gap: '28px',
+            margin: '12px 0',
+            padding: '16px',
+            background: '#2a2522',
+            borderRadius: '2px',
+          }}
+        >
+          {items.map((item) => {
+            const cup = styles.cups[item.size ?? ''] ?? styles.default.cup;
+            return (
+              <Cup
+                key={item.line}
+                size={item.size}
+                drinkColor={styles.colors[item.drinkType ?? ''] ?? styles.default.color}
+                width={cup.width}
+                height={cup.height}
+                whippedCream={hasWhippedCream(item)}
+              />
+            );
+          })}
+        </div>
+
+        {/* Order Details */}
+        <div
+          style={{
+            marginTop: '12px',
+            background: '#2a2522',
+            borderRadius: '2px',
+            padding: '10px',
+            fontSize: '11px',
+          }}
+        >
+          <div
+            style={{
+              display: 'grid',
+              gridTemplateColumns: 'auto 1fr',
+              gap: '6px 12px',
+              alignItems: 'start',
+            }}
+          >
+            {items.map((item, index) => (
+              <React.Fragment key={item.line}>
+                <strong style={LABEL_STYLE}>
+                  {items.length > 1 ? `Drink ${index + 1}:` : 'Drink:'}
+                </strong>
+                <span style={VALUE_STYLE}>
+                  {item.quantity > 1 ? `${item.quantity} × ` : ''}
+                  {item.drinkType || '—'}
+                </span>
+
+                <strong style={LABEL_STYLE}>Size:</strong>
+                <span style={VALUE_STYLE}>{item.size || '—'}</span>
+
+                <strong style={LABEL_STYLE}>Milk:</strong>
+                <span style={VALUE_STYLE}>{item.milk || '—'}</span>
+
+                <strong style={LABEL_STYLE}>Extras:</strong>
+                <div style={VALUE_STYLE}>
+                  {item.extras.length > 0 ? (
+                    item.extras.map((extra) => (
+                      <div key={extra} style={{ margin: '2px 0', fontSize: '12px' }}>
+                        • {extra}
+                      </div>
+                    ))
+                  ) : (
+                    <span style={{ color: '#6b5d52', fontSize: '10px' }}>—</span>
+                  )}
+                </div>
+              </React.Fragment>
+            ))}
+
+            <strong style={LABEL_STYLE}>Name:</strong>
+            <span style={VALUE_STYLE}>{order.name || '—'}</span>
+          </div>
+        </div>
+      </div>
+    </div>
+  );
+}
+
 export function DrinkVisualization() {
-  const [drinkHtml, setDrinkHtml] = useState<string>('');
-  const [isVisible, setIsVisible] = useState(false);
-  const [key, setKey] = useState(0);
-
-  // Listen for drink visualization data from the agent
-  useDataChannel('drink_visualization', (message) => {
-    const decoder = new TextDecoder();
-    const html = decoder.decode(message.payload);
-    setDrinkHtml(html);
-    setIsVisible(true);
-    setKey(prev => prev + 1); // Force re-render with new animation
+  const [order, setOrder] = useState<OrderState | null>(null);
+  const [legacyHtml, setLegacyHtml] = useState<string>('');
+  const lastSeq = useRef(0);
+  // When the pending snapshot request was sent; deltas are dropped until it arrives
+  const syncRequestedAt = useRef<number | null>(null);
+
+  const { send: requestSnapshot } = useDataChannel(SYNC_TOPIC);
+
+  // Structured order state: snapshots replace, deltas patch
+  useDataChannel(STATE_TOPIC, (message) => {
+    let msg: DrinkStateMessage;
+    try {
+      msg = JSON.parse(decoder.decode(message.payload));
+    } catch {
+      return;
+    }
+    if (msg.v !== PROTOCOL_VERSION) {
+      return;
+    }
+
+    if (msg.kind === 'snapshot') {
+      syncRequestedAt.current = null;
+      setOrder(applyMessage(EMPTY_STATE, msg));
+    } else if (syncRequestedAt.current === null && msg.seq === lastSeq.current + 1) {
+      setOrder((prev) => applyMessage(prev ?? EMPTY_STATE, msg));
+    } else {
+      // Missed a message (e.g. joined mid-order): ask the agent for one snapshot,
+      // not one per delta that arrives before it
+      const now = Date.now();
+      if (syncRequestedAt.current === null || now - syncRequestedAt.current > SYNC_RETRY_MS) {
+        syncRequestedAt.current = now;
+        requestSnapshot(encoder.encode('sync'), { reliable: true });
+      }
+      return;
+    }
+    lastSeq.current = msg.seq;
   });
 
-  if (!isVisible || !drinkHtml) {
+  // Legacy agents publish a pre-rendered HTML document instead
+  useDataChannel(LEGACY_HTML_TOPIC, (message) => {
+    setLegacyHtml(decoder.decode(message.payload));
+  });
+
+  if (!order && !legacyHtml) {
     return null;
   }
 
   return (
     <AnimatePresence mode="wait">
       <motion.div
-        key={key}
+        key="drink-visualization"
         initial={{ opacity: 0, scale: 0.9, x: 20 }}
-        animate={{ 
-          opacity: 1, 
-          scale: 1, 
+        animate={{
+          opacity: 1,
+          scale: 1,
           x: 0,
           transition: {
             duration: 0.5,
             ease: [0.34, 1.56, 0.64, 1], // Smooth bounce
-          }
+          },
         }}
-        exit={{ 
-          opacity: 0, 
-          scale: 0.95, 
-          transition: { duration: 0.2 }
+        exit={{
+          opacity: 0,
+          scale: 0.95,
+          transition: { duration: 0.2 },
         }}
         className="fixed top-1/2 right-6 -translate-y-1/2 z-50 max-w-md"
         style={{ pointerEvents: 'none' }}
       >
-        <div
-          dangerouslySetInnerHTML={{ __html: drinkHtml }}
-          style={{ pointerEvents: 'auto' }}
-        />
+        {order ? (
+          <div style={{ pointerEvents: 'auto' }}>
+            <DrinkCard order={order} />
+          </div>
+        ) : (
+          <div
+            dangerouslySetInnerHTML={{ __html: legacyHtml }}
+            style={{ pointerEvents: 'auto' }}
+          />
+        )}
       </motion.div>
     </AnimatePresence>
   );
@@ -1,30 +1,64 @@
 'use client';
 
-import React, { useState } from 'react';
-import { useDataChannel } from '@livekit/components-react';
+import React, { useEffect, useRef, useState } from 'react';
+import { RoomEvent } from 'livekit-client';
+import { useDataChannel, useRoomContext } from '@livekit/components-react';
 import { motion, AnimatePresence } from 'motion/react';
 
+// Receipts are kept by the agent (see backend/src/receipts.py)
+const RECEIPT_TOPIC = 'order_receipt';
+const RECEIPT_REQUEST_TOPIC = 'order_receipt_request';
+
+const decoder = new TextDecoder();
+const encoder = new TextEncoder();
+
 export function OrderReceipt() {
+  const room = useRoomContext();
   const [receiptHtml, setReceiptHtml] = useState<string>('');
   const [isVisible, setIsVisible] = useState(false);
+  const lastHtml = useRef('');
 
-  // Listen for receipt data from the agent
-  useDataChannel('order_receipt', (message) => {
-    const decoder = new TextDecoder();
+  const { send: requestReceipt } = useDataChannel(RECEIPT_REQUEST_TOPIC);
+
+  // Listen for receipt data from the agent; it stays up until closed
+  useDataChannel(RECEIPT_TOPIC, (message) => {
     const html = decoder.decode(message.payload);
-    setReceiptHtml(html);
+    // A resend of the receipt already held (get_receipt, a reconnect) only
+    // needs showing again, not re-rendering
+    if (html !== lastHtml.current) {
+      lastHtml.current = html;
+      setReceiptHtml(html);
+    }
     setIsVisible(true);
-    
-    // Auto-hide after 15 seconds
-    setTimeout(() => {
-      setIsVisible(false);
-    }, 15000);
   });
 
-  if (!isVisible || !receiptHtml) {
+  // A receipt sent while the connection was down is lost; ask for it again
+  useEffect(() => {
+    function onReconnected() {
+      requestReceipt(encoder.encode('resend'), { reliable: true });
+    }
+
+    room.on(RoomEvent.Reconnected, onReconnected);
+    return () => {
+      room.off(RoomEvent.Reconnected, onReconnected);
+    };
+  }, [room, requestReceipt]);
+
+  if (!receiptHtml) {
     return null;
   }
 
+  if (!isVisible) {
+    return (
+      <button
+        onClick={() => setIsVisible(true)}
+        className="fixed bottom-32 left-6 z-50 rounded-full bg-amber-600 px-4 py-2 text-sm font-semibold text-white shadow-lg transition-colors hover:bg-amber-700"
+      >
+        Receipt
+      </button>
+    );
+  }
+
   return (
     <AnimatePresence mode="wait">
       {isVisible && (